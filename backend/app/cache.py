@@ -0,0 +1,199 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+from .config import settings
+from .invalidation import register_handler, register_reset_handler
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "tags")
+
+    def __init__(self, value: Any, size: int, expires_at: float, tags: tuple):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.tags = tags
+
+
+class TTLCache:
+    """Bounded in-process LRU cache with per-entry TTL and tag-based invalidation.
+
+    Entries are evicted least-recently-used first once either `max_entries` or
+    `max_bytes` (the sum of the sizes passed to `set`) is exceeded. Tags let a
+    write invalidate exactly the entries that depend on a row, e.g. every cached
+    page that contains service 42 is tagged "service:42".
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, max_bytes: int, enabled: bool = True):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled and max_entries > 0
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        self._bytes = 0
+        # Bumped on every invalidation so a read that raced with a write can refuse to cache its result
+        self.generation = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return entry.value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        size: int,
+        tags: Iterable[str] = (),
+        ttl: Optional[float] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        if not self.enabled or size > self.max_bytes:
+            return
+        if generation is not None and generation != self.generation:
+            # Something was invalidated while the value was being loaded; it may already be stale
+            return
+        if key in self._entries:
+            self._remove(key)
+        ttl = self.ttl_seconds if ttl is None else ttl
+        if ttl <= 0:
+            return
+        entry = _Entry(value, size, time.monotonic() + ttl, tuple(tags))
+        self._entries[key] = entry
+        self._bytes += size
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        if key in self._entries:
+            self._remove(key)
+            self._stats["invalidations"] += 1
+
+    def invalidate_tags(self, *tags: str) -> None:
+        self.generation += 1
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self.invalidate(key)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._tags.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            **self._stats,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# Catalog reads: single services and list/search pages
+service_cache = TTLCache(
+    "services",
+    max_entries=settings.service_cache_max_entries,
+    ttl_seconds=settings.service_cache_ttl_seconds,
+    max_bytes=settings.service_cache_max_bytes,
+    enabled=settings.service_cache_enabled,
+)
+
+# Verified JWT claims, keyed by token digest (see security.decode_access_token_cached)
+token_cache = TTLCache(
+    "tokens",
+    max_entries=settings.token_cache_max_entries,
+    ttl_seconds=settings.token_cache_max_ttl_seconds,
+    max_bytes=settings.service_cache_max_bytes,
+    enabled=settings.token_cache_enabled,
+)
+
+# Profiles returned by /api/auth/me
+user_cache = TTLCache(
+    "users",
+    max_entries=settings.user_cache_max_entries,
+    ttl_seconds=settings.user_cache_ttl_seconds,
+    max_bytes=settings.service_cache_max_bytes,
+)
+
+
+def invalidate_service_created() -> None:
+    # A new service has the highest id, so it can only appear on first pages of
+    # id-ordered lists, but anywhere in rank-ordered search results.
+    service_cache.invalidate_tags("services:head", "services:ranked")
+
+
+def invalidate_service_updated(service_id: int) -> None:
+    # Pages holding the service are stale, and an edit can move it into or out of any filtered list.
+    service_cache.invalidate_tags(f"service:{service_id}", "services:filtered")
+
+
+def invalidate_service_deleted(service_id: int) -> None:
+    # Keyset pages are anchored on ids, so only pages that contained the service change.
+    service_cache.invalidate_tags(f"service:{service_id}")
+
+
+def invalidate_user(user_id: int) -> None:
+    user_cache.invalidate_tags(f"user:{user_id}")
+    token_cache.invalidate_tags(f"user:{user_id}")
+
+
+def _on_service_event(event: dict) -> None:
+    action, service_id = event.get("action"), event.get("id")
+    if action == "created":
+        invalidate_service_created()
+    elif action == "deleted":
+        invalidate_service_deleted(service_id)
+    else:
+        invalidate_service_updated(service_id)
+
+
+def _on_user_event(event: dict) -> None:
+    invalidate_user(event.get("id"))
+
+
+def _reset() -> None:
+    service_cache.clear()
+    user_cache.clear()
+    token_cache.clear()
+
+
+# Writes made by other workers arrive through the LISTEN/NOTIFY bus in invalidation.py
+register_handler("service", _on_service_event)
+register_handler("user", _on_user_event)
+register_reset_handler(_reset)
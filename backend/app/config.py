@@ -30,12 +30,68 @@ class Settings(BaseModel):
         # URL encode the password to handle special characters like @, #, etc.
         encoded_password = quote_plus(self.db_password)
         return f"postgresql://{self.db_user}:{encoded_password}@{self.db_host}:{self.db_port}/{self.db_name}"
-    
+
+    # Connection pool configuration (DB_POOL_ENABLED=false falls back to one connection per request)
+    db_pool_enabled: bool = os.getenv("DB_POOL_ENABLED", "true").lower() == "true"
+    db_pool_min_size: int = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    db_pool_max_size: int = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    db_pool_timeout_seconds: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+    db_pool_max_idle_seconds: float = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "300"))
+    db_pool_max_lifetime_seconds: float = float(os.getenv("DB_POOL_MAX_LIFETIME_SECONDS", "1800"))
+    db_pool_health_check: bool = os.getenv("DB_POOL_HEALTH_CHECK", "true").lower() == "true"
+
+    # Server-side prepared statements for the statements in app/queries.py (pooled connections only): a statement is
+    # prepared on a connection after DB_PREPARE_THRESHOLD executions there, and at most DB_PREPARED_MAX are kept per
+    # connection. Set DB_PREPARED_STATEMENTS=false behind a transaction-mode PgBouncer, which cannot keep them.
+    db_prepared_statements: bool = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() == "true"
+    db_prepare_threshold: int = int(os.getenv("DB_PREPARE_THRESHOLD", "5"))
+    db_prepared_max: int = int(os.getenv("DB_PREPARED_MAX", "200"))
+
+    # Request instrumentation (app/metrics.py): per-route and per-operation latency histograms served at /metrics,
+    # and a Server-Timing header with each response's breakdown (db, bcrypt, razorpay, serialize, ...)
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    server_timing_enabled: bool = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+    # In-process cache for service catalog reads
+    service_cache_enabled: bool = os.getenv("SERVICE_CACHE_ENABLED", "true").lower() == "true"
+    service_cache_ttl_seconds: float = float(os.getenv("SERVICE_CACHE_TTL_SECONDS", "30"))
+    service_cache_max_entries: int = int(os.getenv("SERVICE_CACHE_MAX_ENTRIES", "1000"))
+    service_cache_max_bytes: int = int(os.getenv("SERVICE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    user_cache_ttl_seconds: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    user_cache_max_entries: int = int(os.getenv("USER_CACHE_MAX_ENTRIES", "5000"))
+
+    # Cross-worker cache invalidation over Postgres LISTEN/NOTIFY
+    cache_invalidation_enabled: bool = os.getenv("CACHE_INVALIDATION_ENABLED", "true").lower() == "true"
+    cache_invalidation_channel: str = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+
     # JWT Configuration
     jwt_secret: str = os.getenv("JWT_SECRET", "dev_secret_change_me")
     jwt_algorithm: str = os.getenv("JWT_ALGORITHM", "HS256")
     jwt_expires_minutes: int = int(os.getenv("JWT_EXPIRES_MINUTES", "120"))
+    # "jose" (python-jose) or "pyjwt" (faster, requires PyJWT to be installed)
+    jwt_backend: str = os.getenv("JWT_BACKEND", "jose").lower()
+    # PEM keys for asymmetric algorithms (RS256, ES256, ...), literal "\n" allowed; JWT_SECRET is used for HS*
+    jwt_private_key: str = os.getenv("JWT_PRIVATE_KEY", "").replace("\\n", "\n")
+    jwt_public_key: str = os.getenv("JWT_PUBLIC_KEY", "").replace("\\n", "\n")
+
+    # Cache of verified tokens for get_current_user
+    token_cache_enabled: bool = os.getenv("TOKEN_CACHE_ENABLED", "true").lower() == "true"
+    token_cache_max_entries: int = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+    token_cache_max_ttl_seconds: float = float(os.getenv("TOKEN_CACHE_MAX_TTL_SECONDS", "300"))
     
+    # Password hashing (BCRYPT_ROUNDS changes are applied to existing users on their next login)
+    bcrypt_rounds: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    password_hash_workers: int = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))  # 0 = one per CPU core
+
+    # Upper bound on rows accepted by POST /api/services/import
+    service_import_max_rows: int = int(os.getenv("SERVICE_IMPORT_MAX_ROWS", "200000"))
+
+    # Upper bound on rows sent by a stream=true listing (GET /api/services/my, /api/bookings/my)
+    stream_max_rows: int = int(os.getenv("STREAM_MAX_ROWS", "10000"))
+
+    # Booking status changes give up (409) instead of waiting longer than this for a row lock
+    booking_lock_timeout_ms: int = int(os.getenv("BOOKING_LOCK_TIMEOUT_MS", "1000"))
+
     # Server Configuration
     api_host: str = os.getenv("API_HOST", "0.0.0.0")
     api_port: int = int(os.getenv("API_PORT", "8000"))
@@ -49,10 +105,58 @@ class Settings(BaseModel):
     twilio_auth_token: str = os.getenv("TWILIO_AUTH_TOKEN", "")
     twilio_whatsapp_from: str = os.getenv("TWILIO_WHATSAPP_FROM", "whatsapp:+14155238886")
     twilio_admin_whatsapp_to: str = os.getenv("TWILIO_ADMIN_WHATSAPP_TO", "")
+    # Shared HTTP client for the Twilio API (override the base URL to point at a local stub)
+    twilio_api_base_url: str = os.getenv("TWILIO_API_BASE_URL", "https://api.twilio.com")
+    twilio_http2: bool = os.getenv("TWILIO_HTTP2", "true").lower() == "true"
+    twilio_max_connections: int = int(os.getenv("TWILIO_MAX_CONNECTIONS", "20"))
+    twilio_max_keepalive_connections: int = int(os.getenv("TWILIO_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    twilio_keepalive_expiry_seconds: float = float(os.getenv("TWILIO_KEEPALIVE_EXPIRY_SECONDS", "60"))
+    twilio_connect_timeout_seconds: float = float(os.getenv("TWILIO_CONNECT_TIMEOUT_SECONDS", "5"))
+    twilio_read_timeout_seconds: float = float(os.getenv("TWILIO_READ_TIMEOUT_SECONDS", "15"))
+    twilio_pool_timeout_seconds: float = float(os.getenv("TWILIO_POOL_TIMEOUT_SECONDS", "5"))
+
+    # Notification outbox worker (drains the notifications table with retries)
+    notification_outbox_enabled: bool = os.getenv("NOTIFICATION_OUTBOX_ENABLED", "true").lower() == "true"
+    notification_poll_seconds: float = float(os.getenv("NOTIFICATION_POLL_SECONDS", "5"))
+    notification_batch_size: int = int(os.getenv("NOTIFICATION_BATCH_SIZE", "20"))
+    notification_max_attempts: int = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "8"))
+    notification_backoff_base_seconds: float = float(os.getenv("NOTIFICATION_BACKOFF_BASE_SECONDS", "10"))
+    notification_backoff_max_seconds: float = float(os.getenv("NOTIFICATION_BACKOFF_MAX_SECONDS", "3600"))
+    notification_lease_seconds: int = int(os.getenv("NOTIFICATION_LEASE_SECONDS", "120"))
+    # Locale of notification templates ("en" or "hi"; missing templates fall back to English)
+    notification_locale: str = os.getenv("NOTIFICATION_LOCALE", "en")
+    # Token bucket per sender number (per worker process)
+    notification_rate_per_second: float = float(os.getenv("NOTIFICATION_RATE_PER_SECOND", "5"))
+    notification_rate_burst: int = int(os.getenv("NOTIFICATION_RATE_BURST", "10"))
+    # Digest mode: coalesce bookings for the same recipient within a window into one message
+    notification_digest_enabled: bool = os.getenv("NOTIFICATION_DIGEST_ENABLED", "false").lower() == "true"
+    notification_digest_window_seconds: float = float(os.getenv("NOTIFICATION_DIGEST_WINDOW_SECONDS", "60"))
+    notification_digest_max_items: int = int(os.getenv("NOTIFICATION_DIGEST_MAX_ITEMS", "10"))
 
     # Razorpay Configuration
     razorpay_key_id: str = os.getenv("RAZORPAY_KEY_ID", "")
     razorpay_key_secret: str = os.getenv("RAZORPAY_KEY_SECRET", "")
+    razorpay_api_base_url: str = os.getenv("RAZORPAY_API_BASE_URL", "https://api.razorpay.com/v1")
+    # Shared async HTTP client (connection pool and timeouts) for Razorpay API calls
+    razorpay_max_connections: int = int(os.getenv("RAZORPAY_MAX_CONNECTIONS", "20"))
+    razorpay_max_keepalive_connections: int = int(os.getenv("RAZORPAY_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    razorpay_keepalive_expiry_seconds: float = float(os.getenv("RAZORPAY_KEEPALIVE_EXPIRY_SECONDS", "60"))
+    razorpay_connect_timeout_seconds: float = float(os.getenv("RAZORPAY_CONNECT_TIMEOUT_SECONDS", "5"))
+    razorpay_read_timeout_seconds: float = float(os.getenv("RAZORPAY_READ_TIMEOUT_SECONDS", "15"))
+    razorpay_pool_timeout_seconds: float = float(os.getenv("RAZORPAY_POOL_TIMEOUT_SECONDS", "5"))
+    # Retries when no connection to Razorpay could be made (exponential backoff from the base delay)
+    razorpay_max_retries: int = int(os.getenv("RAZORPAY_MAX_RETRIES", "2"))
+    razorpay_retry_backoff_seconds: float = float(os.getenv("RAZORPAY_RETRY_BACKOFF_SECONDS", "0.5"))
+    # Secret configured for the webhook in the Razorpay dashboard (signs POST /api/payments/webhook)
+    razorpay_webhook_secret: str = os.getenv("RAZORPAY_WEBHOOK_SECRET", "")
+    # A create-order request that died before storing its order releases its Idempotency-Key after this long
+    payment_idempotency_lease_seconds: int = int(os.getenv("PAYMENT_IDEMPOTENCY_LEASE_SECONDS", "120"))
+    # Webhook events arriving within the window are written in one batch
+    payment_webhook_batch_size: int = int(os.getenv("PAYMENT_WEBHOOK_BATCH_SIZE", "100"))
+    payment_webhook_batch_window_ms: float = float(os.getenv("PAYMENT_WEBHOOK_BATCH_WINDOW_MS", "20"))
+    # Unpaid checkouts release their bookings after this long (0 disables the sweeper); swept every CHECKOUT_SWEEP_SECONDS
+    checkout_hold_seconds: int = int(os.getenv("CHECKOUT_HOLD_SECONDS", "900"))
+    checkout_sweep_seconds: float = float(os.getenv("CHECKOUT_SWEEP_SECONDS", "60"))
 
 
 settings = Settings()
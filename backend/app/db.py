@@ -1,29 +1,141 @@
-import psycopg
+import logging
+import time
 from contextlib import asynccontextmanager
+from typing import Optional
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+from . import metrics
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
+
+# Shared pool, opened and closed by the FastAPI lifespan in main.py
+pool: Optional[AsyncConnectionPool] = None
+
+# Checkout counters kept alongside psycopg_pool's own stats, used to size the pool
+_checkout_stats = {
+    "checkouts": 0,
+    "checkout_errors": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+}
+
+
+async def _configure(conn: psycopg.AsyncConnection) -> None:
+    conn.prepared_max = settings.db_prepared_max
+
+
+async def open_pool() -> None:
+    """Create and open the shared connection pool if pooling is enabled."""
+    global pool
+    if not settings.db_pool_enabled or pool is not None:
+        return
+    pool = AsyncConnectionPool(
+        settings.database_url,
+        # None turns psycopg's automatic preparing off; queries.run then skips prepare=True as well
+        kwargs={"prepare_threshold": settings.db_prepare_threshold if settings.db_prepared_statements else None},
+        configure=_configure,
+        min_size=settings.db_pool_min_size,
+        max_size=settings.db_pool_max_size,
+        timeout=settings.db_pool_timeout_seconds,
+        max_idle=settings.db_pool_max_idle_seconds,
+        max_lifetime=settings.db_pool_max_lifetime_seconds,
+        check=AsyncConnectionPool.check_connection if settings.db_pool_health_check else None,
+        name="shaadibazaarhub",
+        open=False,
+    )
+    await pool.open()
+    logger.info(
+        f"Database pool opened (min={settings.db_pool_min_size}, max={settings.db_pool_max_size})"
+    )
+
+
+async def close_pool() -> None:
+    """Close the shared connection pool, if one was opened."""
+    global pool
+    if pool is None:
+        return
+    await pool.close()
+    pool = None
+    logger.info("Database pool closed")
+
+
+def get_pool_stats() -> dict:
+    """Return pool sizing information: checkout counts, wait times and psycopg_pool stats."""
+    stats = {
+        "enabled": pool is not None,
+        "checkouts": _checkout_stats["checkouts"],
+        "checkout_errors": _checkout_stats["checkout_errors"],
+        "wait_ms_total": round(_checkout_stats["wait_ms_total"], 3),
+        "wait_ms_max": round(_checkout_stats["wait_ms_max"], 3),
+        "wait_ms_avg": round(
+            _checkout_stats["wait_ms_total"] / _checkout_stats["checkouts"], 3
+        ) if _checkout_stats["checkouts"] else 0.0,
+    }
+    if pool is not None:
+        stats["min_size"] = pool.min_size
+        stats["max_size"] = pool.max_size
+        stats["pool"] = pool.get_stats()
+    return stats
+
+
+async def _checkout() -> psycopg.AsyncConnection:
+    started = time.perf_counter()
+    try:
+        conn = await pool.getconn()
+    except Exception:
+        _checkout_stats["checkout_errors"] += 1
+        raise
+    waited_ms = (time.perf_counter() - started) * 1000.0
+    metrics.observe("db_pool_wait", waited_ms)
+    _checkout_stats["checkouts"] += 1
+    _checkout_stats["wait_ms_total"] += waited_ms
+    if waited_ms > _checkout_stats["wait_ms_max"]:
+        _checkout_stats["wait_ms_max"] = waited_ms
+    return conn
+
 
 async def get_db_conn():
-    """FastAPI dependency that yields a fresh DB connection per request."""
-    conn = await psycopg.AsyncConnection.connect(settings.database_url)
+    """FastAPI dependency that yields a DB connection for the duration of a request.
+
+    Connections come from the shared pool when it is open, otherwise a fresh
+    connection is opened and closed per request.
+    """
+    if pool is None:
+        # Closed after the request, so preparing statements on it would not pay off
+        with metrics.timer("db_connect"):
+            conn = await psycopg.AsyncConnection.connect(settings.database_url, prepare_threshold=None)
+        try:
+            yield conn
+        finally:
+            # Rollback any pending/aborted transaction and close safely
+            try:
+                if conn and not conn.closed:
+                    await conn.rollback()
+            except Exception:
+                pass
+            try:
+                if conn and not conn.closed:
+                    await conn.close()
+            except Exception:
+                pass
+        return
+
+    conn = await _checkout()
     try:
         yield conn
     finally:
-        # Rollback any pending/aborted transaction and close safely
+        # Rollback anything the handler left uncommitted before handing the connection back
         try:
-            if conn and not conn.closed:
+            if not conn.closed:
                 await conn.rollback()
         except Exception:
             pass
-        try:
-            if conn and not conn.closed:
-                await conn.close()
-        except Exception:
-            pass
+        await pool.putconn(conn)
 
 
-# Backwards-compatible context (not used by FastAPI dependencies directly)
-@asynccontextmanager
-async def get_db_conn_context():
-    async with get_db_conn() as conn:
-        yield conn
+# Context manager for code running outside FastAPI dependencies (background tasks, streaming)
+get_db_conn_context = asynccontextmanager(get_db_conn)
@@ -0,0 +1,58 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Response
+
+
+def etag_for_versions(prefix: str, versions: Iterable[tuple], extra: str = "") -> str:
+    """Strong ETag derived from (id, version) pairs, so no payload has to be serialised to compute it."""
+    digest = hashlib.blake2b(digest_size=12)
+    for object_id, version in versions:
+        digest.update(f"{object_id}:{version};".encode())
+    digest.update(extra.encode())
+    return f'"{prefix}-{digest.hexdigest()}"'
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(
+    etag: str,
+    if_none_match: Optional[str],
+    last_modified: Optional[datetime] = None,
+    if_modified_since: Optional[str] = None,
+) -> bool:
+    """Evaluate conditional request headers (RFC 9110: If-None-Match wins over If-Modified-Since)."""
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: W/"x" matches "x"
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in candidates
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have second precision
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime] = None, private: bool = False) -> None:
+    """Attach validators so clients revalidate with If-None-Match instead of refetching."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache" if private else "no-cache"
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None, private: bool = False) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified, private)
+    return response
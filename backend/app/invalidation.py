@@ -0,0 +1,118 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import psycopg
+from psycopg import sql
+
+from . import queries
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Identifies this worker process so it can skip its own notifications (it already invalidated locally)
+WORKER_ID = uuid.uuid4().hex[:12]
+
+_handlers: Dict[str, List[Callable[[dict], None]]] = {}
+# Called after the listener reconnects: events may have been missed, so local caches must be dropped
+_reset_handlers: List[Callable[[], None]] = []
+_listener_task: Optional[asyncio.Task] = None
+
+
+def register_handler(kind: str, handler: Callable[[dict], None]) -> None:
+    """Register a callback for invalidation events of the given kind ("service", "user", ...)."""
+    _handlers.setdefault(kind, []).append(handler)
+
+
+def register_reset_handler(handler: Callable[[], None]) -> None:
+    _reset_handlers.append(handler)
+
+
+async def publish(conn, kind: str, action: str, object_id: Optional[int]) -> None:
+    """Queue an invalidation event on the connection's current transaction.
+
+    Postgres delivers NOTIFY only when the transaction commits, so other workers
+    never evict ahead of the write becoming visible, and nothing is sent if it
+    rolls back.
+    """
+    if not settings.cache_invalidation_enabled:
+        return
+    event = {"kind": kind, "action": action, "id": object_id, "origin": WORKER_ID}
+    async with conn.cursor() as cur:
+        await queries.run(
+            cur,
+            queries.INVALIDATION_PUBLISH,
+            (settings.cache_invalidation_channel, json.dumps(event, separators=(",", ":"))),
+        )
+
+
+def dispatch(event: dict) -> None:
+    """Run the local handlers for an event."""
+    for handler in _handlers.get(event.get("kind"), ()):
+        try:
+            handler(event)
+        except Exception as e:
+            logger.error(f"Invalidation handler failed for {event}: {str(e)}")
+
+
+def _reset_local_caches() -> None:
+    for handler in _reset_handlers:
+        try:
+            handler()
+        except Exception as e:
+            logger.error(f"Cache reset handler failed: {str(e)}")
+
+
+async def _listen_forever() -> None:
+    delay = 1.0
+    connected_before = False
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(settings.database_url, autocommit=True) as conn:
+                await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(settings.cache_invalidation_channel)))
+                if connected_before:
+                    # Writes made while we were reconnecting were not seen
+                    _reset_local_caches()
+                connected_before = True
+                delay = 1.0
+                logger.info(f"Listening for cache invalidations on '{settings.cache_invalidation_channel}'")
+                async for notify in conn.notifies():
+                    try:
+                        event = json.loads(notify.payload)
+                    except ValueError:
+                        logger.warning(f"Ignoring malformed invalidation payload: {notify.payload!r}")
+                        continue
+                    if event.get("origin") == WORKER_ID:
+                        continue
+                    dispatch(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Cache invalidation listener error, retrying in {delay:.0f}s: {str(e)}")
+            # While disconnected we cannot see other workers' writes, so stop serving cached data
+            _reset_local_caches()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+def start_listener() -> None:
+    """Start the background LISTEN task for this worker (called from the app lifespan)."""
+    global _listener_task
+    if not settings.cache_invalidation_enabled or _listener_task is not None:
+        return
+    _listener_task = asyncio.create_task(_listen_forever())
+
+
+async def stop_listener() -> None:
+    global _listener_task
+    if _listener_task is None:
+        return
+    _listener_task.cancel()
+    try:
+        await _listener_task
+    except asyncio.CancelledError:
+        pass
+    _listener_task = None
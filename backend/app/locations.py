@@ -0,0 +1,33 @@
+from typing import Dict, Optional
+
+
+def normalize_location(text: Optional[str]) -> str:
+    """Lower-case and collapse whitespace the same way location_aliases.alias is stored."""
+    if not text:
+        return ""
+    return " ".join(text.split()).lower()
+
+
+def escape_like(text: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# SQL condition matching services in the location the user typed (named parameters from location_params).
+# The input is resolved through location_aliases (exact alias first, then the closest trigram match) so
+# "Mumbai", "mumbai " and "Bombay" all select the canonical city. Both ILIKE patterns are served by the
+# pg_trgm index on services.location, so neither side needs a sequential scan. The city is LIKE-escaped
+# in SQL the same way escape_like escapes the user's input.
+LOCATION_FILTER_SQL = (
+    "(location ILIKE %(location_pattern)s OR location ILIKE ("
+    "SELECT '%%' || replace(replace(replace(city, '\\', '\\\\'), '%%', '\\%%'), '_', '\\_') || '%%' "
+    "FROM location_aliases "
+    "WHERE alias = %(location)s OR alias %% %(location)s "
+    "ORDER BY alias = %(location)s DESC, similarity(alias, %(location)s) DESC LIMIT 1))"
+)
+
+
+def location_params(text: str) -> Dict[str, str]:
+    """Parameters for LOCATION_FILTER_SQL."""
+    normalized = normalize_location(text)
+    return {"location_pattern": f"%{escape_like(normalized)}%", "location": normalized}
@@ -1,14 +1,49 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
 from .routes import auth as auth_routes
 from .routes import services as services_routes
 from .routes import bookings as bookings_routes
 from .routes import payments as payments_routes
+from .routes import locations as locations_routes
+from . import metrics, queries
 from .config import settings
+from .db import open_pool, close_pool, get_pool_stats
+from .cache import service_cache, user_cache, token_cache
+from .invalidation import start_listener, stop_listener
+from .security import shutdown_password_hashing
+from .services import checkout_holds, notification_outbox, notification_dispatcher, payment_reconciler, templates
+from .services.payments import razorpay_gateway
+from .services.whatsapp import twilio_whatsapp_service
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    templates.compile_templates()
+    await open_pool()
+    start_listener()
+    await twilio_whatsapp_service.start()
+    await razorpay_gateway.start()
+    notification_outbox.start_worker()
+    checkout_holds.start_worker()
+    try:
+        yield
+    finally:
+        await checkout_holds.stop_worker()
+        # Writes the webhook events still queued, so it runs while the pool is open
+        await payment_reconciler.stop()
+        await notification_outbox.stop_worker()
+        await razorpay_gateway.aclose()
+        await twilio_whatsapp_service.aclose()
+        await stop_listener()
+        await close_pool()
+        shutdown_password_hashing()
 
-app = FastAPI(title="ShaadiBazaarHub API", version="0.1.0")
+
+app = FastAPI(title="ShaadiBazaarHub API", version="0.1.0", lifespan=lifespan)
 
 # Configure CORS with frontend URL
 app.add_middleware(
@@ -17,16 +52,61 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser tooling on the frontend origin read the timing breakdown
+    expose_headers=["Server-Timing"],
 )
 
+# Added last so it wraps CORS too and times the whole request
+if settings.metrics_enabled:
+    app.add_middleware(metrics.InstrumentationMiddleware)
+
 
 @app.get("/health")
 def health_check():
     return {"status": "ok", "database": f"{settings.db_host}:{settings.db_port}/{settings.db_name}"}
 
 
+@app.get("/health/db")
+def db_pool_stats():
+    return get_pool_stats()
+
+
+@app.get("/health/queries")
+def query_stats():
+    return {
+        "prepared_statements": settings.db_prepared_statements and settings.db_pool_enabled,
+        "prepare_threshold": settings.db_prepare_threshold,
+        "queries": queries.get_stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=metrics.render(queries.registered(), get_pool_stats()), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/health/cache")
+def cache_stats():
+    return {
+        "services": service_cache.get_stats(),
+        "users": user_cache.get_stats(),
+        "tokens": token_cache.get_stats(),
+    }
+
+
+@app.get("/health/notifications")
+async def notification_stats():
+    return {
+        "queue": await notification_outbox.get_queue_stats(),
+        "dispatcher": notification_dispatcher.get_stats(),
+    }
+
+
 app.include_router(auth_routes.router, prefix="/api/auth", tags=["auth"])
 app.include_router(services_routes.router, prefix="/api/services", tags=["services"])
+app.include_router(locations_routes.router, prefix="/api/locations", tags=["locations"])
 app.include_router(bookings_routes.router, prefix="/api/bookings", tags=["bookings"])
 app.include_router(payments_routes.router, prefix="/api/payments", tags=["payments"])
 
@@ -0,0 +1,230 @@
+"""Request timing: per-route latency, per-request breakdown and Prometheus export.
+
+InstrumentationMiddleware times every HTTP request and keeps a latency
+histogram per (method, route, status). While a request runs, the time spent in
+named operations (database statements via app.queries, pool checkout, bcrypt,
+Razorpay and Twilio calls, JSON serialisation) is added to a breakdown held in a
+context variable; it is sent back as a `Server-Timing` header and also recorded
+in one histogram per operation. GET /metrics renders everything, plus the
+per-statement histograms of app.queries, in the Prometheus text format.
+
+Recording is a perf_counter() pair, a context variable lookup and a few integer
+updates, cheap enough to leave on in production.
+"""
+
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import settings
+
+
+# Upper bounds of the latency buckets in milliseconds; slower observations fall in a last, open-ended bucket
+BUCKETS_MS = (0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0, 2500.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds) with count, sum and max."""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, elapsed_ms: float) -> None:
+        self.counts[bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the given fraction of observations (the max for the last bucket)."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(BUCKETS_MS[i], self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+# Operation name -> [count, total ms] for the request being handled in this context
+_current: ContextVar[Optional[Dict[str, list]]] = ContextVar("request_timings", default=None)
+
+_routes: Dict[Tuple[str, str, int], Histogram] = {}
+_operations: Dict[str, Histogram] = {}
+
+
+def add_to_request(operation: str, elapsed_ms: float) -> None:
+    """Add time to the current request's breakdown only (callers keep their own histogram, e.g. app.queries)."""
+    timings = _current.get()
+    if timings is None:
+        return
+    entry = timings.get(operation)
+    if entry is None:
+        timings[operation] = [1, elapsed_ms]
+    else:
+        entry[0] += 1
+        entry[1] += elapsed_ms
+
+
+def observe(operation: str, elapsed_ms: float) -> None:
+    """Record one `operation` (e.g. "bcrypt", "razorpay") globally and against the current request."""
+    histogram = _operations.get(operation)
+    if histogram is None:
+        histogram = _operations[operation] = Histogram()
+    histogram.observe(elapsed_ms)
+    add_to_request(operation, elapsed_ms)
+
+
+class timer:
+    """`with timer("bcrypt"): ...` observes the block (a class: cheaper than a generator-based context manager)."""
+
+    __slots__ = ("operation", "started")
+
+    def __init__(self, operation: str):
+        self.operation = operation
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.operation, (time.perf_counter() - self.started) * 1000.0)
+
+
+def _server_timing(timings: Dict[str, list], total_ms: float) -> bytes:
+    parts = [f'{name};desc="{count}x";dur={ms:.2f}' for name, (count, ms) in timings.items()]
+    parts.append(f"app;dur={total_ms:.2f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware (no per-request task or body buffering, unlike BaseHTTPMiddleware)."""
+
+    def __init__(self, app):
+        self.app = app
+        # Route path templates by endpoint, filled lazily from the router
+        self._route_paths: Dict[object, str] = {}
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            # No route matched (404): one label instead of one per probed URL
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is not None:
+                    self._route_paths[route.endpoint] = getattr(route, "path_format", route.path)
+            path = self._route_paths.get(endpoint, "unmatched")
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings: Dict[str, list] = {}
+        token = _current.set(timings)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.server_timing_enabled:
+                    # Headers go out before a streamed body, so only the time until now is reported
+                    elapsed_ms = (time.perf_counter() - started) * 1000.0
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timings, elapsed_ms)))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            key = (scope["method"], self._route_path(scope), status_code)
+            histogram = _routes.get(key)
+            if histogram is None:
+                histogram = _routes[key] = Histogram()
+            histogram.observe((time.perf_counter() - started) * 1000.0)
+
+
+def _label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+def _render_histogram(lines: List[str], metric: str, labels: str, histogram: Histogram) -> None:
+    cumulative = 0
+    for bound, count in zip(BUCKETS_MS, histogram.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{metric}_sum{{{labels}}} {histogram.total_ms / 1000:.6f}")
+    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+
+def render(queries: Iterable, pool_stats: dict) -> str:
+    """Prometheus text exposition of the request, operation and query histograms and the pool counters.
+
+    `queries` are app.queries.Query objects (name and histogram), `pool_stats` is db.get_pool_stats().
+    """
+    lines = [
+        "# HELP http_request_duration_seconds Time to handle HTTP requests, by route template",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route, status_code), histogram in sorted(_routes.items()):
+        _render_histogram(lines, "http_request_duration_seconds", _labels(method=method, route=route, status=status_code), histogram)
+
+    lines += [
+        "# HELP operation_duration_seconds Time spent in pool checkouts, password hashing, external APIs and serialisation",
+        "# TYPE operation_duration_seconds histogram",
+    ]
+    for operation, histogram in sorted(_operations.items()):
+        _render_histogram(lines, "operation_duration_seconds", _labels(operation=operation), histogram)
+
+    lines += [
+        "# HELP db_query_duration_seconds Execution time of each named statement in app.queries",
+        "# TYPE db_query_duration_seconds histogram",
+    ]
+    for query in queries:
+        if query.histogram.count:
+            _render_histogram(lines, "db_query_duration_seconds", _labels(query=query.name), query.histogram)
+
+    lines += [
+        "# HELP db_pool_checkouts_total Connections checked out of the pool",
+        "# TYPE db_pool_checkouts_total counter",
+        f"db_pool_checkouts_total {pool_stats['checkouts']}",
+        "# HELP db_pool_checkout_errors_total Pool checkouts that failed (timeout or connection error)",
+        "# TYPE db_pool_checkout_errors_total counter",
+        f"db_pool_checkout_errors_total {pool_stats['checkout_errors']}",
+    ]
+    pool = pool_stats.get("pool")
+    if pool is not None:
+        lines += [
+            "# HELP db_pool_size Connections currently open in the pool",
+            "# TYPE db_pool_size gauge",
+            f"db_pool_size {pool.get('pool_size', 0)}",
+            "# HELP db_pool_available Idle connections in the pool",
+            "# TYPE db_pool_available gauge",
+            f"db_pool_available {pool.get('pool_available', 0)}",
+            "# HELP db_pool_requests_waiting Requests waiting for a connection",
+            "# TYPE db_pool_requests_waiting gauge",
+            f"db_pool_requests_waiting {pool.get('requests_waiting', 0)}",
+        ]
+    return "\n".join(lines) + "\n"
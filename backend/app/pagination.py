@@ -0,0 +1,36 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Query, status
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def page_limit(limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)) -> int:
+    """FastAPI dependency for the bounded `limit` query parameter."""
+    return limit
+
+
+def encode_cursor(position: dict) -> str:
+    """Encode a keyset position as an opaque, URL-safe cursor string."""
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    """Decode a cursor produced by encode_cursor, raising 400 if it was tampered with."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(position, dict) or not isinstance(position.get("id"), int):
+            raise ValueError("cursor must carry an integer id")
+        if "rank" in position and not isinstance(position["rank"], (int, float)):
+            raise ValueError("cursor rank must be numeric")
+        return position
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
@@ -0,0 +1,679 @@
+"""Named SQL statements, prepared on the server and timed per statement.
+
+Every statement the app runs is declared here once and executed with `run()`.
+psycopg prepares a statement on a connection once it has run there
+DB_PREPARE_THRESHOLD times, or on first use for statements declared with
+`prepare=True`, so on pooled connections the parse/plan cost is paid once per
+connection instead of once per request. Statements whose WHERE clause depends on
+the request (search, location, cursor, inbox filters) come from the cached
+builders below: each combination is its own named statement and is prepared like
+a static one.
+
+Each statement keeps a latency histogram; /health/queries lists them by total
+time and /metrics exports them. Every execution is also added to the current
+request's "db" timing (see app.metrics). Statements executed inside a pipeline
+are timed with `timed()` around the pipeline, since their results only arrive
+when it is synced.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from psycopg import AsyncServerCursor
+
+from . import metrics
+from .locations import LOCATION_FILTER_SQL
+from .metrics import Histogram
+
+
+class Query:
+    """A named statement. `prepare` is passed to execute(): True prepares it on first use, None leaves it to the threshold."""
+
+    __slots__ = ("name", "sql", "prepare", "histogram")
+
+    def __init__(self, name: str, sql: str, prepare: Optional[bool]):
+        self.name = name
+        self.sql = sql
+        self.prepare = prepare
+        self.histogram = Histogram()
+
+
+_registry: Dict[str, Query] = {}
+
+
+def statement(name: str, sql: str, prepare: Optional[bool] = None) -> Query:
+    """Declare a statement; names are unique so each one has a single definition and histogram."""
+    if name in _registry:
+        raise ValueError(f"Query {name!r} is already registered")
+    query = Query(name, sql, prepare)
+    _registry[name] = query
+    return query
+
+
+def registered() -> List[Query]:
+    return list(_registry.values())
+
+
+@contextmanager
+def timed(query: Query):
+    """Record the time spent in the block against `query` (used around pipelines)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        query.histogram.observe(elapsed_ms)
+        metrics.add_to_request("db", elapsed_ms)
+
+
+async def run(cur, query: Query, params=None, record: bool = True):
+    """Execute `query` on `cur` and record its latency; returns the cursor.
+
+    Pass record=False inside a pipeline and wrap the pipeline in timed() instead.
+    """
+    started = time.perf_counter()
+    try:
+        if isinstance(cur, AsyncServerCursor):
+            # DECLARE ... CURSOR cannot use a prepared statement
+            await cur.execute(query.sql, params)
+        elif query.prepare and cur.connection.prepare_threshold is None:
+            # Prepared statements are off for this connection (unpooled, or DB_PREPARED_STATEMENTS=false)
+            await cur.execute(query.sql, params, prepare=False)
+        else:
+            await cur.execute(query.sql, params, prepare=query.prepare)
+    finally:
+        if record:
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            query.histogram.observe(elapsed_ms)
+            metrics.add_to_request("db", elapsed_ms)
+    return cur
+
+
+def get_stats() -> List[dict]:
+    """Per-statement call counts and latencies, the most expensive (by total time) first."""
+    stats = []
+    for query in _registry.values():
+        h = query.histogram
+        if not h.count:
+            continue
+        stats.append({
+            "name": query.name,
+            "prepare": "always" if query.prepare else "never" if query.prepare is False else "threshold",
+            "calls": h.count,
+            "total_ms": round(h.total_ms, 3),
+            "mean_ms": round(h.total_ms / h.count, 3),
+            "p50_ms": round(h.percentile(0.5), 3),
+            "p95_ms": round(h.percentile(0.95), 3),
+            "p99_ms": round(h.percentile(0.99), 3),
+            "max_ms": round(h.max_ms, 3),
+        })
+    stats.sort(key=lambda s: s["total_ms"], reverse=True)
+    return stats
+
+
+# Users
+
+USER_ID_BY_EMAIL = statement("users.id_by_email", "SELECT id FROM users WHERE email = %s")
+
+USER_INSERT = statement(
+    "users.insert",
+    """
+    INSERT INTO users (name, email, mobile, whatsapp_number, address, role, password_hash)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    RETURNING id, name, email, mobile, whatsapp_number, address, role
+    """,
+)
+
+USER_CREDENTIALS = statement(
+    "users.credentials", "SELECT id, email, password_hash, role FROM users WHERE email = %s", prepare=True
+)
+
+USER_SET_PASSWORD_HASH = statement("users.set_password_hash", "UPDATE users SET password_hash = %s WHERE id = %s")
+
+USER_PROFILE = statement(
+    "users.profile",
+    "SELECT id, name, email, mobile, whatsapp_number, address, role FROM users WHERE id = %s",
+    prepare=True,
+)
+
+
+# Services
+
+# ServicePublic fields; price comes back as float8 so rows carry the type the model declares instead of Decimal
+SERVICE_COLUMNS = "id, provider_id, name, description, price::float8 AS price, photo_url, location, daily_capacity"
+
+SERVICE_INSERT = statement(
+    "services.insert",
+    f"""
+    INSERT INTO services (provider_id, name, description, price, photo_url, location, daily_capacity)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    RETURNING {SERVICE_COLUMNS}
+    """,
+)
+
+SERVICE_BY_ID = statement(
+    "services.by_id", f"SELECT {SERVICE_COLUMNS}, version, updated_at FROM services WHERE id = %s", prepare=True
+)
+
+SERVICE_OWNER = statement("services.owner", "SELECT provider_id FROM services WHERE id = %s")
+
+SERVICE_UPDATE = statement(
+    "services.update",
+    f"""
+    UPDATE services SET name=%s, description=%s, price=%s, photo_url=%s, location=%s, daily_capacity=%s
+    WHERE id=%s
+    RETURNING {SERVICE_COLUMNS}
+    """,
+)
+
+SERVICE_DELETE = statement("services.delete", "DELETE FROM services WHERE id = %s")
+
+# One row per day of the month, joined to the occupancy counters by primary key: O(days), not O(bookings)
+SERVICE_AVAILABILITY = statement(
+    "services.availability",
+    """
+    SELECT d::date, COALESCE(o.booked, 0), s.daily_capacity
+    FROM services s
+    CROSS JOIN generate_series(%s::date, %s::date + INTERVAL '1 month' - INTERVAL '1 day', INTERVAL '1 day') AS d
+    LEFT JOIN service_day_occupancy o ON o.service_id = s.id AND o.event_date = d::date
+    WHERE s.id = %s
+    ORDER BY d
+    """,
+)
+
+SERVICES_EXPORT_NDJSON = statement(
+    "services.export_ndjson",
+    """
+    SELECT json_build_object(
+        'name', name, 'description', description, 'price', price,
+        'photo_url', photo_url, 'location', location, 'daily_capacity', daily_capacity
+    )::text
+    FROM services
+    WHERE provider_id = %s
+    ORDER BY id
+    """,
+)
+
+
+def _variant(name: str, flags: Dict[str, bool]) -> str:
+    enabled = [flag for flag, on in flags.items() if on]
+    return f"{name}[{','.join(enabled)}]" if enabled else name
+
+
+# The builders are cached on positional arguments only, so every variant is registered exactly once
+@lru_cache(maxsize=None)
+def _services_list(ranked: bool, located: bool, after: bool) -> Query:
+    if ranked:
+        # Full-text search over the weighted search_vector column (GIN indexed), best matches first
+        sql = (
+            f"SELECT {SERVICE_COLUMNS}, version, ts_rank(search_vector, q) AS rank "
+            "FROM services, to_tsquery('english', %(search)s) AS q"
+        )
+        filters = ["search_vector @@ q"]
+    else:
+        sql = f"SELECT {SERVICE_COLUMNS}, version FROM services"
+        filters = []
+    if located:
+        filters.append(LOCATION_FILTER_SQL)
+    if after:
+        # Keyset: continue strictly after the last row of the previous page
+        if ranked:
+            filters.append("(ts_rank(search_vector, q), id) < (%(after_rank)s::real, %(after_id)s)")
+        else:
+            filters.append("id < %(after_id)s")
+    if filters:
+        sql += " WHERE " + " AND ".join(filters)
+    sql += " ORDER BY rank DESC, id DESC" if ranked else " ORDER BY id DESC"
+    sql += " LIMIT %(limit)s"
+    flags = {"ranked": ranked, "located": located, "after": after}
+    # The first page of the unfiltered catalog is the hottest read in the app
+    first_page = not any(flags.values())
+    return statement(_variant("services.list", flags), sql, prepare=True if first_page else None)
+
+
+def services_list(ranked: bool, located: bool, after: bool) -> Query:
+    """Public catalog: full-text search (ranked), location filter, keyset position and page LIMIT.
+
+    Parameters are named (search, location_pattern, location, after_rank, after_id, limit) so every
+    variant takes the same dict.
+    """
+    return _services_list(ranked, located, after)
+
+
+@lru_cache(maxsize=None)
+def _services_by_provider(after: bool, stream: bool) -> Query:
+    sql = f"SELECT {SERVICE_COLUMNS}, version FROM services WHERE provider_id = %(provider_id)s"
+    if after:
+        sql += " AND id < %(after_id)s"
+    # Streams are capped too: app.streaming passes STREAM_MAX_ROWS + 1 as the limit
+    sql += " ORDER BY id DESC LIMIT %(limit)s"
+    return statement(_variant("services.by_provider", {"after": after, "stream": stream}), sql)
+
+
+def services_by_provider(after: bool, stream: bool = False) -> Query:
+    """A provider's own services; named parameters provider_id, after_id and limit."""
+    return _services_by_provider(after, stream)
+
+
+# Bookings
+
+BOOKING_COLUMNS = "id, service_id, customer_id, event_date, quantity, notes, address, duration_hours, status, version"
+
+
+def _queue_notifications(bookings: str) -> str:
+    """INSERT of the provider and admin notifications for `bookings`, a CTE name or subquery of booking rows.
+
+    Bookings written earlier in the same statement are only visible through their CTE, so the booking
+    columns come from there and the names and numbers are read from services and users here.
+    """
+    return f"""
+        INSERT INTO notifications (booking_id, kind, payload, next_attempt_at)
+        SELECT booking.id, n.kind, n.payload, NOW() + make_interval(secs => %(notify_delay)s)
+        FROM {bookings} AS booking
+        JOIN services s ON s.id = booking.service_id
+        JOIN users p ON p.id = s.provider_id
+        JOIN users c ON c.id = booking.customer_id,
+        LATERAL (VALUES
+            ('provider', jsonb_build_object(
+                'provider_whatsapp', p.whatsapp_number,
+                'customer_name', c.name,
+                'customer_mobile', c.mobile,
+                'customer_address', coalesce(booking.address, c.address),
+                'service_name', s.name,
+                'service_price', s.price,
+                'event_date', booking.event_date,
+                'quantity', booking.quantity,
+                'duration_hours', booking.duration_hours,
+                'notes', booking.notes
+            )),
+            ('admin', jsonb_build_object(
+                'customer_name', c.name,
+                'customer_email', c.email,
+                'customer_mobile', c.mobile,
+                'service_name', s.name,
+                'service_price', s.price,
+                'event_date', booking.event_date,
+                'quantity', booking.quantity,
+                'booking_address', coalesce(booking.address, c.address),
+                'duration_hours', booking.duration_hours,
+                'provider_name', p.name,
+                'provider_mobile', p.mobile,
+                'notes', booking.notes
+            ))
+        ) AS n(kind, payload)
+        -- Providers without a WhatsApp number only get the admin notification
+        WHERE n.kind = 'admin' OR p.whatsapp_number IS NOT NULL
+    """
+
+
+# Validates customer and services and inserts one booking per item, all in one statement; items are
+# parallel arrays (see bookings.create_bookings_params). Bookings are always inserted pending. Unpaid
+# bookings queue their WhatsApp notifications in the outbox right away; checkout passes payment_id (the
+# payment it has just reserved) and its bookings are only announced once the payment is verified or captured.
+CREATE_BOOKINGS = statement(
+    "bookings.create",
+    f"""
+    WITH customer AS (
+        SELECT id FROM users WHERE id = %(customer_id)s
+    ), item AS (
+        SELECT *
+        FROM unnest(%(service_ids)s::int[], %(event_dates)s::date[], %(quantities)s::int[], %(notes)s::text[],
+                    %(addresses)s::text[], %(durations)s::int[])
+            AS i(service_id, event_date, quantity, notes, address, duration_hours)
+    ), service AS (
+        SELECT id FROM services WHERE id IN (SELECT service_id FROM item)
+    ), payment AS (
+        SELECT id FROM payments
+        WHERE id = %(payment_id)s AND customer_id = %(customer_id)s AND status = 'created'
+    ), booking AS (
+        INSERT INTO bookings (service_id, customer_id, event_date, quantity, notes, address, duration_hours, status, payment_id)
+        SELECT service.id, %(customer_id)s::int, item.event_date, item.quantity, item.notes,
+               item.address, item.duration_hours, 'pending', payment.id
+        FROM item
+        JOIN service ON service.id = item.service_id
+        CROSS JOIN customer
+        LEFT JOIN payment ON true
+        WHERE %(payment_id)s::int IS NULL OR payment.id IS NOT NULL
+        RETURNING {BOOKING_COLUMNS}
+    ), queued AS (
+        {_queue_notifications("(SELECT * FROM booking WHERE %(payment_id)s::int IS NULL)")}
+    )
+    SELECT {BOOKING_COLUMNS}
+    FROM booking
+    ORDER BY id
+    """,
+    prepare=True,
+)
+
+
+def _owner_column(role: Optional[str]) -> str:
+    # Customers act on their own bookings, providers on the bookings for their services (bookings.provider_id)
+    return "customer_id" if role == "customer" else "provider_id"
+
+
+@lru_cache(maxsize=None)
+def _booking_inbox(owner_column: str, status: bool, date_from: bool, date_to: bool, after: bool, stream: bool) -> Query:
+    filters = [f"{owner_column} = %(owner_id)s"]
+    if status:
+        filters.append("status = %(status)s")
+    if date_from:
+        filters.append("event_date >= %(date_from)s")
+    if date_to:
+        filters.append("event_date <= %(date_to)s")
+    if after:
+        filters.append("id < %(after_id)s")
+    where = " AND ".join(filters)
+    flags = {"status": status, "from": date_from, "to": date_to, "after": after, "stream": stream}
+    # Opening the bookings page runs the unfiltered first page
+    first_page = not any(flags.values())
+    name = _variant(f"bookings.inbox_{owner_column.split('_')[0]}", flags)
+    if stream:
+        return statement(name, f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE {where} ORDER BY id DESC LIMIT %(limit)s")
+    # The page of ids comes from an index-only scan of the inbox index (filters use its INCLUDE columns),
+    # then only those rows are fetched by primary key
+    return statement(
+        name,
+        f"""
+        WITH page AS (
+            SELECT id FROM bookings
+            WHERE {where}
+            ORDER BY id DESC
+            LIMIT %(limit)s
+        )
+        SELECT b.id, b.service_id, b.customer_id, b.event_date, b.quantity, b.notes, b.address, b.duration_hours, b.status, b.version
+        FROM page JOIN bookings b ON b.id = page.id
+        ORDER BY b.id DESC
+        """,
+        prepare=True if first_page else None,
+    )
+
+
+def booking_inbox(
+    role: Optional[str], status: bool, date_from: bool, date_to: bool, after: bool, stream: bool = False
+) -> Query:
+    """Bookings of the user (`role` picks the owner column); named parameters owner_id, status, date_from,
+    date_to, after_id and limit."""
+    return _booking_inbox(_owner_column(role), status, date_from, date_to, after, stream)
+
+
+# Applies to the current transaction only: a row locked by another writer fails fast instead of queueing
+SET_LOCK_TIMEOUT = statement("bookings.set_lock_timeout", "SELECT set_config('lock_timeout', %s, true)")
+
+
+@lru_cache(maxsize=None)
+def _booking_transition(owner_column: str) -> Query:
+    return statement(
+        f"bookings.transition_{owner_column.split('_')[0]}",
+        f"""
+        UPDATE bookings SET status = %s
+        WHERE id = %s AND {owner_column} = %s AND version = %s AND status = ANY(%s)
+        RETURNING {BOOKING_COLUMNS}
+        """,
+    )
+
+
+def booking_transition(role: Optional[str]) -> Query:
+    """Conditional status change of one booking owned by the user: (target, id, owner id, version, from statuses)."""
+    return _booking_transition(_owner_column(role))
+
+
+@lru_cache(maxsize=None)
+def _booking_state(owner_column: str) -> Query:
+    return statement(
+        f"bookings.state_{owner_column.split('_')[0]}",
+        f"SELECT {owner_column} AS owner_id, status, version FROM bookings WHERE id = %s",
+    )
+
+
+def booking_state(role: Optional[str]) -> Query:
+    """Owner, status and version of a booking, read to explain a transition that matched no row."""
+    return _booking_state(_owner_column(role))
+
+
+BOOKINGS_BULK_STATUS = statement(
+    "bookings.bulk_status",
+    """
+    UPDATE bookings b SET status = %s
+    FROM unnest(%s::int[], %s::int[]) AS r(id, version)
+    WHERE b.id = r.id AND b.version = r.version AND b.provider_id = %s AND b.status = ANY(%s)
+    RETURNING b.id, b.service_id, b.customer_id, b.event_date, b.quantity, b.notes, b.address, b.duration_hours, b.status, b.version
+    """,
+)
+
+BOOKINGS_BY_PAYMENT = statement(
+    "bookings.by_payment", f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE payment_id = %s ORDER BY id"
+)
+
+
+# Payments
+
+PAYMENT_BY_KEY = statement(
+    "payments.by_key",
+    "SELECT id, amount, currency, receipt, order_payload FROM payments WHERE customer_id = %s AND idempotency_key = %s",
+)
+
+# Returns no row when a concurrent request inserted the key after this statement's snapshot was taken
+PAYMENT_RESERVE_ORDER = statement(
+    "payments.reserve_order",
+    """
+    WITH inserted AS (
+        INSERT INTO payments (customer_id, idempotency_key, amount, currency, receipt)
+        VALUES (%(customer_id)s, %(key)s, %(amount)s, %(currency)s, %(receipt)s)
+        ON CONFLICT (customer_id, idempotency_key) DO NOTHING
+        RETURNING id, amount, currency, receipt, order_payload, true AS owned
+    ), existing AS (
+        -- A reservation whose request died before storing the order is taken over after the lease
+        UPDATE payments SET updated_at = NOW()
+        WHERE customer_id = %(customer_id)s AND idempotency_key = %(key)s
+          AND order_payload IS NULL AND updated_at < NOW() - make_interval(secs => %(lease)s)
+        RETURNING id, amount, currency, receipt, order_payload, true AS owned
+    )
+    SELECT * FROM inserted
+    UNION ALL
+    SELECT * FROM existing
+    UNION ALL
+    -- Only when this request did not take the key, so an owned row never depends on branch order
+    SELECT id, amount, currency, receipt, order_payload, false
+    FROM payments
+    WHERE customer_id = %(customer_id)s AND idempotency_key = %(key)s
+      AND NOT EXISTS (SELECT 1 FROM inserted) AND NOT EXISTS (SELECT 1 FROM existing)
+    """,
+)
+
+# Total from services.price for every item in one query; the client never sends an amount. A total of 0
+# fails the amount > 0 check and one beyond payments.amount (integer paise) raises NumericValueOutOfRange.
+PAYMENT_RESERVE_CHECKOUT = statement(
+    "payments.reserve_checkout",
+    """
+    WITH item AS (
+        SELECT * FROM unnest(%(service_ids)s::int[], %(quantities)s::int[]) AS i(service_id, quantity)
+    ), priced AS (
+        SELECT count(s.id) AS found, count(*) AS wanted, sum(round(s.price * 100) * i.quantity)::bigint AS amount
+        FROM item LEFT JOIN services s ON s.id = i.service_id
+    )
+    INSERT INTO payments (customer_id, idempotency_key, amount, currency, receipt)
+    SELECT %(customer_id)s, %(key)s, amount, %(currency)s, %(receipt)s
+    FROM priced
+    WHERE found = wanted
+    ON CONFLICT (customer_id, idempotency_key) DO NOTHING
+    RETURNING id, amount
+    """,
+)
+
+PAYMENT_STORE_ORDER = statement(
+    "payments.store_order", "UPDATE payments SET order_id = %s, order_payload = %s, updated_at = NOW() WHERE id = %s"
+)
+
+PAYMENT_RELEASE = statement("payments.release", "DELETE FROM payments WHERE id = %s AND order_id IS NULL")
+
+PAYMENT_RELEASE_BOOKINGS = statement(
+    "payments.release_bookings", "UPDATE bookings SET status = 'cancelled' WHERE payment_id = %s AND status = 'pending'"
+)
+
+# Confirms the bookings of a paid order and queues their notifications (checkout bookings are only
+# announced once paid). An expired checkout keeps its status (its bookings are already cancelled) but
+# records the payment, to refund it.
+PAYMENT_VERIFY = statement(
+    "payments.verify",
+    f"""
+    WITH paid AS (
+        UPDATE payments
+        SET payment_id = %(payment_id)s, status = CASE status WHEN 'expired' THEN 'expired' ELSE 'captured' END,
+            updated_at = NOW()
+        WHERE order_id = %(order_id)s AND customer_id = %(customer_id)s
+        RETURNING id, status
+    ), confirmed AS (
+        UPDATE bookings b SET status = 'confirmed'
+        FROM paid
+        WHERE b.payment_id = paid.id AND paid.status = 'captured' AND b.status = 'pending'
+        RETURNING b.id, b.service_id, b.customer_id, b.event_date, b.quantity, b.notes, b.address, b.duration_hours
+    ), queued AS (
+        {_queue_notifications("confirmed")}
+    )
+    SELECT paid.status, ARRAY(SELECT id FROM confirmed ORDER BY id) FROM paid
+    """,
+)
+
+# payment.failed is the outcome of one attempt: the customer can retry on the same order, so it is only
+# counted and neither the payment nor its bookings move. Captured is final, confirms the bookings and
+# queues their notifications. Events are grouped per order here: an order captured in the batch ignores
+# its failures in the batch.
+PAYMENT_APPLY_EVENTS = statement(
+    "payments.apply_events",
+    f"""
+    WITH event AS (
+        SELECT * FROM unnest(%(order_ids)s::text[], %(payment_ids)s::text[], %(statuses)s::text[])
+            AS e(order_id, payment_id, status)
+    ), capture AS (
+        SELECT DISTINCT ON (order_id) order_id, payment_id FROM event WHERE status = 'captured'
+    ), failure AS (
+        SELECT order_id, count(*) AS attempts FROM event
+        WHERE status = 'failed' AND order_id NOT IN (SELECT order_id FROM capture)
+        GROUP BY order_id
+    ), paid AS (
+        UPDATE payments p
+        SET status = CASE p.status WHEN 'expired' THEN 'expired' ELSE 'captured' END,
+            payment_id = coalesce(capture.payment_id, p.payment_id), updated_at = NOW()
+        FROM capture
+        WHERE p.order_id = capture.order_id AND p.status <> 'captured'
+        RETURNING p.id, p.order_id, p.status
+    ), failed AS (
+        UPDATE payments p
+        SET failed_attempts = p.failed_attempts + failure.attempts, updated_at = NOW()
+        FROM failure
+        WHERE p.order_id = failure.order_id AND p.status <> 'captured'
+        RETURNING p.order_id
+    ), moved AS (
+        UPDATE bookings b SET status = 'confirmed'
+        FROM paid
+        WHERE b.payment_id = paid.id AND paid.status = 'captured' AND b.status = 'pending'
+        RETURNING b.payment_id, b.id, b.service_id, b.customer_id, b.event_date, b.quantity, b.notes, b.address, b.duration_hours
+    ), queued AS (
+        {_queue_notifications("moved")}
+    )
+    SELECT paid.order_id, paid.status, count(moved.payment_id)
+    FROM paid LEFT JOIN moved ON moved.payment_id = paid.id
+    GROUP BY paid.order_id, paid.status
+    UNION ALL
+    SELECT order_id, 'failed', 0 FROM failed
+    """,
+)
+
+
+# Checkout holds not paid in time: the payment expires and its pending bookings release their slots.
+# A capture arriving later is recorded on the expired payment (see PAYMENT_VERIFY) and has to be refunded.
+CHECKOUT_EXPIRE_HOLDS = statement(
+    "payments.expire_holds",
+    """
+    WITH expired AS (
+        UPDATE payments SET status = 'expired', updated_at = NOW()
+        WHERE id IN (
+            SELECT id FROM payments
+            WHERE status = 'created' AND receipt LIKE 'cart\\_%%'
+              AND created_at < NOW() - make_interval(secs => %s)
+            ORDER BY created_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id
+    ), released AS (
+        UPDATE bookings b SET status = 'cancelled'
+        FROM expired
+        WHERE b.payment_id = expired.id AND b.status = 'pending'
+        RETURNING b.id
+    )
+    SELECT (SELECT count(*) FROM expired), (SELECT count(*) FROM released)
+    """,
+)
+
+
+# Locations
+
+# Prefix and fuzzy matches both come from the trigram index on location_aliases.alias
+LOCATION_AUTOCOMPLETE = statement(
+    "locations.autocomplete",
+    """
+    SELECT city
+    FROM location_aliases
+    WHERE alias LIKE %s OR alias %% %s
+    GROUP BY city
+    ORDER BY bool_or(alias LIKE %s) DESC, max(similarity(alias, %s)) DESC, city
+    LIMIT %s
+    """,
+    prepare=True,
+)
+
+
+# Notifications outbox and cache invalidation
+
+NOTIFICATIONS_CLAIM = statement(
+    "notifications.claim",
+    """
+    UPDATE notifications
+    SET attempts = attempts + 1,
+        next_attempt_at = NOW() + make_interval(secs => %s)
+    WHERE id IN (
+        SELECT id FROM notifications
+        WHERE status = 'pending'
+          AND (
+            next_attempt_at <= NOW()
+            -- Digest mode: pull in fresh rows for recipients that have a row due now
+            OR (%s AND attempts = 0 AND recipient IN (
+                SELECT recipient FROM notifications WHERE status = 'pending' AND next_attempt_at <= NOW()
+            ))
+          )
+        ORDER BY next_attempt_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, recipient, payload, attempts, created_at
+    """,
+    prepare=True,
+)
+
+NOTIFICATIONS_RECORD = statement(
+    "notifications.record",
+    """
+    UPDATE notifications AS n
+    SET status = r.status,
+        sent_at = CASE WHEN r.status = 'sent' THEN NOW() ELSE n.sent_at END,
+        next_attempt_at = CASE WHEN r.status = 'pending' THEN NOW() + make_interval(secs => r.delay) ELSE n.next_attempt_at END,
+        last_error = r.error
+    FROM unnest(%s::bigint[], %s::text[], %s::float8[], %s::text[]) AS r(id, status, delay, error)
+    WHERE n.id = r.id
+    """,
+)
+
+NOTIFICATIONS_QUEUE_STATS = statement(
+    "notifications.queue_stats",
+    """
+    SELECT count(*), count(*) FILTER (WHERE next_attempt_at <= NOW()),
+           EXTRACT(EPOCH FROM NOW() - min(created_at))
+    FROM notifications
+    WHERE status = 'pending'
+    """,
+)
+
+INVALIDATION_PUBLISH = statement("cache.publish_invalidation", "SELECT pg_notify(%s, %s)", prepare=True)
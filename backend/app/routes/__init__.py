@@ -1,9 +1,10 @@
-from . import auth, services, bookings
+from . import auth, services, bookings, locations
 
 __all__ = [
     "auth",
     "services",
     "bookings",
+    "locations",
 ]
 
 
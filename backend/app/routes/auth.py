@@ -1,10 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Header
 from typing import Optional
+import logging
 import psycopg
+from psycopg.rows import dict_row
 
-from ..db import get_db_conn
+from .. import queries
+from ..cache import user_cache, invalidate_user
+from ..db import get_db_conn, get_db_conn_context
+from ..invalidation import publish
+from ..rows import to_model, dump_json, json_response, model_response
 from ..schemas import UserCreate, UserLogin, UserPublic, TokenResponse
-from ..security import hash_password, verify_password, create_access_token, decode_access_token
+from ..security import hash_password_async, verify_and_update_password, create_access_token, decode_access_token_cached
+
+
+logger = logging.getLogger(__name__)
 
 
 router = APIRouter()
@@ -15,7 +24,7 @@ async def get_current_user(authorization: Optional[str] = Header(default=None)):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     token = authorization.split(" ", 1)[1]
     try:
-        payload = decode_access_token(token)
+        payload = decode_access_token_cached(token)
         return payload
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
@@ -24,37 +33,31 @@ async def get_current_user(authorization: Optional[str] = Header(default=None)):
 @router.post("/register", response_model=UserPublic)
 async def register(user: UserCreate, conn=Depends(get_db_conn)):
     try:
-        async with conn.cursor() as cur:
+        async with conn.cursor(row_factory=dict_row) as cur:
             # Check if user already exists
-            await cur.execute("SELECT id FROM users WHERE email = %s", (user.email,))
+            await queries.run(cur, queries.USER_ID_BY_EMAIL, (user.email,))
             existing_user = await cur.fetchone()
             if existing_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST, 
                     detail="User with this email already exists"
                 )
-            
+
+            # Hash only once the email is known to be free, so duplicates never take a hashing slot
+            password_hash = await hash_password_async(user.password)
+
             # Insert new user
-            await cur.execute(
-                """
-                INSERT INTO users (name, email, mobile, whatsapp_number, address, role, password_hash)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                RETURNING id, name, email, mobile, whatsapp_number, address, role
-                """,
-                (user.name, user.email, user.mobile, user.whatsapp_number, user.address, user.role, hash_password(user.password)),
+            await queries.run(
+                cur,
+                queries.USER_INSERT,
+                (user.name, user.email, user.mobile, user.whatsapp_number, user.address, user.role, password_hash),
             )
             row = await cur.fetchone()
+            await publish(conn, "user", "created", row["id"])
             await conn.commit()
+            invalidate_user(row["id"])
             
-            return UserPublic(**{
-                "id": row[0],
-                "name": row[1],
-                "email": row[2],
-                "mobile": row[3],
-                "whatsapp_number": row[4],
-                "address": row[5],
-                "role": row[6],
-            })
+            return model_response(to_model(UserPublic, row))
     except psycopg.IntegrityError as e:
         await conn.rollback()
         if "users_email_key" in str(e):
@@ -78,10 +81,7 @@ async def register(user: UserCreate, conn=Depends(get_db_conn)):
 async def login(data: UserLogin, conn=Depends(get_db_conn)):
     try:
         async with conn.cursor() as cur:
-            await cur.execute(
-                "SELECT id, email, password_hash, role FROM users WHERE email = %s", 
-                (data.email,)
-            )
+            await queries.run(cur, queries.USER_CREDENTIALS, (data.email,))
             row = await cur.fetchone()
             
             if not row:
@@ -92,11 +92,21 @@ async def login(data: UserLogin, conn=Depends(get_db_conn)):
             
             user_id, email, password_hash_value, role = row
             
-            if not verify_password(data.password, password_hash_value):
+            valid, new_hash = await verify_and_update_password(data.password, password_hash_value)
+            if not valid:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED, 
                     detail="Invalid email or password"
                 )
+
+            if new_hash:
+                # Stored hash uses an outdated bcrypt cost; upgrade it while we have the plaintext
+                try:
+                    await queries.run(cur, queries.USER_SET_PASSWORD_HASH, (new_hash, user_id))
+                    await conn.commit()
+                except Exception as e:
+                    await conn.rollback()
+                    logger.warning(f"Failed to rehash password for user {user_id}: {str(e)}")
             
             token = create_access_token(str(user_id), role)
             return TokenResponse(access_token=token)
@@ -111,26 +121,23 @@ async def login(data: UserLogin, conn=Depends(get_db_conn)):
 
 
 @router.get("/me", response_model=UserPublic)
-async def me(payload=Depends(get_current_user), conn=Depends(get_db_conn)):
+async def me(payload=Depends(get_current_user)):
     try:
         user_id = int(payload["sub"])  # subject is user id
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "SELECT id, name, email, mobile, whatsapp_number, address, role FROM users WHERE id = %s", 
-                (user_id,)
-            )
-            row = await cur.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail="User not found")
-            return UserPublic(**{
-                "id": row[0],
-                "name": row[1],
-                "email": row[2],
-                "mobile": row[3],
-                "whatsapp_number": row[4],
-                "address": row[5],
-                "role": row[6],
-            })
+        # Profiles are cached as serialised JSON
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            return json_response(cached)
+        generation = user_cache.generation
+        async with get_db_conn_context() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await queries.run(cur, queries.USER_PROFILE, (user_id,))
+                row = await cur.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="User not found")
+        body = dump_json(UserPublic, to_model(UserPublic, row))
+        user_cache.set(user_id, body, size=len(body), tags=[f"user:{user_id}"], generation=generation)
+        return json_response(body)
     except HTTPException:
         raise
     except Exception as e:
@@ -1,17 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from datetime import date
+from typing import List, Optional
 import logging
 
-from ..db import get_db_conn
-from ..schemas import BookingCreate, BookingPublic
+import psycopg
+from psycopg.rows import dict_row
+
+from .. import queries
+from ..config import settings
+from ..db import get_db_conn, get_db_conn_context
+from ..pagination import page_limit, encode_cursor, decode_cursor
+from ..rows import to_model, to_models, model_response
+from ..schemas import (
+    BookingBase, BookingCreate, BookingPublic, BookingPage, BookingStatus, BookingVersion, BookingBulkStatusUpdate, BookingBulkResult,
+)
 from .auth import get_current_user
-from ..services.whatsapp import send_booking_notification_to_provider, send_booking_notification_to_admin
+from ..services import notification_outbox
+from ..streaming import stream_json_page
 
 logger = logging.getLogger(__name__)
 
 
 router = APIRouter()
 
+# Allowed source statuses for each target status
+_TRANSITIONS = {
+    "confirmed": ["pending"],
+    "cancelled": ["pending", "confirmed"],
+}
+
+
+def create_bookings_params(customer_id: int, items: List[BookingBase], payment_id: Optional[int] = None) -> dict:
+    """Parameters of queries.CREATE_BOOKINGS: the items as parallel arrays."""
+    return {
+        "customer_id": customer_id,
+        "service_ids": [i.service_id for i in items],
+        "event_dates": [i.event_date for i in items],
+        "quantities": [i.quantity for i in items],
+        "notes": [i.notes for i in items],
+        "addresses": [i.address for i in items],
+        "durations": [i.duration_hours for i in items],
+        "payment_id": payment_id,
+        "notify_delay": notification_outbox.initial_delay_seconds(),
+    }
+
 
 @router.post("/", response_model=BookingPublic)
 async def create_booking(data: BookingCreate, payload=Depends(get_current_user), conn=Depends(get_db_conn)):
@@ -19,115 +51,152 @@ async def create_booking(data: BookingCreate, payload=Depends(get_current_user),
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Customers only")
     customer_id = int(payload["sub"])
     
-    async with conn.cursor() as cur:
-        # First, get customer and service details for WhatsApp notification
-        await cur.execute(
-            """
-            SELECT u.name, u.email, u.mobile, u.address 
-            FROM users u 
-            WHERE u.id = %s
-            """,
-            (customer_id,)
-        )
-        customer_data = await cur.fetchone()
-        
-        await cur.execute(
-            """
-            SELECT s.name, s.price, s.location, p.name as provider_name, p.mobile as provider_mobile, p.whatsapp_number as provider_whatsapp
-            FROM services s
-            JOIN users p ON s.provider_id = p.id
-            WHERE s.id = %s
-            """,
-            (data.service_id,)
-        )
-        service_data = await cur.fetchone()
-        
-        if not customer_data or not service_data:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        # Pipelining the COMMIT with the insert makes booking creation a single network round trip,
+        # and the notifications are durable as soon as the booking is.
+        try:
+            with queries.timed(queries.CREATE_BOOKINGS):
+                async with conn.pipeline():
+                    await queries.run(
+                        cur,
+                        queries.CREATE_BOOKINGS,
+                        create_bookings_params(customer_id, [data]),
+                        record=False,
+                    )
+                    await conn.commit()
+        except psycopg.errors.CheckViolation as e:
+            if e.diag.constraint_name != "service_day_capacity":
+                raise
+            # Raised by the bookings occupancy trigger when the day is already at daily_capacity
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Service is fully booked on this date")
+        row = await cur.fetchone()
+
+        if not row:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer or service not found")
-        
-        # Create the booking
-        await cur.execute(
-            """
-            INSERT INTO bookings (service_id, customer_id, event_date, quantity, notes, address, duration_hours, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, 'pending')
-            RETURNING id, service_id, customer_id, event_date, quantity, notes, address, duration_hours, status
-            """,
-            (data.service_id, customer_id, data.event_date, data.quantity, data.notes, data.address, data.duration_hours),
-        )
+
+        # Notifications are sent by the outbox worker; nudge it so they go out right away
+        notification_outbox.wake()
+
+        return model_response(to_model(BookingPublic, row))
+
+
+@router.get("/my", response_model=BookingPage)
+async def my_bookings(
+    status_filter: Optional[BookingStatus] = Query(default=None, alias="status"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    stream: bool = Query(default=False, description="Stream up to STREAM_MAX_ROWS matching bookings as one page"),
+    payload=Depends(get_current_user),
+):
+    # Customers see their own bookings, providers the bookings for their services
+    position = decode_cursor(cursor)
+    query = queries.booking_inbox(
+        payload.get("role"),
+        status=status_filter is not None,
+        date_from=date_from is not None,
+        date_to=date_to is not None,
+        after=position is not None,
+        stream=stream,
+    )
+    params = {
+        "owner_id": int(payload["sub"]),
+        "status": status_filter,
+        "date_from": date_from,
+        "date_to": date_to,
+        "after_id": position["id"] if position else None,
+        "limit": limit + 1,
+    }
+    if stream:
+        return stream_json_page(query, params, BookingPublic)
+    # Checked out here rather than as a dependency: a stream brings its own connection
+    async with get_db_conn_context() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await queries.run(cur, query, params)
+            rows = await cur.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return model_response(BookingPage(
+        items=to_models(BookingPublic, rows),
+        next_cursor=encode_cursor({"id": rows[-1]["id"]}) if has_more else None,
+    ))
+
+
+async def _set_lock_timeout(cur) -> None:
+    # Runs in the caller's pipeline, which is timed as a whole
+    await queries.run(cur, queries.SET_LOCK_TIMEOUT, (f"{settings.booking_lock_timeout_ms}ms",), record=False)
+
+
+async def _transition(conn, booking_id: int, target: str, version: int, payload: dict) -> BookingPublic:
+    """Move one booking to `target` with a single conditional UPDATE guarded by its version.
+
+    Nothing is locked up front; if the UPDATE matches no row, a plain read works out why (404/403/409).
+    """
+    user_id = int(payload["sub"])
+    transition = queries.booking_transition(payload.get("role"))
+    async with conn.cursor(row_factory=dict_row) as cur:
+        try:
+            with queries.timed(transition):
+                async with conn.pipeline():
+                    await _set_lock_timeout(cur)
+                    await queries.run(
+                        cur, transition, (target, booking_id, user_id, version, _TRANSITIONS[target]), record=False
+                    )
+                    await conn.commit()
+        except psycopg.errors.LockNotAvailable:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Booking is being updated by another request")
         row = await cur.fetchone()
-        await conn.commit()
-        
-        # Send WhatsApp notification to provider and admin (best-effort)
+        if row:
+            return to_model(BookingPublic, row)
+
+        await queries.run(cur, queries.booking_state(payload.get("role")), (booking_id,))
+        current = await cur.fetchone()
+    if not current:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    if current["owner_id"] != user_id:
+        raise HTTPException(status_code=403, detail="Not owner")
+    if current["version"] != version:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Booking was modified (current version {current['version']})")
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Cannot change a {current['status']} booking to {target}")
+
+
+@router.post("/status", response_model=BookingBulkResult)
+async def bulk_update_status(data: BookingBulkStatusUpdate, payload=Depends(get_current_user), conn=Depends(get_db_conn)):
+    if payload.get("role") != "provider":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Providers only")
+    provider_id = int(payload["sub"])
+    # Sorted ids make concurrent bulk updates lock rows in the same order
+    items = sorted({item.id: item.version for item in data.items}.items())
+    async with conn.cursor(row_factory=dict_row) as cur:
         try:
-            provider_whatsapp = service_data[5]  # provider_whatsapp
-            if provider_whatsapp:
-                await send_booking_notification_to_provider(
-                    provider_whatsapp=provider_whatsapp,
-                    customer_name=customer_data[0],   # name
-                    customer_mobile=customer_data[2], # mobile
-                    customer_address=(data.address or customer_data[3]), # booking address override or user address
-                    service_name=service_data[0],     # service_name
-                    service_price=float(service_data[1]), # service_price
-                    event_date=str(data.event_date),
-                    quantity=data.quantity,
-                    duration_hours=data.duration_hours,
-                    notes=data.notes,
-                )
-                logger.info(f"WhatsApp notification sent to provider {service_data[3]} for booking {row[0]}")
-            else:
-                logger.warning(f"Provider {service_data[3]} has no WhatsApp number configured")
-            # Also notify admin number if configured
-            await send_booking_notification_to_admin(
-                customer_name=customer_data[0],
-                customer_email=customer_data[1],
-                customer_mobile=customer_data[2],
-                service_name=service_data[0],
-                service_price=float(service_data[1]),
-                event_date=str(data.event_date),
-                quantity=data.quantity,
-                booking_address=(data.address or customer_data[3]),
-                duration_hours=data.duration_hours,
-                provider_name=service_data[3],
-                provider_mobile=service_data[4],
-                notes=data.notes,
-            )
-        except Exception as e:
-            logger.error(f"Failed to send WhatsApp notification: {str(e)}")
-            # Don't fail the booking if WhatsApp fails
-        
-        return BookingPublic(
-            id=row[0], service_id=row[1], customer_id=row[2], event_date=row[3], quantity=row[4], notes=row[5], address=row[6], duration_hours=row[7], status=row[8]
-        )
-
-
-@router.get("/my", response_model=List[BookingPublic])
-async def my_bookings(payload=Depends(get_current_user), conn=Depends(get_db_conn)):
-    role = payload.get("role")
-    user_id = int(payload["sub"])
-    async with conn.cursor() as cur:
-        if role == "customer":
-            await cur.execute(
-                "SELECT id, service_id, customer_id, event_date, quantity, notes, address, duration_hours, status FROM bookings WHERE customer_id=%s ORDER BY id DESC",
-                (user_id,),
-            )
-        else:
-            # provider: bookings for their services
-            await cur.execute(
-                """
-                SELECT b.id, b.service_id, b.customer_id, b.event_date, b.quantity, b.notes, b.address, b.duration_hours, b.status
-                FROM bookings b
-                JOIN services s ON s.id = b.service_id
-                WHERE s.provider_id = %s
-                ORDER BY b.id DESC
-                """,
-                (user_id,),
-            )
+            with queries.timed(queries.BOOKINGS_BULK_STATUS):
+                async with conn.pipeline():
+                    await _set_lock_timeout(cur)
+                    await queries.run(
+                        cur,
+                        queries.BOOKINGS_BULK_STATUS,
+                        (data.status, [i for i, _ in items], [v for _, v in items], provider_id, _TRANSITIONS[data.status]),
+                        record=False,
+                    )
+                    await conn.commit()
+        except psycopg.errors.LockNotAvailable:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Some bookings are being updated by another request")
         rows = await cur.fetchall()
-        return [
-            BookingPublic(
-                id=r[0], service_id=r[1], customer_id=r[2], event_date=r[3], quantity=r[4], notes=r[5], address=r[6], duration_hours=r[7], status=r[8]
-            ) for r in rows
-        ]
+    updated = to_models(BookingPublic, sorted(rows, key=lambda r: r["id"]))
+    updated_ids = {b.id for b in updated}
+    # Stale versions, bookings of other providers and invalid transitions are reported back, not applied
+    return model_response(BookingBulkResult(updated=updated, conflicts=[i for i, _ in items if i not in updated_ids]))
+
 
+@router.post("/{booking_id}/confirm", response_model=BookingPublic)
+async def confirm_booking(booking_id: int, data: BookingVersion, payload=Depends(get_current_user), conn=Depends(get_db_conn)):
+    if payload.get("role") != "provider":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Providers only")
+    return model_response(await _transition(conn, booking_id, "confirmed", data.version, payload))
 
 
+@router.post("/{booking_id}/cancel", response_model=BookingPublic)
+async def cancel_booking(booking_id: int, data: BookingVersion, payload=Depends(get_current_user), conn=Depends(get_db_conn)):
+    # Customers cancel their own bookings, providers bookings for their services
+    return model_response(await _transition(conn, booking_id, "cancelled", data.version, payload))
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, Query
+
+from .. import queries
+from ..db import get_db_conn
+from ..locations import escape_like, normalize_location
+from ..schemas import LocationSuggestions
+
+
+router = APIRouter()
+
+
+@router.get("/autocomplete", response_model=LocationSuggestions)
+async def autocomplete_locations(
+    q: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=25),
+    conn=Depends(get_db_conn),
+):
+    normalized = normalize_location(q)
+    if not normalized:
+        return LocationSuggestions(items=[])
+    prefix = escape_like(normalized) + "%"
+    async with conn.cursor() as cur:
+        await queries.run(cur, queries.LOCATION_AUTOCOMPLETE, (prefix, normalized, prefix, normalized, limit))
+        rows = await cur.fetchall()
+        return LocationSuggestions(items=[r[0] for r in rows])
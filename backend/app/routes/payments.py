@@ -1,11 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-import hmac
-import hashlib
-import razorpay
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from typing import Optional
+import json
+import logging
+import uuid
 
+import psycopg
+
+from .. import queries
 from ..config import settings
+from ..db import get_db_conn, get_db_conn_context
+from ..rows import model_response, to_models
+from ..schemas import BookingPublic, CheckoutRequest, CheckoutResult
 from .auth import get_current_user
+from .bookings import create_bookings_params
+from ..services import notification_outbox, payment_reconciler
+from ..services.payments import PaymentGatewayError, RazorpayGateway, razorpay_gateway
+
+logger = logging.getLogger(__name__)
 
 
 router = APIRouter()
@@ -23,13 +38,22 @@ class VerifyRequest(BaseModel):
     razorpay_signature: str
 
 
-def get_client() -> razorpay.Client:
-    if not settings.razorpay_key_id or not settings.razorpay_key_secret:
+# Webhook events reconciled into payments (and their bookings)
+_WEBHOOK_STATUSES = {
+    "payment.captured": "captured",
+    "order.paid": "captured",
+    "payment.failed": "failed",
+}
+
+
+def get_gateway() -> RazorpayGateway:
+    """Payment gateway dependency; override it (app.dependency_overrides) to run against a stub."""
+    if not razorpay_gateway.configured:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Razorpay is not configured"
         )
-    return razorpay.Client(auth=(settings.razorpay_key_id, settings.razorpay_key_secret))
+    return razorpay_gateway
 
 
 @router.get("/config")
@@ -39,31 +63,227 @@ async def get_config():
     return {"key_id": settings.razorpay_key_id}
 
 
+async def _store_order(payment_id: int, order: dict) -> None:
+    async with get_db_conn_context() as conn:
+        async with conn.cursor() as cur:
+            await queries.run(cur, queries.PAYMENT_STORE_ORDER, (order["id"], Jsonb(order), payment_id))
+        await conn.commit()
+
+
+async def _reserve_order(customer_id: int, key: str, body: CreateOrderRequest) -> tuple:
+    """Claim `key` for this customer; returns (payment id, stored order or None, whether this request owns the key)."""
+    async with get_db_conn_context() as conn:
+        async with conn.cursor() as cur:
+            await queries.run(
+                cur,
+                queries.PAYMENT_RESERVE_ORDER,
+                {
+                    "customer_id": customer_id,
+                    "key": key,
+                    "amount": body.amount,
+                    "currency": body.currency,
+                    "receipt": body.receipt,
+                    "lease": settings.payment_idempotency_lease_seconds,
+                },
+            )
+            row = await cur.fetchone()
+            await conn.commit()
+            if row is None:
+                # A concurrent request with the same key committed its insert after this statement
+                # started; a new statement sees it
+                await queries.run(cur, queries.PAYMENT_BY_KEY, (customer_id, key))
+                existing = await cur.fetchone()
+                await conn.commit()
+                if existing is None:
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="An order with this Idempotency-Key is still being created")
+                row = (*existing, False)
+    payment_id, amount, currency, receipt, order, owned = row
+    if (amount, currency, receipt) != (body.amount, body.currency, body.receipt):
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different order")
+    if not owned and order is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="An order with this Idempotency-Key is still being created")
+    return payment_id, order, owned
+
+
 @router.post("/create-order")
-async def create_order(body: CreateOrderRequest, _=Depends(get_current_user)):
+async def create_order(
+    body: CreateOrderRequest,
+    idempotency_key: Optional[str] = Header(default=None, max_length=255),
+    payload=Depends(get_current_user),
+    gateway: RazorpayGateway = Depends(get_gateway),
+):
+    """Create a standalone gateway order for a client-chosen amount.
+
+    Such a payment can never confirm bookings: bookings are only linked to payments priced by
+    /checkout. Receipts starting with "cart_" are reserved for checkout.
+    """
     if body.amount <= 0:
         raise HTTPException(status_code=400, detail="Invalid amount")
-    client = get_client()
+    if body.receipt.startswith("cart_"):
+        raise HTTPException(status_code=400, detail="Receipts starting with 'cart_' are reserved for checkout")
+    customer_id = int(payload["sub"])
+    # Without a key every call creates a new order
+    payment_id, order, owned = await _reserve_order(customer_id, idempotency_key or uuid.uuid4().hex, body)
+    if not owned:
+        # Repeat request: answer with the stored order, the gateway is not called again
+        return JSONResponse(order, headers={"Idempotent-Replayed": "true"})
+
+    # No connection is held while waiting for Razorpay
     try:
-        order = client.order.create({
-            "amount": body.amount,
-            "currency": body.currency,
-            "receipt": body.receipt,
-            "payment_capture": 1,
-        })
-        return order
-    except Exception as e:
+        order = await gateway.create_order(body.amount, body.currency, body.receipt)
+    except PaymentGatewayError as e:
+        # Release the key so the client can retry with it
+        async with get_db_conn_context() as conn:
+            async with conn.cursor() as cur:
+                await queries.run(cur, queries.PAYMENT_RELEASE, (payment_id,))
+            await conn.commit()
+        raise HTTPException(status_code=502, detail=f"Failed to create order: {e}")
+
+    await _store_order(payment_id, order)
+    return order
+
+
+async def _start_checkout(conn, customer_id: int, key: str, body: CheckoutRequest) -> tuple:
+    """Price the cart, reserve the payment and place its pending bookings in one transaction.
+
+    Returns (payment id, result); the result already carries its order when `key` was used before.
+    """
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await queries.run(cur, queries.PAYMENT_BY_KEY, (customer_id, key))
+        existing = await cur.fetchone()
+        if existing is None:
+            try:
+                await queries.run(
+                    cur,
+                    queries.PAYMENT_RESERVE_CHECKOUT,
+                    {
+                        "service_ids": [i.service_id for i in body.items],
+                        "quantities": [i.quantity for i in body.items],
+                        "customer_id": customer_id,
+                        "key": key,
+                        "currency": body.currency,
+                        # Razorpay receipts are limited to 40 characters
+                        "receipt": f"cart_{key}"[:40],
+                    },
+                )
+            except (psycopg.errors.CheckViolation, psycopg.errors.NumericValueOutOfRange):
+                # A total of zero (free services only) or one too large for payments.amount
+                await conn.rollback()
+                raise HTTPException(status_code=422, detail="Cart total is invalid")
+            payment = await cur.fetchone()
+            if payment is None:
+                await conn.rollback()
+                # Nothing inserted: either a service is missing or a concurrent request took the key
+                await queries.run(cur, queries.PAYMENT_BY_KEY, (customer_id, key))
+                if await cur.fetchone():
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="An order with this Idempotency-Key is still being created")
+                raise HTTPException(status_code=404, detail="Service not found")
+            try:
+                await queries.run(
+                    cur, queries.CREATE_BOOKINGS, create_bookings_params(customer_id, body.items, payment_id=payment["id"])
+                )
+            except psycopg.errors.CheckViolation as e:
+                await conn.rollback()
+                if e.diag.constraint_name != "service_day_capacity":
+                    raise
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.diag.message_primary)
+            bookings = await cur.fetchall()
+            await conn.commit()
+            return payment["id"], CheckoutResult(order={}, amount=payment["amount"], bookings=to_models(BookingPublic, bookings))
+
+        if not existing["receipt"].startswith("cart_"):
+            # The key belongs to a standalone /create-order payment, which never backs bookings
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different order")
+        if existing["order_payload"] is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="An order with this Idempotency-Key is still being created")
+        await queries.run(cur, queries.BOOKINGS_BY_PAYMENT, (existing["id"],))
+        bookings = await cur.fetchall()
+    return existing["id"], CheckoutResult(order=existing["order_payload"], amount=existing["amount"], bookings=to_models(BookingPublic, bookings))
+
+
+async def _abandon_checkout(payment_id: int) -> None:
+    """Undo a checkout whose gateway order failed: release the slots and the key."""
+    async with get_db_conn_context() as conn:
+        async with conn.cursor() as cur:
+            with queries.timed(queries.PAYMENT_RELEASE_BOOKINGS):
+                async with conn.pipeline():
+                    await queries.run(cur, queries.PAYMENT_RELEASE_BOOKINGS, (payment_id,), record=False)
+                    await queries.run(cur, queries.PAYMENT_RELEASE, (payment_id,), record=False)
+                    await conn.commit()
+
+
+@router.post("/checkout", response_model=CheckoutResult)
+async def checkout(
+    body: CheckoutRequest,
+    idempotency_key: Optional[str] = Header(default=None, max_length=255),
+    payload=Depends(get_current_user),
+    gateway: RazorpayGateway = Depends(get_gateway),
+):
+    """Book several services with one gateway order.
+
+    The bookings are created pending and linked to the payment; verifying the payment (or the
+    webhook) confirms all of them together and only then are the provider and admin notified.
+    """
+    if payload.get("role") != "customer":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Customers only")
+    customer_id = int(payload["sub"])
+    key = idempotency_key or uuid.uuid4().hex
+    async with get_db_conn_context() as conn:
+        payment_id, result = await _start_checkout(conn, customer_id, key, body)
+    if result.order:
+        response = model_response(result)
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    # No connection is held while waiting for Razorpay
+    try:
+        order = await gateway.create_order(result.amount, body.currency, f"cart_{key}"[:40])
+    except PaymentGatewayError as e:
+        await _abandon_checkout(payment_id)
         raise HTTPException(status_code=502, detail=f"Failed to create order: {e}")
+    await _store_order(payment_id, order)
+    result.order = order
+    return model_response(result)
 
 
 @router.post("/verify")
-async def verify_signature(body: VerifyRequest, _=Depends(get_current_user)):
-    # Verify signature: generated_signature = HMAC_SHA256(order_id|payment_id, secret)
+async def verify_signature(
+    body: VerifyRequest,
+    payload=Depends(get_current_user),
+    gateway: RazorpayGateway = Depends(get_gateway),
+    conn=Depends(get_db_conn),
+):
     try:
-        payload = f"{body.razorpay_order_id}|{body.razorpay_payment_id}".encode()
-        expected = hmac.new(settings.razorpay_key_secret.encode(), payload, hashlib.sha256).hexdigest()
-        if hmac.compare_digest(expected, body.razorpay_signature):
-            return {"status": "verified"}
+        if gateway.verify_payment_signature(body.razorpay_order_id, body.razorpay_payment_id, body.razorpay_signature):
+            # A valid signature means the (auto-captured) payment succeeded: mark it captured and confirm
+            # every booking paid with it in one transaction, committed in the same round trip
+            async with conn.cursor() as cur:
+                with queries.timed(queries.PAYMENT_VERIFY):
+                    async with conn.pipeline():
+                        await queries.run(
+                            cur,
+                            queries.PAYMENT_VERIFY,
+                            {
+                                "payment_id": body.razorpay_payment_id,
+                                "order_id": body.razorpay_order_id,
+                                "customer_id": int(payload["sub"]),
+                                "notify_delay": notification_outbox.initial_delay_seconds(),
+                            },
+                            record=False,
+                        )
+                        await conn.commit()
+                row = await cur.fetchone()
+            if row is not None and row[0] == "expired":
+                logger.warning(f"Payment {body.razorpay_payment_id} for expired order {body.razorpay_order_id} needs a refund")
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="The booking hold expired before payment; the amount will be refunded",
+                )
+            confirmed = row[1] if row is not None else []
+            if confirmed:
+                # The confirmed bookings' notifications were queued with them
+                notification_outbox.wake()
+            return {"status": "verified", "confirmed": confirmed}
         raise HTTPException(status_code=400, detail="Signature verification failed")
     except HTTPException:
         raise
@@ -71,3 +291,25 @@ async def verify_signature(body: VerifyRequest, _=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail=f"Verification error: {e}")
 
 
+@router.post("/webhook")
+async def payment_webhook(
+    request: Request,
+    x_razorpay_signature: Optional[str] = Header(default=None),
+    gateway: RazorpayGateway = Depends(get_gateway),
+):
+    if not settings.razorpay_webhook_secret:
+        raise HTTPException(status_code=503, detail="Razorpay webhook secret not configured")
+    raw = await request.body()
+    if not x_razorpay_signature or not gateway.verify_webhook_signature(raw, x_razorpay_signature):
+        raise HTTPException(status_code=400, detail="Signature verification failed")
+    try:
+        data = json.loads(raw)
+        event = data.get("event")
+        entity = data.get("payload", {}).get("payment", {}).get("entity", {})
+    except (ValueError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    if event not in _WEBHOOK_STATUSES or not entity.get("order_id"):
+        return {"status": "ignored"}
+    # Answered only after the batch holding this event committed; on errors Razorpay redelivers it
+    await payment_reconciler.submit(entity["order_id"], entity.get("id"), _WEBHOOK_STATUSES[event])
+    return {"status": "ok"}
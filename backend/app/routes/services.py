@@ -1,97 +1,360 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
-from typing import Optional, List
+from fastapi import APIRouter, Depends, File, HTTPException, status, Header, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from psycopg.rows import dict_row
+from pydantic import ValidationError
+from datetime import date
+from itertools import islice
+from typing import Iterator, List, Literal, Optional, Tuple
+import csv
+import io
+import json
 
-from ..db import get_db_conn
-from ..schemas import ServiceCreate, ServicePublic
+from ..cache import service_cache, invalidate_service_created, invalidate_service_updated, invalidate_service_deleted
+from ..db import get_db_conn, get_db_conn_context
+from ..http_cache import etag_for_versions, is_not_modified, not_modified_response, set_validators
+from ..invalidation import publish
+from ..locations import location_params, normalize_location
+from ..pagination import page_limit, encode_cursor, decode_cursor
+from .. import queries
+from ..rows import to_model, to_models, dump_json, json_response, model_response
+from ..config import settings
+from ..schemas import (
+    ServiceCreate, ServicePublic, ServicePage, ServiceAvailability, DayAvailability, ServiceImportError, ServiceImportResult,
+)
+from ..search import build_prefix_tsquery
+from ..streaming import stream_json_page
 from .auth import get_current_user
 
 
 router = APIRouter()
 
+# Columns accepted by the bulk import (and produced by the export), in COPY order
+_IMPORT_COLUMNS = ("name", "description", "price", "photo_url", "location", "daily_capacity")
+_IMPORT_BATCH_SIZE = 1000
+_MAX_REPORTED_ERRORS = 1000
+_EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _service_page(rows, limit: int, ranked: bool = False) -> Tuple[ServicePage, str]:
+    """Build a page and its ETag from `limit + 1` dict rows ordered by id DESC (or rank DESC, id DESC when ranked).
+
+    Rows carry `version` (and the search `rank`) besides the ServicePublic columns.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        position = {"id": rows[-1]["id"]}
+        if ranked:
+            position["rank"] = rows[-1]["rank"]
+        next_cursor = encode_cursor(position)
+    etag = etag_for_versions("services", ((r["id"], r["version"]) for r in rows), extra=next_cursor or "")
+    return ServicePage(items=to_models(ServicePublic, rows), next_cursor=next_cursor), etag
+
 
 @router.post("/", response_model=ServicePublic)
 async def create_service(data: ServiceCreate, payload=Depends(get_current_user), conn=Depends(get_db_conn)):
     if payload.get("role") != "provider":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Providers only")
     provider_id = int(payload["sub"])
-    async with conn.cursor() as cur:
-        await cur.execute(
-            """
-            INSERT INTO services (provider_id, name, description, price, photo_url, location)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id, provider_id, name, description, price, photo_url, location
-            """,
-            (provider_id, data.name, data.description, data.price, data.photo_url, data.location),
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await queries.run(
+            cur,
+            queries.SERVICE_INSERT,
+            (provider_id, data.name, data.description, data.price, data.photo_url, data.location, data.daily_capacity),
         )
         row = await cur.fetchone()
+        await publish(conn, "service", "created", row["id"])
         await conn.commit()
-        return ServicePublic(**{
-            "id": row[0],
-            "provider_id": row[1],
-            "name": row[2],
-            "description": row[3],
-            "price": float(row[4]),
-            "photo_url": row[5],
-            "location": row[6],
-        })
-
-
-@router.get("/", response_model=List[ServicePublic])
-async def list_services(query: Optional[str] = None, location: Optional[str] = None, conn=Depends(get_db_conn)):
-    base = "SELECT id, provider_id, name, description, price, photo_url, location FROM services"
-    filters = []
-    params = []
-    if query:
-        filters.append("(name ILIKE %s OR description ILIKE %s)")
-        like = f"%{query}%"
-        params.extend([like, like])
-    if location:
-        filters.append("location ILIKE %s")
-        params.append(f"%{location}%")
-    if filters:
-        base += " WHERE " + " AND ".join(filters)
-    base += " ORDER BY id DESC"
-    async with conn.cursor() as cur:
-        await cur.execute(base, params)
-        rows = await cur.fetchall()
-        return [
-            ServicePublic(
-                id=r[0], provider_id=r[1], name=r[2], description=r[3], price=float(r[4]), photo_url=r[5], location=r[6]
-            ) for r in rows
-        ]
+        invalidate_service_created()
+        return model_response(to_model(ServicePublic, row))
+
+
+@router.get("/", response_model=ServicePage)
+async def list_services(
+    query: Optional[str] = None,
+    location: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    tsquery = build_prefix_tsquery(query)
+    normalized_location = normalize_location(location)
+    cache_key = ("list", tsquery, normalized_location, cursor, limit)
+    cached = service_cache.get(cache_key)
+    if cached is not None:
+        # Pages are cached as serialised JSON, so a hit does no model or JSON work at all
+        body, etag = cached
+        if is_not_modified(etag, if_none_match):
+            return not_modified_response(etag)
+        response = json_response(body)
+        set_validators(response, etag)
+        return response
+    position = decode_cursor(cursor)
+    if position and tsquery and "rank" not in position:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    # Fetch one extra row to know whether another page exists
+    params = {"search": tsquery, "limit": limit + 1}
+    if normalized_location:
+        params.update(location_params(location))
+    if position:
+        params.update(after_id=position["id"], after_rank=position.get("rank"))
+    query = queries.services_list(ranked=tsquery is not None, located=bool(normalized_location), after=position is not None)
+    # Connection is only checked out on a cache miss
+    generation = service_cache.generation
+    async with get_db_conn_context() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await queries.run(cur, query, params)
+            rows = await cur.fetchall()
+    page, etag = _service_page(rows, limit, ranked=tsquery is not None)
+    body = dump_json(ServicePage, page)
+    # The extra row is tagged too: deleting or editing it can remove the page's next_cursor
+    tags = [f"service:{row['id']}" for row in rows]
+    if cursor is None:
+        tags.append("services:head")
+    if tsquery:
+        tags.append("services:ranked")
+    if tsquery or normalized_location:
+        tags.append("services:filtered")
+    service_cache.set(cache_key, (body, etag), size=len(body), tags=tags, generation=generation)
+    if is_not_modified(etag, if_none_match):
+        return not_modified_response(etag)
+    response = json_response(body)
+    set_validators(response, etag)
+    return response
 
 
-@router.get("/my", response_model=List[ServicePublic])
-async def get_my_services(payload=Depends(get_current_user), conn=Depends(get_db_conn)):
+@router.get("/my", response_model=ServicePage)
+async def get_my_services(
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    if_none_match: Optional[str] = Header(default=None),
+    stream: bool = Query(default=False, description="Stream up to STREAM_MAX_ROWS of the provider's services as one page"),
+    payload=Depends(get_current_user),
+):
     if payload.get("role") != "provider":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Providers only")
     provider_id = int(payload["sub"])
-    async with conn.cursor() as cur:
-        await cur.execute(
-            "SELECT id, provider_id, name, description, price, photo_url, location FROM services WHERE provider_id = %s ORDER BY id DESC",
-            (provider_id,)
-        )
-        rows = await cur.fetchall()
-        return [
-            ServicePublic(
-                id=r[0], provider_id=r[1], name=r[2], description=r[3], price=float(r[4]), photo_url=r[5], location=r[6]
-            ) for r in rows
-        ]
+    position = decode_cursor(cursor)
+    params = {"provider_id": provider_id, "after_id": position["id"] if position else None, "limit": limit + 1}
+    query = queries.services_by_provider(after=position is not None, stream=stream)
+    if stream:
+        return stream_json_page(query, params, ServicePublic)
+    # Checked out here rather than as a dependency: a stream brings its own connection
+    async with get_db_conn_context() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await queries.run(cur, query, params)
+            rows = await cur.fetchall()
+    page, etag = _service_page(rows, limit)
+    if is_not_modified(etag, if_none_match):
+        return not_modified_response(etag, private=True)
+    response = model_response(page)
+    set_validators(response, etag, private=True)
+    return response
+
+
+def _csv_records(text: io.TextIOBase) -> Iterator[Tuple[int, object]]:
+    reader = csv.DictReader(text)
+    missing = {"name", "price", "location"} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"CSV header is missing required columns: {', '.join(sorted(missing))}")
+    for record in reader:
+        # Empty cells mean "not set" so optional fields fall back to their defaults
+        yield reader.line_num, {k: v for k, v in record.items() if k in _IMPORT_COLUMNS and v != ""}
+
+
+def _ndjson_records(text: io.TextIOBase) -> Iterator[Tuple[int, object]]:
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, "Expected a JSON object"
+            continue
+        yield line_number, record
+
+
+def _validate_batch(records: Iterator[Tuple[int, object]], size: int) -> Tuple[List[ServiceCreate], List[ServiceImportError], int]:
+    """Parse and validate up to `size` records; runs in a worker thread to keep the event loop free."""
+    services, errors, seen = [], [], 0
+    for line_number, record in islice(records, size):
+        seen += 1
+        if isinstance(record, str):
+            errors.append(ServiceImportError(row=line_number, errors=[record]))
+            continue
+        try:
+            services.append(ServiceCreate.model_validate(record))
+        except ValidationError as e:
+            messages = [f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()]
+            errors.append(ServiceImportError(row=line_number, errors=messages))
+    return services, errors, seen
+
+
+@router.post("/import", response_model=ServiceImportResult)
+async def import_services(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    payload=Depends(get_current_user),
+    conn=Depends(get_db_conn),
+):
+    """Bulk-create services from a CSV (with header) or NDJSON upload.
+
+    Rows are validated with ServiceCreate in batches and streamed into COPY, so memory stays
+    constant; invalid rows are skipped and reported by row (line) number.
+    """
+    if payload.get("role") != "provider":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Providers only")
+    provider_id = int(payload["sub"])
+    if format is None:
+        filename = (file.filename or "").lower()
+        is_ndjson = filename.endswith((".ndjson", ".jsonl")) or file.content_type in ("application/x-ndjson", "application/jsonl")
+        format = "ndjson" if is_ndjson else "csv"
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    records = _ndjson_records(text) if format == "ndjson" else _csv_records(text)
+
+    imported, failed, errors = 0, 0, []
+    try:
+        async with conn.cursor() as cur:
+            async with cur.copy(
+                "COPY services (provider_id, name, description, price, photo_url, location, daily_capacity) FROM STDIN"
+            ) as copy:
+                while True:
+                    services, batch_errors, seen = await run_in_threadpool(_validate_batch, records, _IMPORT_BATCH_SIZE)
+                    for service in services:
+                        await copy.write_row((
+                            provider_id, service.name, service.description, service.price,
+                            service.photo_url, service.location, service.daily_capacity,
+                        ))
+                    imported += len(services)
+                    failed += len(batch_errors)
+                    errors.extend(batch_errors[:_MAX_REPORTED_ERRORS - len(errors)])
+                    if imported + failed > settings.service_import_max_rows:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Imports are limited to {settings.service_import_max_rows} rows",
+                        )
+                    if seen < _IMPORT_BATCH_SIZE:
+                        break
+    except (ValueError, csv.Error) as e:
+        # Malformed header, undecodable bytes (UnicodeDecodeError) or broken CSV quoting; nothing is committed
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if imported:
+        await publish(conn, "service", "created", None)
+    await conn.commit()
+    if imported:
+        invalidate_service_created()
+    return ServiceImportResult(
+        imported=imported, failed=failed, errors=errors, errors_truncated=failed > len(errors)
+    )
+
+
+async def _export_csv(provider_id: int):
+    async with get_db_conn_context() as conn:
+        async with conn.cursor() as cur:
+            async with cur.copy(
+                "COPY (SELECT name, description, price, photo_url, location, daily_capacity FROM services "
+                "WHERE provider_id = %s ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER true)",
+                (provider_id,),
+            ) as copy:
+                # COPY hands out one row per chunk; coalesce them so the response is sent in large writes
+                buffer = bytearray()
+                async for data in copy:
+                    buffer += data
+                    if len(buffer) >= _EXPORT_CHUNK_BYTES:
+                        yield bytes(buffer)
+                        buffer.clear()
+                if buffer:
+                    yield bytes(buffer)
+
+
+async def _export_ndjson(provider_id: int):
+    async with get_db_conn_context() as conn:
+        # Server-side cursor: rows are fetched in batches instead of materialising the whole catalog
+        async with conn.cursor(name="services_export") as cur:
+            await queries.run(cur, queries.SERVICES_EXPORT_NDJSON, (provider_id,))
+            while True:
+                rows = await cur.fetchmany(_IMPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield "".join(row[0] + "\n" for row in rows).encode()
+
+
+@router.get("/export")
+async def export_services(format: Literal["csv", "ndjson"] = "csv", payload=Depends(get_current_user)):
+    """Stream the provider's catalog in the format accepted by /import."""
+    if payload.get("role") != "provider":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Providers only")
+    provider_id = int(payload["sub"])
+    # The stream outlives the request's dependencies, so it checks out its own connection
+    if format == "ndjson":
+        body, media_type = _export_ndjson(provider_id), "application/x-ndjson"
+    else:
+        body, media_type = _export_csv(provider_id), "text/csv"
+    return StreamingResponse(
+        body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="services.{format}"'}
+    )
 
 
 @router.get("/{service_id}", response_model=ServicePublic)
-async def get_service(service_id: int, conn=Depends(get_db_conn)):
-    async with conn.cursor() as cur:
-        await cur.execute(
-            "SELECT id, provider_id, name, description, price, photo_url, location FROM services WHERE id=%s",
-            (service_id,),
-        )
-        row = await cur.fetchone()
+async def get_service(
+    service_id: int,
+    if_none_match: Optional[str] = Header(default=None),
+    if_modified_since: Optional[str] = Header(default=None),
+):
+    cache_key = ("service", service_id)
+    cached = service_cache.get(cache_key)
+    if cached is None:
+        generation = service_cache.generation
+        async with get_db_conn_context() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await queries.run(cur, queries.SERVICE_BY_ID, (service_id,))
+                row = await cur.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Service not found")
-        return ServicePublic(
-            id=row[0], provider_id=row[1], name=row[2], description=row[3], price=float(row[4]), photo_url=row[5], location=row[6]
-        )
+        body = dump_json(ServicePublic, to_model(ServicePublic, row))
+        cached = (body, f'"service-{row["id"]}-{row["version"]}"', row["updated_at"])
+        service_cache.set(cache_key, cached, size=len(body), tags=[f"service:{service_id}"], generation=generation)
+    body, etag, updated_at = cached
+    if is_not_modified(etag, if_none_match, updated_at, if_modified_since):
+        return not_modified_response(etag, updated_at)
+    response = json_response(body)
+    set_validators(response, etag, updated_at)
+    return response
+
+
+@router.get("/{service_id}/availability", response_model=ServiceAvailability)
+async def get_service_availability(
+    service_id: int,
+    month: Optional[str] = Query(default=None, pattern=r"^\d{4}-\d{2}$", description="YYYY-MM, defaults to the current month"),
+    conn=Depends(get_db_conn),
+):
+    if month:
+        try:
+            first_day = date(int(month[:4]), int(month[5:]), 1)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid month")
+    else:
+        first_day = date.today().replace(day=1)
+    async with conn.cursor() as cur:
+        await queries.run(cur, queries.SERVICE_AVAILABILITY, (first_day, first_day, service_id))
+        rows = await cur.fetchall()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Service not found")
+    capacity = rows[0][2]
+    return ServiceAvailability(
+        service_id=service_id,
+        month=first_day.strftime("%Y-%m"),
+        daily_capacity=capacity,
+        days=[
+            DayAvailability(date=r[0], booked=r[1], available=None if capacity is None else max(capacity - r[1], 0))
+            for r in rows
+        ],
+    )
 
 
 @router.put("/{service_id}", response_model=ServicePublic)
@@ -99,26 +362,23 @@ async def update_service(service_id: int, data: ServiceCreate, payload=Depends(g
     if payload.get("role") != "provider":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Providers only")
     provider_id = int(payload["sub"])
-    async with conn.cursor() as cur:
-        await cur.execute("SELECT provider_id FROM services WHERE id=%s", (service_id,))
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await queries.run(cur, queries.SERVICE_OWNER, (service_id,))
         row = await cur.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Service not found")
-        if row[0] != provider_id:
+        if row["provider_id"] != provider_id:
             raise HTTPException(status_code=403, detail="Not owner")
-        await cur.execute(
-            """
-            UPDATE services SET name=%s, description=%s, price=%s, photo_url=%s, location=%s
-            WHERE id=%s
-            RETURNING id, provider_id, name, description, price, photo_url, location
-            """,
-            (data.name, data.description, data.price, data.photo_url, data.location, service_id),
+        await queries.run(
+            cur,
+            queries.SERVICE_UPDATE,
+            (data.name, data.description, data.price, data.photo_url, data.location, data.daily_capacity, service_id),
         )
         row = await cur.fetchone()
+        await publish(conn, "service", "updated", service_id)
         await conn.commit()
-        return ServicePublic(
-            id=row[0], provider_id=row[1], name=row[2], description=row[3], price=float(row[4]), photo_url=row[5], location=row[6]
-        )
+        invalidate_service_updated(service_id)
+        return model_response(to_model(ServicePublic, row))
 
 
 @router.delete("/{service_id}")
@@ -127,12 +387,14 @@ async def delete_service(service_id: int, payload=Depends(get_current_user), con
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Providers only")
     provider_id = int(payload["sub"])
     async with conn.cursor() as cur:
-        await cur.execute("SELECT provider_id FROM services WHERE id=%s", (service_id,))
+        await queries.run(cur, queries.SERVICE_OWNER, (service_id,))
         row = await cur.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Service not found")
         if row[0] != provider_id:
             raise HTTPException(status_code=403, detail="Not owner")
-        await cur.execute("DELETE FROM services WHERE id=%s", (service_id,))
+        await queries.run(cur, queries.SERVICE_DELETE, (service_id,))
+        await publish(conn, "service", "deleted", service_id)
         await conn.commit()
+        invalidate_service_deleted(service_id)
         return {"status": "deleted"}
@@ -1,6 +1,6 @@
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from datetime import date
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 
 UserRole = Literal["provider", "customer"]
@@ -42,9 +42,11 @@ class TokenResponse(BaseModel):
 class ServiceBase(BaseModel):
     name: str
     description: Optional[str] = None
-    price: float
+    price: float = Field(gt=0)
     photo_url: Optional[str] = None
     location: str
+    # Bookings accepted per event date; None means no limit
+    daily_capacity: Optional[int] = Field(default=None, ge=1)
 
 
 class ServiceCreate(ServiceBase):
@@ -56,6 +58,40 @@ class ServicePublic(ServiceBase):
     provider_id: int
 
 
+class ServicePage(BaseModel):
+    items: List[ServicePublic]
+    next_cursor: Optional[str] = None
+
+
+class ServiceImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+
+class ServiceImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ServiceImportError]
+    errors_truncated: bool = False
+
+
+class LocationSuggestions(BaseModel):
+    items: List[str]
+
+
+class DayAvailability(BaseModel):
+    date: date
+    booked: int
+    available: Optional[int] = None
+
+
+class ServiceAvailability(BaseModel):
+    service_id: int
+    month: str
+    daily_capacity: Optional[int] = None
+    days: List[DayAvailability]
+
+
 class BookingBase(BaseModel):
     service_id: int
     event_date: date
@@ -69,10 +105,54 @@ class BookingCreate(BookingBase):
     pass
 
 
+BookingStatus = Literal["pending", "confirmed", "cancelled"]
+
+
 class BookingPublic(BookingBase):
     id: int
     customer_id: int
-    status: Literal["pending", "confirmed", "cancelled"]
+    status: BookingStatus
+    version: int
+
+
+class BookingPage(BaseModel):
+    items: List[BookingPublic]
+    next_cursor: Optional[str] = None
+
+
+
+
+
+class BookingVersion(BaseModel):
+    """The version the client last saw; the change is rejected with 409 if the booking moved on since."""
+    version: int
+
+
+class BookingVersionedId(BookingVersion):
+    id: int
+
+
+class BookingBulkStatusUpdate(BaseModel):
+    status: Literal["confirmed", "cancelled"]
+    items: List[BookingVersionedId] = Field(min_length=1, max_length=500)
+
+
+class BookingBulkResult(BaseModel):
+    updated: List[BookingPublic]
+    conflicts: List[int]
+
+
+class CheckoutItem(BookingBase):
+    quantity: int = Field(default=1, ge=1)
+
 
+class CheckoutRequest(BaseModel):
+    items: List[CheckoutItem] = Field(min_length=1, max_length=20)
+    currency: Literal["INR"] = "INR"
 
 
+class CheckoutResult(BaseModel):
+    # Razorpay order object for checkout; amount is computed server-side from services.price
+    order: dict
+    amount: int
+    bookings: List[BookingPublic]
@@ -0,0 +1,24 @@
+import re
+from typing import Optional
+
+
+# Upper bound on terms per search so a pasted paragraph cannot build a huge tsquery
+MAX_SEARCH_TERMS = 8
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_prefix_tsquery(text: Optional[str]) -> Optional[str]:
+    """Turn free text into a to_tsquery() expression with prefix matching.
+
+    "wedding cat" becomes "wedding:* & cat:*" so partially typed words match
+    (typeahead). Only word characters survive, which keeps tsquery operators
+    supplied by the user from producing syntax errors. Returns None when the
+    text contains no searchable terms.
+    """
+    if not text:
+        return None
+    terms = _TERM_RE.findall(text.lower())[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    return " & ".join(f"{term}:*" for term in terms)
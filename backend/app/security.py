@@ -1,13 +1,56 @@
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
 from jose import jwt
 from passlib.context import CryptContext
 
+from . import metrics
+from .cache import token_cache
 from .config import settings
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes whose cost differs from BCRYPT_ROUNDS are reported as needing an update,
+# which verify_and_update_password uses to rehash transparently on login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_desired_rounds=settings.bcrypt_rounds,
+    bcrypt__max_desired_rounds=settings.bcrypt_rounds,
+)
+
+# bcrypt releases the GIL, so a small thread pool runs hashes in parallel without blocking the event loop
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_hash_slots: Optional[asyncio.Semaphore] = None
+
+
+def _hash_workers() -> int:
+    return settings.password_hash_workers or os.cpu_count() or 1
+
+
+async def _run_hashing(fn, *args):
+    global _hash_executor, _hash_slots
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(max_workers=_hash_workers(), thread_name_prefix="password-hash")
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(_hash_workers())
+    # Cap in-flight hashes at the pool size; further callers wait here without holding a thread
+    with metrics.timer("bcrypt"):
+        async with _hash_slots:
+            return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+
+
+def shutdown_password_hashing() -> None:
+    global _hash_executor, _hash_slots
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+    _hash_executor = None
+    _hash_slots = None
 
 
 def hash_password(password: str) -> str:
@@ -18,15 +61,77 @@ def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
 
+async def hash_password_async(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
+
+async def verify_and_update_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """Verify off the event loop; also returns a new hash when the stored one uses an outdated cost."""
+    return await _run_hashing(pwd_context.verify_and_update, password, password_hash)
+
+
+def _is_asymmetric(algorithm: str) -> bool:
+    return algorithm.startswith(("RS", "PS", "ES", "EdDSA"))
+
+
+def _signing_key() -> str:
+    if _is_asymmetric(settings.jwt_algorithm):
+        if not settings.jwt_private_key:
+            raise RuntimeError(f"JWT_PRIVATE_KEY is required to sign {settings.jwt_algorithm} tokens")
+        return settings.jwt_private_key
+    return settings.jwt_secret
+
+
+def _verification_key() -> str:
+    # With an asymmetric algorithm workers only need the public key to verify tokens
+    if _is_asymmetric(settings.jwt_algorithm):
+        if not settings.jwt_public_key:
+            raise RuntimeError(f"JWT_PUBLIC_KEY is required to verify {settings.jwt_algorithm} tokens")
+        return settings.jwt_public_key
+    return settings.jwt_secret
+
+
+if settings.jwt_backend == "pyjwt":
+    # PyJWT is an optional, faster alternative to python-jose
+    try:
+        import jwt as pyjwt
+    except ImportError:
+        raise RuntimeError("JWT_BACKEND=pyjwt requires the PyJWT package (pip install PyJWT)")
+elif settings.jwt_backend != "jose":
+    raise RuntimeError(f"Unknown JWT_BACKEND '{settings.jwt_backend}', expected 'jose' or 'pyjwt'")
+
+
 def create_access_token(subject: str, role: str, expires_minutes: Optional[int] = None) -> str:
     expire_minutes = expires_minutes or settings.jwt_expires_minutes
     expire = datetime.now(timezone.utc) + timedelta(minutes=expire_minutes)
     to_encode = {"sub": subject, "role": role, "exp": expire}
-    return jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+    if settings.jwt_backend == "pyjwt":
+        return pyjwt.encode(to_encode, _signing_key(), algorithm=settings.jwt_algorithm)
+    return jwt.encode(to_encode, _signing_key(), algorithm=settings.jwt_algorithm)
 
 
 def decode_access_token(token: str) -> dict:
-    return jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    if settings.jwt_backend == "pyjwt":
+        return pyjwt.decode(token, _verification_key(), algorithms=[settings.jwt_algorithm])
+    return jwt.decode(token, _verification_key(), algorithms=[settings.jwt_algorithm])
 
 
+def decode_access_token_cached(token: str) -> dict:
+    """decode_access_token with a cache of already-verified tokens.
 
+    Entries are keyed by a digest of the token (the token itself is never kept as
+    a key) and expire no later than the token's own `exp`. They are tagged with
+    the subject so invalidate_user() evicts every cached token of that user,
+    including on other workers via the invalidation bus. Eviction only drops the
+    cached verification: an evicted token that is still within its `exp` is
+    verified again and accepted, so this is not a revocation mechanism.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = decode_access_token(token)
+        remaining = float(payload["exp"]) - time.time()
+        ttl = min(remaining, settings.token_cache_max_ttl_seconds)
+        token_cache.set(key, payload, size=len(token), tags=[f"user:{payload.get('sub')}"], ttl=ttl)
+    # Callers get their own copy so they cannot alter the cached claims
+    return dict(payload)
@@ -0,0 +1,70 @@
+"""Expiry of unpaid checkout holds.
+
+Checkout places its bookings as pending, and pending bookings count toward a
+day's occupancy, so a cart that is never paid would hold its dates forever.
+This worker periodically expires checkout payments still unpaid after
+CHECKOUT_HOLD_SECONDS and cancels their pending bookings, which releases the
+slots. Rows are claimed with FOR UPDATE SKIP LOCKED, so every uvicorn worker
+can run the sweeper; a payment verified at the same moment either wins (and is
+skipped here) or finds the payment expired and is answered with 409.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from .. import queries
+from ..config import settings
+from ..db import get_db_conn_context
+
+logger = logging.getLogger(__name__)
+
+
+# Payments expired per statement; the sweep repeats while a batch comes back full
+_BATCH_SIZE = 200
+
+_task: Optional[asyncio.Task] = None
+
+
+async def expire_holds() -> int:
+    """Expire one batch of overdue checkout payments; returns the number of payments expired."""
+    async with get_db_conn_context() as conn:
+        async with conn.cursor() as cur:
+            await queries.run(cur, queries.CHECKOUT_EXPIRE_HOLDS, (settings.checkout_hold_seconds, _BATCH_SIZE))
+            expired, released = await cur.fetchone()
+            await conn.commit()
+    if expired:
+        logger.info(f"Expired {expired} unpaid checkouts, released {released} bookings")
+    return expired
+
+
+async def _run() -> None:
+    while True:
+        try:
+            while await expire_holds() == _BATCH_SIZE:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Checkout hold sweep error: {str(e)}")
+        await asyncio.sleep(settings.checkout_sweep_seconds)
+
+
+def start_worker() -> None:
+    """Start the sweeper for this process (called from the app lifespan)."""
+    global _task
+    if settings.checkout_hold_seconds <= 0 or _task is not None:
+        return
+    _task = asyncio.create_task(_run())
+
+
+async def stop_worker() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
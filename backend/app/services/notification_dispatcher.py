@@ -0,0 +1,148 @@
+"""Rate-limited delivery of outbox notifications.
+
+Every send goes through a token bucket keyed by the Twilio sender number, so a
+burst of bookings is spread out instead of tripping Twilio's 429s. In digest
+mode the outbox hands over several notifications for one recipient at once and
+they are coalesced into a single message. The buckets and metrics live in this
+process, so with several uvicorn workers the effective rate is the configured
+rate times the number of workers.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Dict, List
+
+from ..config import settings
+from .whatsapp import (
+    twilio_whatsapp_service,
+    send_booking_notification_to_provider,
+    send_booking_notification_to_admin,
+)
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        # Waiters are served in arrival order
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - started
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class LatencyStats:
+    """Count/average/max over all samples plus percentiles over the most recent ones."""
+
+    def __init__(self, window: int = 1000):
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self._recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self) -> dict:
+        recent = sorted(self._recent)
+
+        def pct(p: float) -> float:
+            return round(recent[min(int(len(recent) * p), len(recent) - 1)] * 1000, 1) if recent else 0.0
+
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_send_latency = LatencyStats()
+_queue_latency = LatencyStats()
+_rate_limit_wait = LatencyStats()
+_stats = {"messages_sent": 0, "messages_failed": 0, "notifications_sent": 0, "digests_sent": 0, "waiting": 0}
+
+
+def _bucket_for(sender: str) -> TokenBucket:
+    bucket = _buckets.get(sender)
+    if bucket is None:
+        bucket = _buckets[sender] = TokenBucket(settings.notification_rate_per_second, settings.notification_rate_burst)
+    return bucket
+
+
+async def _send_one(kind: str, payload: dict) -> bool:
+    if kind == "provider":
+        return await send_booking_notification_to_provider(**payload)
+    return await send_booking_notification_to_admin(**payload)
+
+
+async def _send_digest(kind: str, payloads: List[dict]) -> bool:
+    if kind == "provider":
+        return await twilio_whatsapp_service.send_provider_booking_digest(payloads[0]["provider_whatsapp"], payloads)
+    return await twilio_whatsapp_service.send_admin_booking_digest(payloads)
+
+
+async def send(kind: str, payloads: List[dict], queued_seconds: float = 0.0) -> bool:
+    """Deliver notifications of one kind to one recipient as a single rate-limited message.
+
+    `queued_seconds` is how long the oldest of them waited in the outbox.
+    """
+    _stats["waiting"] += 1
+    try:
+        _rate_limit_wait.observe(await _bucket_for(twilio_whatsapp_service.from_number).acquire())
+    finally:
+        _stats["waiting"] -= 1
+
+    started = time.perf_counter()
+    try:
+        if len(payloads) == 1:
+            delivered = await _send_one(kind, payloads[0])
+        else:
+            delivered = await _send_digest(kind, payloads)
+    finally:
+        _send_latency.observe(time.perf_counter() - started)
+
+    if delivered:
+        _stats["messages_sent"] += 1
+        _stats["notifications_sent"] += len(payloads)
+        if len(payloads) > 1:
+            _stats["digests_sent"] += 1
+        _queue_latency.observe(queued_seconds + time.perf_counter() - started)
+    else:
+        _stats["messages_failed"] += 1
+    return delivered
+
+
+def get_stats() -> dict:
+    return {
+        **_stats,
+        "rate_per_second": settings.notification_rate_per_second,
+        "burst": settings.notification_rate_burst,
+        "digest_enabled": settings.notification_digest_enabled,
+        "send_latency": _send_latency.summary(),
+        "rate_limit_wait": _rate_limit_wait.summary(),
+        # From the notification being queued to Twilio accepting it
+        "end_to_end_latency": _queue_latency.summary(),
+    }
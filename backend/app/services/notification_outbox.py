@@ -0,0 +1,186 @@
+"""Transactional outbox for booking notifications.
+
+create_booking inserts rows into `notifications` in the same transaction as the
+booking; bookings placed by checkout get theirs in the transaction that confirms
+the payment (verify or webhook). This worker claims due rows with FOR UPDATE SKIP LOCKED (so several
+uvicorn workers can drain the table side by side), sends them, and records the
+outcome. Claiming pushes next_attempt_at forward by a lease, so rows held by a
+worker that dies mid-send become due again once the lease runs out. Failures are
+retried with exponential backoff and moved to status 'dead' after
+NOTIFICATION_MAX_ATTEMPTS.
+
+In digest mode new rows are held back for NOTIFICATION_DIGEST_WINDOW_SECONDS;
+when one becomes due, the other fresh rows for the same recipient are claimed
+with it and sent as one message by the dispatcher.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from .. import queries
+from ..config import settings
+from ..db import get_db_conn_context
+from . import notification_dispatcher
+from .whatsapp import twilio_whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+
+_task: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+
+
+def wake() -> None:
+    """Ask the worker in this process to look for due notifications now instead of at the next poll."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def initial_delay_seconds() -> float:
+    """Delay applied to newly queued notifications so a digest window can fill up."""
+    return settings.notification_digest_window_seconds if settings.notification_digest_enabled else 0.0
+
+
+def _backoff_seconds(attempts: int) -> float:
+    delay = min(settings.notification_backoff_base_seconds * (2 ** (attempts - 1)), settings.notification_backoff_max_seconds)
+    # Jitter spreads out retries of notifications that failed together
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _skip_reason(kind: str) -> Optional[str]:
+    if not twilio_whatsapp_service.enabled:
+        return "Twilio WhatsApp notifications are disabled"
+    if not twilio_whatsapp_service.account_sid or not twilio_whatsapp_service.auth_token:
+        return "Twilio credentials not configured"
+    if kind == "admin" and not twilio_whatsapp_service.admin_to_number:
+        return "Admin WhatsApp number not configured"
+    return None
+
+
+async def _claim_batch() -> list:
+    async with get_db_conn_context() as conn:
+        async with conn.cursor() as cur:
+            await queries.run(
+                cur,
+                queries.NOTIFICATIONS_CLAIM,
+                (settings.notification_lease_seconds, settings.notification_digest_enabled, settings.notification_batch_size),
+            )
+            rows = await cur.fetchall()
+        await conn.commit()
+        return rows
+
+
+async def _record_results(results: list) -> None:
+    """Write back (id, status, retry_delay_seconds, error) tuples in a single statement."""
+    async with get_db_conn_context() as conn:
+        async with conn.cursor() as cur:
+            await queries.run(
+                cur,
+                queries.NOTIFICATIONS_RECORD,
+                (
+                    [r[0] for r in results],
+                    [r[1] for r in results],
+                    [r[2] for r in results],
+                    [r[3] for r in results],
+                ),
+            )
+        await conn.commit()
+
+
+def _group(rows: list) -> List[list]:
+    """Split claimed rows into messages: one per row, or one per recipient in digest mode."""
+    if not settings.notification_digest_enabled:
+        return [[row] for row in rows]
+    groups: Dict[Tuple[str, str], list] = {}
+    for row in rows:
+        groups.setdefault((row[1], row[2]), []).append(row)
+    size = max(settings.notification_digest_max_items, 1)
+    return [group[i:i + size] for group in groups.values() for i in range(0, len(group), size)]
+
+
+async def _process(group: list) -> List[tuple]:
+    kind = group[0][1]
+    reason = _skip_reason(kind)
+    if reason:
+        return [(row[0], "skipped", 0.0, reason) for row in group]
+    queued_seconds = (datetime.now(timezone.utc) - min(row[5] for row in group)).total_seconds()
+    try:
+        delivered = await notification_dispatcher.send(kind, [row[3] for row in group], queued_seconds)
+        error = None if delivered else "Delivery failed"
+    except Exception as e:
+        delivered, error = False, str(e)
+    results = []
+    for notification_id, _, _, _, attempts, _ in group:
+        if delivered:
+            results.append((notification_id, "sent", 0.0, None))
+        elif attempts >= settings.notification_max_attempts:
+            logger.error(f"Notification {notification_id} dead-lettered after {attempts} attempts: {error}")
+            results.append((notification_id, "dead", 0.0, error))
+        else:
+            results.append((notification_id, "pending", _backoff_seconds(attempts), error))
+    return results
+
+
+async def process_due() -> int:
+    """Send one batch of due notifications; returns how many were claimed."""
+    rows = await _claim_batch()
+    if not rows:
+        return 0
+    # Messages of a batch (e.g. provider and admin for one booking) go out concurrently,
+    # paced by the dispatcher's rate limit
+    results = await asyncio.gather(*(_process(group) for group in _group(rows)))
+    await _record_results([result for group in results for result in group])
+    return len(rows)
+
+
+async def get_queue_stats() -> dict:
+    """Depth of the outbox, read through the partial index on pending rows."""
+    async with get_db_conn_context() as conn:
+        async with conn.cursor() as cur:
+            await queries.run(cur, queries.NOTIFICATIONS_QUEUE_STATS)
+            pending, due, oldest = await cur.fetchone()
+    return {"pending": pending, "due": due, "oldest_pending_seconds": round(float(oldest), 1) if oldest is not None else None}
+
+
+async def _run() -> None:
+    while True:
+        try:
+            claimed = await process_due()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Notification outbox error: {str(e)}")
+            claimed = 0
+        if claimed < settings.notification_batch_size:
+            # Drained: sleep until the next poll or until a booking in this process wakes us up
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.notification_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+
+
+def start_worker() -> None:
+    """Start the outbox worker for this process (called from the app lifespan)."""
+    global _task, _wakeup
+    if not settings.notification_outbox_enabled or _task is not None:
+        return
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run())
+
+
+async def stop_worker() -> None:
+    global _task, _wakeup
+    if _task is None:
+        return
+    # Rows claimed by an interrupted batch are retried by any worker once their lease expires
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+    _wakeup = None
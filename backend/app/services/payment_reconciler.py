@@ -0,0 +1,129 @@
+"""Apply Razorpay webhook events to payments and their bookings in batches.
+
+Each webhook request submits its event and waits. Events arriving within
+PAYMENT_WEBHOOK_BATCH_WINDOW_MS of each other are written together: one
+statement updates the payments from an unnest() of the batch, confirms the
+bookings of captured payments and queues their notifications. A failed event is one attempt's outcome (the
+customer may pay again on the same order), so it is only counted on the
+payment and leaves the payment and its bookings as they are. The webhook only
+answers 200 once its batch has committed, so a failed batch is redelivered by
+Razorpay, and the statuses never need to be polled from the gateway.
+"""
+
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from .. import queries
+from ..config import settings
+from ..db import get_db_conn_context
+from . import notification_outbox
+
+logger = logging.getLogger(__name__)
+
+
+# (order_id, payment_id, status) with status 'captured' or 'failed'
+PaymentEvent = Tuple[str, Optional[str], str]
+
+# How long shutdown waits for queued events to be written before abandoning them
+_STOP_TIMEOUT_SECONDS = 10.0
+
+_pending: List[Tuple[PaymentEvent, asyncio.Future]] = []
+_flusher: Optional[asyncio.Task] = None
+_full: Optional[asyncio.Event] = None
+
+
+async def apply_events(events: List[PaymentEvent]) -> int:
+    """Write a batch of events in one transaction; returns the number of bookings confirmed."""
+    async with get_db_conn_context() as conn:
+        async with conn.cursor() as cur:
+            await queries.run(
+                cur,
+                queries.PAYMENT_APPLY_EVENTS,
+                {
+                    "order_ids": [e[0] for e in events],
+                    "payment_ids": [e[1] for e in events],
+                    "statuses": [e[2] for e in events],
+                    "notify_delay": notification_outbox.initial_delay_seconds(),
+                },
+            )
+            rows = await cur.fetchall()
+            await conn.commit()
+    for order_id, status, _ in rows:
+        if status == "expired":
+            logger.warning(f"Payment captured for expired order {order_id} needs a refund")
+    known = {order_id for order_id, _, _ in rows}
+    for order_id in dict.fromkeys(order_id for order_id, _, _ in events):
+        if order_id not in known:
+            logger.info(f"Ignoring webhook for order {order_id}: unknown or already captured")
+    confirmed = sum(count for _, _, count in rows)
+    if confirmed:
+        # Their notifications were queued in the same statement
+        notification_outbox.wake()
+    return confirmed
+
+
+async def _flush_loop() -> None:
+    global _flusher, _full
+    batch: List[Tuple[PaymentEvent, asyncio.Future]] = []
+    try:
+        while _pending:
+            # Give concurrent deliveries a moment to join the batch, unless it is already full
+            try:
+                await asyncio.wait_for(_full.wait(), timeout=settings.payment_webhook_batch_window_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            _full.clear()
+            batch = _pending[:settings.payment_webhook_batch_size]
+            del _pending[:len(batch)]
+            try:
+                moved = await apply_events([event for event, _ in batch])
+                logger.info(f"Reconciled {len(batch)} payment events, {moved} bookings confirmed")
+            except Exception as e:
+                logger.error(f"Failed to reconcile payment events: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+    finally:
+        # Cancelled (shutdown): the waiting webhooks fail and Razorpay redelivers their events
+        for _, future in batch + _pending:
+            if not future.done():
+                future.cancel()
+        _pending.clear()
+        _flusher = None
+        _full = None
+
+
+async def submit(order_id: str, payment_id: Optional[str], status: str) -> None:
+    """Queue an event for the next batch and wait until that batch has been committed."""
+    global _flusher, _full
+    future = asyncio.get_running_loop().create_future()
+    _pending.append(((order_id, payment_id, status), future))
+    if _flusher is None:
+        _full = asyncio.Event()
+        _flusher = asyncio.create_task(_flush_loop())
+    if len(_pending) >= settings.payment_webhook_batch_size:
+        _full.set()
+    await future
+
+
+async def stop() -> None:
+    """Write the events still queued, then stop the flusher (called from the app lifespan before the pool closes)."""
+    flusher = _flusher
+    if flusher is None:
+        return
+    # Nothing else will join the batch, so do not wait out the batching window
+    _full.set()
+    await asyncio.wait({flusher}, timeout=_STOP_TIMEOUT_SECONDS)
+    if flusher.done():
+        return
+    logger.warning(f"Abandoning {len(_pending)} queued payment events at shutdown; Razorpay will redeliver them")
+    flusher.cancel()
+    try:
+        await flusher
+    except asyncio.CancelledError:
+        pass
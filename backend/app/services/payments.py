@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import hmac
+import httpx
+import logging
+from typing import Optional
+from .. import metrics
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Failures where the request never reached Razorpay, so sending it again cannot create a second order.
+# Read timeouts and 5xx responses are not retried: the order may already exist.
+_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class PaymentGatewayError(Exception):
+    """Razorpay rejected the request or could not be reached (after retries)."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RazorpayGateway:
+    """Razorpay Orders API over a shared async HTTP client"""
+
+    def __init__(self):
+        self.key_id = settings.razorpay_key_id
+        self.key_secret = settings.razorpay_key_secret
+        self.webhook_secret = settings.razorpay_webhook_secret
+        self.base_url = settings.razorpay_api_base_url
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.key_id and self.key_secret)
+
+    async def start(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        """Open the shared HTTP client (called from the app lifespan).
+
+        Connections to Razorpay are kept alive and reused, and requests await the
+        network instead of blocking the event loop. Pass `transport` (e.g.
+        httpx.MockTransport) to run against a local stub.
+        """
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            auth=(self.key_id, self.key_secret),
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=settings.razorpay_max_connections,
+                max_keepalive_connections=settings.razorpay_max_keepalive_connections,
+                keepalive_expiry=settings.razorpay_keepalive_expiry_seconds,
+            ),
+            timeout=httpx.Timeout(
+                settings.razorpay_read_timeout_seconds,
+                connect=settings.razorpay_connect_timeout_seconds,
+                pool=settings.razorpay_pool_timeout_seconds,
+            ),
+        )
+
+    async def aclose(self) -> None:
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Scripts that never ran the app lifespan still get a (reused) client
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    async def _post(self, path: str, body: dict) -> dict:
+        """POST with retries (exponential backoff) only while no connection to Razorpay could be made.
+
+        Anything that may have reached Razorpay (read timeout, 5xx) fails at once with
+        PaymentGatewayError; the caller's idempotency key makes a client retry safe.
+        """
+        client = await self._get_client()
+        attempts = settings.razorpay_max_retries + 1
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                with metrics.timer("razorpay"):
+                    response = await client.post(path, json=body)
+            except _RETRY_ERRORS as e:
+                if last:
+                    raise PaymentGatewayError(f"Razorpay unreachable: {e}") from e
+                logger.warning(f"Razorpay request to {path} failed ({e!r}), retrying")
+            except httpx.TransportError as e:
+                raise PaymentGatewayError(f"Razorpay request failed: {e}") from e
+            else:
+                if response.status_code >= 400:
+                    try:
+                        detail = response.json()["error"]["description"]
+                    except Exception:
+                        detail = response.text
+                    raise PaymentGatewayError(f"Razorpay error {response.status_code}: {detail}", response.status_code)
+                try:
+                    return response.json()
+                except ValueError as e:
+                    raise PaymentGatewayError(f"Razorpay returned malformed JSON: {e}", response.status_code) from e
+            await asyncio.sleep(settings.razorpay_retry_backoff_seconds * 2 ** attempt)
+
+    async def create_order(self, amount: int, currency: str, receipt: str, notes: Optional[dict] = None) -> dict:
+        """Create an order for `amount` (in the currency's smallest unit) and return Razorpay's order object."""
+        body = {"amount": amount, "currency": currency, "receipt": receipt, "payment_capture": 1}
+        if notes:
+            body["notes"] = notes
+        return await self._post("/orders", body)
+
+    def verify_payment_signature(self, order_id: str, payment_id: str, signature: str) -> bool:
+        """Check the checkout signature: HMAC_SHA256(order_id|payment_id, key_secret)."""
+        payload = f"{order_id}|{payment_id}".encode()
+        expected = hmac.new(self.key_secret.encode(), payload, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    def verify_webhook_signature(self, body: bytes, signature: str) -> bool:
+        """Check the X-Razorpay-Signature header: HMAC_SHA256(raw body, webhook_secret)."""
+        expected = hmac.new(self.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+
+# Create gateway instance
+razorpay_gateway = RazorpayGateway()
@@ -0,0 +1,392 @@
+"""Notification templates, compiled once into plain Python functions.
+
+A template is a tuple of lines using str.format syntax ({service_price:,.2f}).
+A line starting with "?" is optional: it is left out when any field it uses is
+empty (None, "", 0), which replaces the old trick of stuffing extra details into
+`notes`. An optional line may name a fallback after "||" that is printed
+instead ("?Duration: {duration_hours} hours||Duration: N/A"). A line may
+contain newlines, so an optional block (blank line, heading, value) is a single
+entry.
+
+Templates are keyed by (channel, locale, name). Missing locales fall back to
+English. Each template is compiled into a function (see _compile) the first
+time it is needed, or for all templates at startup via compile_templates(),
+so rendering a message is just string concatenation.
+"""
+
+import string
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from ..config import settings
+
+CHANNELS = ("whatsapp", "sms", "email")
+DEFAULT_LOCALE = "en"
+
+# Everything a template may reference; see booking_context()
+FIELDS = frozenset({
+    "customer_name", "customer_email", "customer_mobile", "address",
+    "service_name", "service_price", "event_date", "quantity", "duration_hours", "notes",
+    "provider_name", "provider_mobile",
+    # Digest templates: number of bookings (header) and position of a booking (items)
+    "count", "index",
+})
+
+_SIGNATURE_EN = "*ShaadiBazaarHub - Your Wedding Partner* 💒"
+_SIGNATURE_HI = "*ShaadiBazaarHub - आपका वेडिंग पार्टनर* 💒"
+
+TEMPLATES: Dict[Tuple[str, str, str], Tuple[str, ...]] = {
+    # --- WhatsApp, English ---
+    ("whatsapp", "en", "provider_booking"): (
+        "🎉 *New Booking Alert!* 🎉",
+        "",
+        "📋 *Booking Details:*",
+        "• Service: {service_name}",
+        "• Price: ₹{service_price:,.2f}",
+        "• Quantity: {quantity}",
+        "• Event Date: {event_date}",
+        "?• Duration: {duration_hours} hours||• Duration: N/A",
+        "",
+        "👤 *Customer Information:*",
+        "• Name: {customer_name}",
+        "• Mobile: {customer_mobile}",
+        "?• Address: {address}",
+        "?\n📝 *Additional Notes:*\n{notes}",
+        "",
+        "🔗 *Next Steps:*",
+        "Please contact the customer to confirm the booking and discuss further details.",
+        "",
+        "---",
+        _SIGNATURE_EN,
+    ),
+    ("whatsapp", "en", "admin_booking"): (
+        "📢 *New Booking Received*",
+        "",
+        "👤 Customer: {customer_name}",
+        "✉️ Email: {customer_email}",
+        "📞 Mobile: {customer_mobile}",
+        "?🏠 Address: {address}",
+        "",
+        "🧾 Service: {service_name}",
+        "💰 Price: ₹{service_price:,.2f}",
+        "📅 Event Date: {event_date}",
+        "🔢 Quantity: {quantity}",
+        "?⏱️ Duration: {duration_hours} hours",
+        "?🧑‍💼 Provider: {provider_name}",
+        "?📱 Provider Mobile: {provider_mobile}",
+        "?📝 Notes: {notes}",
+        "",
+        "— ShaadiBazaarHub",
+    ),
+    ("whatsapp", "en", "provider_digest_header"): (
+        "🎉 *{count} New Bookings!* 🎉",
+    ),
+    ("whatsapp", "en", "provider_digest_item"): (
+        "",
+        "*{index}. {service_name}* (₹{service_price:,.2f} × {quantity})",
+        "• Event Date: {event_date}",
+        "• Customer: {customer_name}, {customer_mobile}",
+        "?• Address: {address}",
+        "?• Notes: {notes}",
+    ),
+    ("whatsapp", "en", "provider_digest_footer"): (
+        "",
+        "Please contact the customers to confirm these bookings.",
+        "",
+        "---",
+        _SIGNATURE_EN,
+    ),
+    ("whatsapp", "en", "admin_digest_header"): (
+        "📢 *{count} New Bookings Received*",
+    ),
+    ("whatsapp", "en", "admin_digest_item"): (
+        "",
+        "{index}. {service_name} (₹{service_price:,.2f} × {quantity}) on {event_date}",
+        "   👤 {customer_name}, {customer_mobile}",
+        "?   🧑‍💼 {provider_name}",
+    ),
+    ("whatsapp", "en", "admin_digest_footer"): (
+        "",
+        "— ShaadiBazaarHub",
+    ),
+
+    # --- WhatsApp, Hindi ---
+    ("whatsapp", "hi", "provider_booking"): (
+        "🎉 *नई बुकिंग!* 🎉",
+        "",
+        "📋 *बुकिंग विवरण:*",
+        "• सेवा: {service_name}",
+        "• मूल्य: ₹{service_price:,.2f}",
+        "• मात्रा: {quantity}",
+        "• कार्यक्रम की तारीख: {event_date}",
+        "?• अवधि: {duration_hours} घंटे||• अवधि: उपलब्ध नहीं",
+        "",
+        "👤 *ग्राहक की जानकारी:*",
+        "• नाम: {customer_name}",
+        "• मोबाइल: {customer_mobile}",
+        "?• पता: {address}",
+        "?\n📝 *अतिरिक्त नोट्स:*\n{notes}",
+        "",
+        "🔗 *अगला कदम:*",
+        "बुकिंग की पुष्टि और आगे की जानकारी के लिए कृपया ग्राहक से संपर्क करें।",
+        "",
+        "---",
+        _SIGNATURE_HI,
+    ),
+    ("whatsapp", "hi", "admin_booking"): (
+        "📢 *नई बुकिंग प्राप्त हुई*",
+        "",
+        "👤 ग्राहक: {customer_name}",
+        "✉️ ईमेल: {customer_email}",
+        "📞 मोबाइल: {customer_mobile}",
+        "?🏠 पता: {address}",
+        "",
+        "🧾 सेवा: {service_name}",
+        "💰 मूल्य: ₹{service_price:,.2f}",
+        "📅 कार्यक्रम की तारीख: {event_date}",
+        "🔢 मात्रा: {quantity}",
+        "?⏱️ अवधि: {duration_hours} घंटे",
+        "?🧑‍💼 प्रदाता: {provider_name}",
+        "?📱 प्रदाता मोबाइल: {provider_mobile}",
+        "?📝 नोट्स: {notes}",
+        "",
+        "— ShaadiBazaarHub",
+    ),
+    ("whatsapp", "hi", "provider_digest_header"): (
+        "🎉 *{count} नई बुकिंग!* 🎉",
+    ),
+    ("whatsapp", "hi", "provider_digest_item"): (
+        "",
+        "*{index}. {service_name}* (₹{service_price:,.2f} × {quantity})",
+        "• तारीख: {event_date}",
+        "• ग्राहक: {customer_name}, {customer_mobile}",
+        "?• पता: {address}",
+        "?• नोट्स: {notes}",
+    ),
+    ("whatsapp", "hi", "provider_digest_footer"): (
+        "",
+        "इन बुकिंग की पुष्टि के लिए कृपया ग्राहकों से संपर्क करें।",
+        "",
+        "---",
+        _SIGNATURE_HI,
+    ),
+    ("whatsapp", "hi", "admin_digest_header"): (
+        "📢 *{count} नई बुकिंग प्राप्त हुईं*",
+    ),
+    ("whatsapp", "hi", "admin_digest_item"): (
+        "",
+        "{index}. {service_name} (₹{service_price:,.2f} × {quantity}), {event_date}",
+        "   👤 {customer_name}, {customer_mobile}",
+        "?   🧑‍💼 {provider_name}",
+    ),
+    ("whatsapp", "hi", "admin_digest_footer"): (
+        "",
+        "— ShaadiBazaarHub",
+    ),
+
+    # --- SMS (plain text, kept short) ---
+    ("sms", "en", "provider_booking"): (
+        "ShaadiBazaarHub: New booking for {service_name} on {event_date} (qty {quantity}, Rs {service_price:,.2f}).",
+        "Customer: {customer_name}, {customer_mobile}",
+        "?Address: {address}",
+        "?Notes: {notes}",
+    ),
+    ("sms", "en", "admin_booking"): (
+        "ShaadiBazaarHub: New booking for {service_name} on {event_date} by {customer_name} ({customer_mobile}).",
+        "?Provider: {provider_name}",
+    ),
+    ("sms", "en", "provider_digest_header"): (
+        "ShaadiBazaarHub: {count} new bookings",
+    ),
+    ("sms", "en", "provider_digest_item"): (
+        "{index}. {service_name} on {event_date} - {customer_name}, {customer_mobile}",
+    ),
+    ("sms", "en", "provider_digest_footer"): (),
+    ("sms", "en", "admin_digest_header"): (
+        "ShaadiBazaarHub: {count} new bookings",
+    ),
+    ("sms", "en", "admin_digest_item"): (
+        "{index}. {service_name} on {event_date} - {customer_name}, {customer_mobile}",
+    ),
+    ("sms", "en", "admin_digest_footer"): (),
+    ("sms", "hi", "provider_booking"): (
+        "ShaadiBazaarHub: {service_name} के लिए नई बुकिंग, तारीख {event_date} (मात्रा {quantity}, Rs {service_price:,.2f})।",
+        "ग्राहक: {customer_name}, {customer_mobile}",
+        "?पता: {address}",
+        "?नोट्स: {notes}",
+    ),
+    ("sms", "hi", "admin_booking"): (
+        "ShaadiBazaarHub: {customer_name} ({customer_mobile}) ने {service_name} बुक किया, तारीख {event_date}।",
+        "?प्रदाता: {provider_name}",
+    ),
+
+    # --- Email (subject and plain-text body) ---
+    ("email", "en", "provider_booking_subject"): (
+        "New booking: {service_name} on {event_date}",
+    ),
+    ("email", "en", "provider_booking"): (
+        "You have a new booking on ShaadiBazaarHub.",
+        "",
+        "Service: {service_name}",
+        "Price: ₹{service_price:,.2f}",
+        "Quantity: {quantity}",
+        "Event date: {event_date}",
+        "?Duration: {duration_hours} hours||Duration: N/A",
+        "",
+        "Customer: {customer_name}",
+        "Mobile: {customer_mobile}",
+        "?Address: {address}",
+        "?\nNotes:\n{notes}",
+        "",
+        "Please contact the customer to confirm the booking.",
+        "",
+        "— ShaadiBazaarHub",
+    ),
+    ("email", "en", "admin_booking_subject"): (
+        "New booking: {service_name} by {customer_name}",
+    ),
+    ("email", "en", "admin_booking"): (
+        "A new booking was created.",
+        "",
+        "Customer: {customer_name} <{customer_email}>",
+        "Mobile: {customer_mobile}",
+        "?Address: {address}",
+        "",
+        "Service: {service_name}",
+        "Price: ₹{service_price:,.2f}",
+        "Quantity: {quantity}",
+        "Event date: {event_date}",
+        "?Duration: {duration_hours} hours",
+        "?Provider: {provider_name}",
+        "?Provider mobile: {provider_mobile}",
+        "?Notes: {notes}",
+    ),
+}
+
+_CONVERSIONS = {"r": "repr", "s": "str", "a": "ascii"}
+_formatter = string.Formatter()
+_compiled: Dict[Tuple[str, str, str], Callable[[Mapping], str]] = {}
+
+
+def _expression(key: Tuple[str, str, str], line: str) -> Tuple[str, List[str]]:
+    """Python expression rendering one template line, and the fields it uses."""
+    parts, fields = [], []
+    for literal, field, spec, conversion in _formatter.parse(line):
+        if literal:
+            parts.append(repr(literal))
+        if field is None:
+            continue
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field '{field}' in notification template {key}")
+        if "{" in spec:
+            raise ValueError(f"Nested format specs are not supported in notification template {key}")
+        fields.append(field)
+        value = f"c[{field!r}]"
+        if conversion:
+            value = f"{_CONVERSIONS[conversion]}({value})"
+        parts.append(f"format({value}, {spec!r})")
+    return " + ".join(parts) or "''", fields
+
+
+def _compile(key: Tuple[str, str, str], lines: Iterable[str]) -> Callable[[Mapping], str]:
+    """Turn a template into a Python function that renders it from a context dict.
+
+    Parsing the format syntax and checking field names happens here, once,
+    instead of on every render.
+    """
+    body = ["def render(c):", "    out = []"]
+    for line in lines:
+        optional = line.startswith("?")
+        fallback = None
+        if optional:
+            line = line[1:]
+            if "||" in line:
+                line, fallback = line.split("||", 1)
+        expression, fields = _expression(key, line)
+        if optional and fields:
+            # Truthiness, like the hand-written messages this replaced: 0 hours is left out as well
+            condition = " and ".join(f"c[{field!r}]" for field in dict.fromkeys(fields))
+            body.append(f"    if {condition}:")
+            body.append(f"        out.append({expression})")
+            if fallback is not None:
+                body.append("    else:")
+                body.append(f"        out.append({_expression(key, fallback)[0]})")
+        else:
+            body.append(f"    out.append({expression})")
+    body.append("    return '\\n'.join(out)")
+
+    namespace = {}
+    exec(compile("\n".join(body), f"<template {'/'.join(key)}>", "exec"), namespace)
+    return namespace["render"]
+
+
+def compile_templates() -> int:
+    """Compile every template up front (called from the app lifespan); returns how many there are.
+
+    A typo in a template therefore fails startup rather than a send.
+    """
+    for key, lines in TEMPLATES.items():
+        if key not in _compiled:
+            _compiled[key] = _compile(key, lines)
+    return len(_compiled)
+
+
+def get_template(name: str, channel: str = "whatsapp", locale: Optional[str] = None) -> Callable[[Mapping], str]:
+    locale = locale or settings.notification_locale
+    for key in ((channel, locale, name), (channel, DEFAULT_LOCALE, name)):
+        template = _compiled.get(key)
+        if template is None and key in TEMPLATES:
+            template = _compiled[key] = _compile(key, TEMPLATES[key])
+        if template is not None:
+            return template
+    raise KeyError(f"No notification template '{name}' for channel '{channel}'")
+
+
+def booking_context(
+    customer_name: Optional[str] = None,
+    customer_email: Optional[str] = None,
+    customer_mobile: Optional[str] = None,
+    customer_address: Optional[str] = None,
+    service_name: Optional[str] = None,
+    service_price: Optional[float] = None,
+    event_date=None,
+    quantity: Optional[int] = None,
+    duration_hours: Optional[int] = None,
+    notes: Optional[str] = None,
+    provider_name: Optional[str] = None,
+    provider_mobile: Optional[str] = None,
+    booking_address: Optional[str] = None,
+    **_ignored,
+) -> dict:
+    """Build the context templates render from; accepts outbox payloads as keyword arguments."""
+    return {
+        "customer_name": customer_name,
+        "customer_email": customer_email,
+        "customer_mobile": customer_mobile,
+        "address": booking_address or customer_address,
+        "service_name": service_name,
+        "service_price": service_price if service_price is not None else 0.0,
+        "event_date": event_date,
+        "quantity": quantity,
+        "duration_hours": duration_hours,
+        "notes": notes,
+        "provider_name": provider_name,
+        "provider_mobile": provider_mobile,
+        "count": None,
+        "index": None,
+    }
+
+
+def render(name: str, context: Mapping, channel: str = "whatsapp", locale: Optional[str] = None) -> str:
+    return get_template(name, channel, locale)(context)
+
+
+def render_digest(name: str, contexts: List[dict], channel: str = "whatsapp", locale: Optional[str] = None) -> str:
+    """Render `{name}_header`, one `{name}_item` per booking, then `{name}_footer`."""
+    item = get_template(f"{name}_item", channel, locale)
+    parts = [get_template(f"{name}_header", channel, locale)({"count": len(contexts)})]
+    for index, context in enumerate(contexts, 1):
+        parts.append(item({**context, "index": index}))
+    footer = get_template(f"{name}_footer", channel, locale)({})
+    if footer:
+        parts.append(footer)
+    return "\n".join(parts)
@@ -1,10 +1,18 @@
 import httpx
 import logging
-from typing import Optional
+from typing import List, Optional
+from .. import metrics
 from ..config import settings
+from . import templates
 
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
 
 class TwilioWhatsAppService:
     """WhatsApp notification service using Twilio WhatsApp API"""
@@ -15,6 +23,48 @@ class TwilioWhatsAppService:
         self.auth_token = settings.twilio_auth_token
         self.from_number = settings.twilio_whatsapp_from
         self.admin_to_number = settings.twilio_admin_whatsapp_to
+        self.base_url = settings.twilio_api_base_url
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        """Open the shared HTTP client (called from the app lifespan).
+
+        Connections to Twilio are kept alive and reused across messages, so only
+        the first send pays for DNS, TCP and TLS. Pass `transport` (e.g.
+        httpx.MockTransport) to run against a local stub.
+        """
+        if self._client is not None:
+            return
+        http2 = settings.twilio_http2 and _HTTP2_AVAILABLE and transport is None
+        if settings.twilio_http2 and not _HTTP2_AVAILABLE and transport is None:
+            logger.warning("HTTP/2 requested for Twilio but the 'h2' package is not installed, using HTTP/1.1")
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=http2,
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=settings.twilio_max_connections,
+                max_keepalive_connections=settings.twilio_max_keepalive_connections,
+                keepalive_expiry=settings.twilio_keepalive_expiry_seconds,
+            ),
+            timeout=httpx.Timeout(
+                settings.twilio_read_timeout_seconds,
+                connect=settings.twilio_connect_timeout_seconds,
+                pool=settings.twilio_pool_timeout_seconds,
+            ),
+        )
+
+    async def aclose(self) -> None:
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Scripts that never ran the app lifespan still get a (reused) client
+        if self._client is None:
+            await self.start()
+        return self._client
         
     async def send_booking_notification(
         self, 
@@ -44,10 +94,11 @@ class TwilioWhatsAppService:
             return False
             
         # Format the message
-        message = self._format_booking_message(
-            customer_name, customer_mobile, customer_address,
-            service_name, service_price, event_date, quantity, duration_hours, notes
-        )
+        message = templates.render("provider_booking", templates.booking_context(
+            customer_name=customer_name, customer_mobile=customer_mobile, customer_address=customer_address,
+            service_name=service_name, service_price=service_price, event_date=event_date, quantity=quantity,
+            duration_hours=duration_hours, notes=notes,
+        ))
         
         # Send using Twilio
         return await self._send_twilio_message(provider_whatsapp, message)
@@ -62,6 +113,10 @@ class TwilioWhatsAppService:
         event_date: str,
         quantity: int,
         notes: Optional[str] = None,
+        booking_address: Optional[str] = None,
+        duration_hours: Optional[int] = None,
+        provider_name: Optional[str] = None,
+        provider_mobile: Optional[str] = None,
     ) -> bool:
         """Send WhatsApp notification to a fixed admin number when a booking is created"""
 
@@ -78,62 +133,51 @@ class TwilioWhatsAppService:
             logger.error("Admin WhatsApp number not configured")
             return False
 
-        message = (
-            "📢 *New Booking Received*\n\n"
-            f"👤 Customer: {customer_name}\n"
-            f"✉️ Email: {customer_email}\n"
-            f"📞 Mobile: {customer_mobile}\n\n"
-            f"🧾 Service: {service_name}\n"
-            f"💰 Price: ₹{service_price:,.2f}\n"
-            f"📅 Event Date: {event_date}\n"
-            f"🔢 Quantity: {quantity}\n"
-        )
-        if notes:
-            message += f"📝 Notes: {notes}\n"
-        message += "\n— ShaadiBazaarHub"
+        message = templates.render("admin_booking", templates.booking_context(
+            customer_name=customer_name, customer_email=customer_email, customer_mobile=customer_mobile,
+            booking_address=booking_address, service_name=service_name, service_price=service_price,
+            event_date=event_date, quantity=quantity, duration_hours=duration_hours,
+            provider_name=provider_name, provider_mobile=provider_mobile, notes=notes,
+        ))
 
         return await self._send_twilio_message(to_number, message)
-    
-    def _format_booking_message(
-        self, 
-        customer_name: str, 
-        customer_mobile: str, 
-        customer_address: str,
-        service_name: str, 
-        service_price: float,
-        event_date: str, 
-        quantity: int, 
-        duration_hours: Optional[int] = None,
-        notes: Optional[str] = None
-    ) -> str:
-        """Format the booking notification message"""
-        
-        message = f"""🎉 *New Booking Alert!* 🎉
-
-📋 *Booking Details:*
-• Service: {service_name}
-• Price: ₹{service_price:,.2f}
-• Quantity: {quantity}
-• Event Date: {event_date}
-• Duration: {str(duration_hours) + ' hours' if duration_hours else 'N/A'}
-
-👤 *Customer Information:*
-• Name: {customer_name}
-• Mobile: {customer_mobile}
-• Address: {customer_address}"""
-
-        if notes:
-            message += f"\n\n📝 *Additional Notes:*\n{notes}"
-            
-        message += f"""
 
-🔗 *Next Steps:*
-Please contact the customer to confirm the booking and discuss further details.
+    async def send_provider_booking_digest(self, provider_whatsapp: str, bookings: List[dict]) -> bool:
+        """Send one WhatsApp message summarising several bookings for the same provider"""
 
----
-*ShaadiBazaarHub - Your Wedding Partner* 💒"""
-        
-        return message
+        if not self.enabled:
+            logger.info("Twilio WhatsApp notifications are disabled")
+            return False
+
+        if not self.account_sid or not self.auth_token:
+            logger.error("Twilio credentials not configured")
+            return False
+
+        if not provider_whatsapp:
+            logger.error("Provider WhatsApp number not provided")
+            return False
+
+        message = templates.render_digest("provider_digest", [templates.booking_context(**b) for b in bookings])
+        return await self._send_twilio_message(provider_whatsapp, message)
+
+    async def send_admin_booking_digest(self, bookings: List[dict]) -> bool:
+        """Send one WhatsApp message to the admin number summarising several bookings"""
+
+        if not self.enabled:
+            logger.info("Twilio WhatsApp notifications are disabled")
+            return False
+
+        if not self.account_sid or not self.auth_token:
+            logger.error("Twilio credentials not configured")
+            return False
+
+        to_number = self.admin_to_number
+        if not to_number:
+            logger.error("Admin WhatsApp number not configured")
+            return False
+
+        message = templates.render_digest("admin_digest", [templates.booking_context(**b) for b in bookings])
+        return await self._send_twilio_message(to_number, message)
     
     async def _send_twilio_message(self, to_number: str, message: str) -> bool:
         """Send WhatsApp message using Twilio API"""
@@ -154,7 +198,7 @@ Please contact the customer to confirm the booking and discuss further details.
             else:
                 number_raw = '+' + number_raw
         
-        url = f"https://api.twilio.com/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        url = f"/2010-04-01/Accounts/{self.account_sid}/Messages.json"
         
         auth = (self.account_sid, self.auth_token)
         
@@ -165,16 +209,17 @@ Please contact the customer to confirm the booking and discuss further details.
         }
         
         try:
-            async with httpx.AsyncClient() as client:
+            client = await self._get_client()
+            with metrics.timer("twilio"):
                 response = await client.post(url, data=data, auth=auth)
-                
-                if response.status_code in [200, 201]:
-                    logger.info(f"Twilio WhatsApp message sent successfully to {to_number}")
-                    return True
-                else:
-                    logger.error(f"Twilio API error: {response.status_code} - {response.text}")
-                    return False
-                    
+
+            if response.status_code in [200, 201]:
+                logger.info(f"Twilio WhatsApp message sent successfully to {to_number}")
+                return True
+            else:
+                logger.error(f"Twilio API error: {response.status_code} - {response.text}")
+                return False
+
         except Exception as e:
             logger.error(f"Failed to send Twilio WhatsApp message: {str(e)}")
             return False
@@ -229,18 +274,6 @@ async def send_booking_notification_to_admin(
     """
     Send booking notification to a fixed admin WhatsApp number from settings
     """
-    # Augment admin message with address, duration and provider details by prefixing to notes
-    extra_lines = []
-    if booking_address:
-        extra_lines.append(f"Address: {booking_address}")
-    if duration_hours is not None:
-        extra_lines.append(f"Duration: {duration_hours} hours")
-    if provider_name:
-        extra_lines.append(f"Provider: {provider_name}")
-    if provider_mobile:
-        extra_lines.append(f"Provider Mobile: {provider_mobile}")
-    merged_notes = ("\n".join(extra_lines) + ("\n" + notes if notes else "")) if extra_lines else notes
-
     success = await twilio_whatsapp_service.send_admin_booking_notification(
         customer_name=customer_name,
         customer_email=customer_email,
@@ -249,7 +282,11 @@ async def send_booking_notification_to_admin(
         service_price=service_price,
         event_date=event_date,
         quantity=quantity,
-        notes=merged_notes,
+        notes=notes,
+        booking_address=booking_address,
+        duration_hours=duration_hours,
+        provider_name=provider_name,
+        provider_mobile=provider_mobile,
     )
     if not success:
         logger.warning("Admin WhatsApp notification failed or not configured")
@@ -0,0 +1,52 @@
+import json
+from typing import AsyncIterator, List, Type
+
+from fastapi.responses import StreamingResponse
+from psycopg.rows import dict_row
+from pydantic import BaseModel
+
+from . import queries
+from .config import settings
+from .db import get_db_conn_context
+from .pagination import encode_cursor
+from .rows import dump_json, to_models
+
+
+# Rows fetched from the server-side cursor per round trip
+STREAM_BATCH_SIZE = 500
+
+
+async def _json_page(query: queries.Query, params: dict, model: Type[BaseModel], max_rows: int) -> AsyncIterator[bytes]:
+    # The body is produced after the endpoint returned and its dependencies were closed,
+    # so the stream checks out its own connection
+    async with get_db_conn_context() as conn:
+        # Named (server-side) cursor: only one batch of rows is held in memory at a time
+        async with conn.cursor(name="stream_json", row_factory=dict_row) as cur:
+            # One row past the cap tells whether the stream was cut short
+            await queries.run(cur, query, {**params, "limit": max_rows + 1})
+            yield b'{"items":['
+            sent, last_id = 0, None
+            while sent < max_rows:
+                rows = await cur.fetchmany(min(STREAM_BATCH_SIZE, max_rows - sent))
+                if not rows:
+                    break
+                # Serialise the whole batch as one array and strip its brackets
+                batch = dump_json(List[model], to_models(model, rows))[1:-1]
+                yield batch if not sent else b"," + batch
+                sent += len(rows)
+                last_id = rows[-1]["id"]
+            truncated = sent == max_rows and await cur.fetchone() is not None
+            next_cursor = encode_cursor({"id": last_id}) if truncated else None
+            yield b'],"next_cursor":' + json.dumps(next_cursor).encode() + b"}"
+
+
+def stream_json_page(query: queries.Query, params: dict, model: Type[BaseModel]) -> StreamingResponse:
+    """Stream up to STREAM_MAX_ROWS rows of `query` as a page of `model`, written chunk by chunk as batches arrive.
+
+    The body has the shape of the paged response ({"items": [...], "next_cursor": ...}); next_cursor is set
+    only when rows were left out because of the cap, and resumes after the last row sent. The query must
+    order by id DESC and take named parameters; `limit` is set here. Selected columns must match the model's
+    fields (see app.rows). Errors after the first chunk can no longer change the status code; the client then sees
+    a truncated (invalid) JSON document.
+    """
+    return StreamingResponse(_json_page(query, params, model, settings.stream_max_rows), media_type="application/json")
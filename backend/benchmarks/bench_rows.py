@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the row-to-response path of the list endpoints
+Measures rows per second for turning database rows into a JSON page body, comparing the previous path
+(tuple rows -> validated models -> FastAPI response_model serialisation -> json.dumps) with app.rows
+(dict rows -> one TypeAdapter validation per page -> TypeAdapter.dump_json).
+
+Usage: python benchmarks/bench_rows.py [--rows 50] [--pages 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.rows import dump_json, to_models
+from app.schemas import BookingPage, BookingPublic, ServicePage, ServicePublic
+
+
+def service_rows(count):
+    tuples = [
+        (i, 7, f"Wedding Photography {i}", "Candid and traditional coverage", Decimal("25000.00"), None, "Mumbai", 2, 1)
+        for i in range(count, 0, -1)
+    ]
+    # price arrives as float8 on the fast path
+    dicts = [
+        dict(id=r[0], provider_id=r[1], name=r[2], description=r[3], price=float(r[4]), photo_url=r[5], location=r[6], daily_capacity=r[7], version=r[8])
+        for r in tuples
+    ]
+    return tuples, dicts
+
+
+def booking_rows(count):
+    tuples = [
+        (i, 3, 2, date(2024, 3, 15), 1, "Please arrive early", "123 Main Street, Mumbai", 6, "pending", 1)
+        for i in range(count, 0, -1)
+    ]
+    keys = ("id", "service_id", "customer_id", "event_date", "quantity", "notes", "address", "duration_hours", "status", "version")
+    return tuples, [dict(zip(keys, r)) for r in tuples]
+
+
+def old_service_page(rows):
+    items = [
+        ServicePublic(
+            id=r[0], provider_id=r[1], name=r[2], description=r[3], price=float(r[4]), photo_url=r[5], location=r[6], daily_capacity=r[7]
+        )
+        for r in rows
+    ]
+    return ServicePage(items=items, next_cursor="eyJpZCI6MX0")
+
+
+def old_booking_page(rows):
+    items = [
+        BookingPublic(
+            id=r[0], service_id=r[1], customer_id=r[2], event_date=r[3], quantity=r[4], notes=r[5], address=r[6], duration_hours=r[7], status=r[8], version=r[9]
+        )
+        for r in rows
+    ]
+    return BookingPage(items=items, next_cursor="eyJpZCI6MX0")
+
+
+def old_path(loop, page_model, build, rows):
+    """What a route returning a model went through: build + validate, then response_model re-validation and json.dumps."""
+    field = create_response_field(name="response", type_=page_model, mode="serialization")
+
+    async def run():
+        content = await serialize_response(field=field, response_content=build(rows), is_coroutine=True)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    return lambda: loop.run_until_complete(run())
+
+
+def new_path(page_model, item_model, rows):
+    return lambda: dump_json(page_model, page_model(items=to_models(item_model, rows), next_cursor="eyJpZCI6MX0"))
+
+
+def bench(label, fn, pages, rows_per_page):
+    start = time.perf_counter()
+    for _ in range(pages):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {pages * rows_per_page / elapsed:>12,.0f} rows/s  {elapsed / pages * 1e6:>8.1f} µs/page")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50, help="rows per page")
+    parser.add_argument("--pages", type=int, default=2000, help="pages per case")
+    args = parser.parse_args()
+
+    print(f"📄 {args.rows} rows per page, {args.pages} pages per case")
+    print("=" * 80)
+
+    loop = asyncio.new_event_loop()
+    tuples, dicts = service_rows(args.rows)
+    assert json.loads(old_path(loop, ServicePage, old_service_page, tuples)()) == json.loads(new_path(ServicePage, ServicePublic, dicts)())
+    bench("services page (validated models)", old_path(loop, ServicePage, old_service_page, tuples), args.pages, args.rows)
+    bench("services page (app.rows)", new_path(ServicePage, ServicePublic, dicts), args.pages, args.rows)
+
+    print("-" * 80)
+    tuples, dicts = booking_rows(args.rows)
+    assert json.loads(old_path(loop, BookingPage, old_booking_page, tuples)()) == json.loads(new_path(BookingPage, BookingPublic, dicts)())
+    bench("bookings page (validated models)", old_path(loop, BookingPage, old_booking_page, tuples), args.pages, args.rows)
+    bench("bookings page (app.rows)", new_path(BookingPage, BookingPublic, dicts), args.pages, args.rows)
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark notification template rendering
+Measures messages rendered per second for single bookings and digests, per channel and locale,
+and compares compiled templates with formatting the template source on every render.
+
+Usage: python benchmarks/bench_templates.py [--count 100000]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import templates
+
+
+SAMPLE_BOOKING = dict(
+    customer_name="Rajesh Kumar",
+    customer_email="rajesh@example.com",
+    customer_mobile="+919876543211",
+    customer_address="123 Main Street, Mumbai, Maharashtra 400001",
+    service_name="Wedding Photography",
+    service_price=25000.00,
+    event_date="2024-03-15",
+    quantity=1,
+    duration_hours=6,
+    notes="Please arrive 2 hours before the ceremony.",
+    provider_name="Shutter Stories",
+    provider_mobile="+919876543210",
+)
+
+
+def interpreted_render(lines, context):
+    """Baseline: parse and format the template source on every call."""
+    out = []
+    for line in lines:
+        if line.startswith("?"):
+            line = line[1:]
+            fields = [f for _, f, _, _ in templates._formatter.parse(line) if f]
+            if any(context[f] in (None, "") for f in fields):
+                continue
+        out.append(line.format_map(context))
+    return "\n".join(out)
+
+
+def bench(label, fn, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {count / elapsed:>12,.0f} msg/s  {elapsed / count * 1e6:>8.2f} µs/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100_000, help="renders per case")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    compiled = templates.compile_templates()
+    print(f"📦 Compiled {compiled} templates in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print("=" * 80)
+
+    context = templates.booking_context(**SAMPLE_BOOKING)
+    for channel in templates.CHANNELS:
+        for locale in ("en", "hi"):
+            for name in ("provider_booking", "admin_booking"):
+                template = templates.get_template(name, channel, locale)
+                bench(f"{channel}/{locale}/{name}", lambda: template(context), args.count)
+
+    print("-" * 80)
+    source = templates.TEMPLATES[("whatsapp", "en", "provider_booking")]
+    template = templates.get_template("provider_booking")
+    bench("whatsapp/en/provider_booking (interpreted)", lambda: interpreted_render(source, context), args.count)
+    bench("whatsapp/en/provider_booking (compiled)", lambda: template(context), args.count)
+
+    print("-" * 80)
+    digest = [templates.booking_context(**SAMPLE_BOOKING) for _ in range(10)]
+    digest_count = max(args.count // 10, 1)
+    bench("whatsapp/en/provider_digest (10 bookings)", lambda: templates.render_digest("provider_digest", digest), digest_count)
+    bench("whatsapp/en/admin_digest (10 bookings)", lambda: templates.render_digest("admin_digest", digest), digest_count)
+
+
+if __name__ == "__main__":
+    main()
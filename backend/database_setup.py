@@ -88,15 +88,335 @@ def create_tables(conn):
         );
     """)
     
+    # Version and modification time back the ETag / Last-Modified headers of the services API
+    conn.execute("""
+        ALTER TABLE services ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+    """)
+    conn.execute("""
+        ALTER TABLE services ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+    """)
+
+    # Bump them on every UPDATE, including ad-hoc SQL, so cached representations are always revalidated
+    conn.execute("""
+        CREATE OR REPLACE FUNCTION services_touch() RETURNS trigger AS $$
+        BEGIN
+            NEW.version := OLD.version + 1;
+            NEW.updated_at := NOW();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    conn.execute("""
+        DROP TRIGGER IF EXISTS trg_services_touch ON services;
+    """)
+
+    conn.execute("""
+        CREATE TRIGGER trg_services_touch
+        BEFORE UPDATE ON services
+        FOR EACH ROW EXECUTE FUNCTION services_touch();
+    """)
+
+    # Weighted full-text search document (name > description > location), kept up to date by Postgres
+    conn.execute("""
+        ALTER TABLE services ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(location, '')), 'C')
+        ) STORED;
+    """)
+
+    # Outbox of WhatsApp notifications, written in the booking transaction and drained by a background worker
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            id BIGSERIAL PRIMARY KEY,
+            booking_id INTEGER REFERENCES bookings(id) ON DELETE CASCADE,
+            kind TEXT NOT NULL CHECK (kind IN ('provider','admin')),
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('pending','sent','skipped','dead')) DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            last_error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            sent_at TIMESTAMPTZ
+        );
+    """)
+
+    # Who a notification goes to, so digest mode can coalesce messages per recipient
+    conn.execute("""
+        ALTER TABLE notifications ADD COLUMN IF NOT EXISTS recipient TEXT
+        GENERATED ALWAYS AS (CASE WHEN kind = 'admin' THEN 'admin' ELSE payload->>'provider_whatsapp' END) STORED;
+    """)
+
     # Create indexes for better performance
     conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_services_name ON services USING GIN (to_tsvector('english', name));
+        CREATE INDEX IF NOT EXISTS idx_notifications_due ON notifications (next_attempt_at) WHERE status = 'pending';
     """)
-    
+
     conn.execute("""
-        CREATE INDEX IF NOT EXISTS idx_services_location ON services (location);
+        CREATE INDEX IF NOT EXISTS idx_notifications_recipient ON notifications (recipient) WHERE status = 'pending';
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_services_search ON services USING GIN (search_vector);
+    """)
+
+    # idx_services_name only covered the name and is superseded by idx_services_search
+    conn.execute("""
+        DROP INDEX IF EXISTS idx_services_name;
     """)
     
+    # Trigram indexes serve the leading-wildcard ILIKE location filter and location autocomplete
+    conn.execute("""
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_services_location_trgm ON services USING GIN (location gin_trgm_ops);
+    """)
+
+    # The plain btree on location could never serve ILIKE '%...%' and is replaced by the trigram index
+    conn.execute("""
+        DROP INDEX IF EXISTS idx_services_location;
+    """)
+
+    # Normalised city/area lookup: alias is lower-cased with single spaces, city is the canonical name
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS location_aliases (
+            alias TEXT PRIMARY KEY,
+            city TEXT NOT NULL
+        );
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_location_aliases_alias_trgm ON location_aliases USING GIN (alias gin_trgm_ops);
+    """)
+
+    # Register every service location as an alias of itself so autocomplete knows about it
+    conn.execute("""
+        CREATE OR REPLACE FUNCTION services_register_location() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO location_aliases (alias, city)
+            VALUES (lower(regexp_replace(trim(NEW.location), '\\s+', ' ', 'g')), trim(NEW.location))
+            ON CONFLICT (alias) DO NOTHING;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    conn.execute("""
+        DROP TRIGGER IF EXISTS trg_services_register_location ON services;
+    """)
+
+    conn.execute("""
+        CREATE TRIGGER trg_services_register_location
+        AFTER INSERT OR UPDATE OF location ON services
+        FOR EACH ROW EXECUTE FUNCTION services_register_location();
+    """)
+
+    # Keyset pagination of a provider's services (WHERE provider_id = ? AND id < ? ORDER BY id DESC)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_services_provider_id ON services (provider_id, id DESC);
+    """)
+
+    # Optimistic concurrency for booking status changes (UPDATE ... WHERE version = ?)
+    conn.execute("""
+        ALTER TABLE bookings ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+    """)
+
+    conn.execute("""
+        CREATE OR REPLACE FUNCTION bookings_touch() RETURNS trigger AS $$
+        BEGIN
+            NEW.version := OLD.version + 1;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    conn.execute("""
+        DROP TRIGGER IF EXISTS trg_bookings_touch ON bookings;
+    """)
+
+    conn.execute("""
+        CREATE TRIGGER trg_bookings_touch
+        BEFORE UPDATE ON bookings
+        FOR EACH ROW EXECUTE FUNCTION bookings_touch();
+    """)
+
+    # Denormalised owner of each booking so a provider's inbox is a range scan on bookings alone
+    conn.execute("""
+        ALTER TABLE bookings ADD COLUMN IF NOT EXISTS provider_id INTEGER REFERENCES users(id) ON DELETE CASCADE;
+    """)
+
+    conn.execute("""
+        CREATE OR REPLACE FUNCTION bookings_set_provider() RETURNS trigger AS $$
+        BEGIN
+            SELECT provider_id INTO NEW.provider_id FROM services WHERE id = NEW.service_id;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    conn.execute("""
+        DROP TRIGGER IF EXISTS trg_bookings_set_provider ON bookings;
+    """)
+
+    conn.execute("""
+        CREATE TRIGGER trg_bookings_set_provider
+        BEFORE INSERT OR UPDATE OF service_id ON bookings
+        FOR EACH ROW EXECUTE FUNCTION bookings_set_provider();
+    """)
+
+    # Backfill bookings created before the column existed
+    conn.execute("""
+        UPDATE bookings b SET provider_id = s.provider_id
+        FROM services s
+        WHERE s.id = b.service_id AND b.provider_id IS DISTINCT FROM s.provider_id;
+    """)
+
+    conn.execute("""
+        ALTER TABLE bookings ALTER COLUMN provider_id SET NOT NULL;
+    """)
+
+    # Inbox pages: the covered status/event_date columns let filters run inside an index-only scan,
+    # which only has to return the ids of one page
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookings_customer_inbox ON bookings (customer_id, id DESC) INCLUDE (status, event_date);
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookings_provider_inbox ON bookings (provider_id, id DESC) INCLUDE (status, event_date);
+    """)
+
+    # Supports ON DELETE CASCADE from services without scanning bookings
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookings_service_id ON bookings (service_id);
+    """)
+
+    # How many bookings a service accepts per event date; NULL (the default) means no limit, as before
+    conn.execute("""
+        ALTER TABLE services ADD COLUMN IF NOT EXISTS daily_capacity INTEGER CHECK (daily_capacity > 0);
+    """)
+
+    # Databases migrated while the column was NOT NULL DEFAULT 1 keep their values; new services are unlimited
+    conn.execute("""
+        ALTER TABLE services ALTER COLUMN daily_capacity DROP NOT NULL, ALTER COLUMN daily_capacity DROP DEFAULT;
+    """)
+
+    # Active (non-cancelled) bookings per service and day, so availability never has to scan bookings
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS service_day_occupancy (
+            service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+            event_date DATE NOT NULL,
+            booked INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (service_id, event_date)
+        );
+    """)
+
+    # Maintained incrementally by bookings writes; taking a slot locks the (service, day) row, so
+    # concurrent bookings for the same day are serialised and cannot overshoot daily_capacity
+    conn.execute("""
+        CREATE OR REPLACE FUNCTION bookings_track_occupancy() RETURNS trigger AS $$
+        DECLARE
+            booked_now INTEGER;
+            capacity INTEGER;
+        BEGIN
+            IF TG_OP = 'UPDATE'
+               AND OLD.status <> 'cancelled' AND NEW.status <> 'cancelled'
+               AND OLD.service_id = NEW.service_id AND OLD.event_date = NEW.event_date THEN
+                -- Still holding the same slot (e.g. pending -> confirmed)
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status <> 'cancelled' THEN
+                UPDATE service_day_occupancy SET booked = booked - 1
+                WHERE service_id = OLD.service_id AND event_date = OLD.event_date;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status <> 'cancelled' THEN
+                INSERT INTO service_day_occupancy AS o (service_id, event_date, booked)
+                VALUES (NEW.service_id, NEW.event_date, 1)
+                ON CONFLICT (service_id, event_date) DO UPDATE SET booked = o.booked + 1
+                RETURNING o.booked INTO booked_now;
+                SELECT daily_capacity INTO capacity FROM services WHERE id = NEW.service_id;
+                IF capacity IS NOT NULL AND booked_now > capacity THEN
+                    RAISE EXCEPTION 'Service % is fully booked on %', NEW.service_id, NEW.event_date
+                        USING ERRCODE = 'check_violation', CONSTRAINT = 'service_day_capacity';
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    conn.execute("""
+        DROP TRIGGER IF EXISTS trg_bookings_track_occupancy ON bookings;
+    """)
+
+    conn.execute("""
+        CREATE TRIGGER trg_bookings_track_occupancy
+        AFTER INSERT OR DELETE OR UPDATE OF status, service_id, event_date ON bookings
+        FOR EACH ROW EXECUTE FUNCTION bookings_track_occupancy();
+    """)
+
+    # Rebuild the counters from existing bookings (idempotent, for databases created before the trigger);
+    # days whose bookings were all cancelled or deleted are zeroed first, the upsert below only visits live ones
+    conn.execute("""
+        UPDATE service_day_occupancy SET booked = 0 WHERE booked <> 0;
+    """)
+
+    conn.execute("""
+        INSERT INTO service_day_occupancy (service_id, event_date, booked)
+        SELECT service_id, event_date, count(*)
+        FROM bookings
+        WHERE status <> 'cancelled'
+        GROUP BY service_id, event_date
+        ON CONFLICT (service_id, event_date) DO UPDATE SET booked = EXCLUDED.booked;
+    """)
+
+    # Razorpay orders created for a customer; (customer_id, idempotency_key) makes create-order retries safe
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS payments (
+            id SERIAL PRIMARY KEY,
+            customer_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            idempotency_key TEXT NOT NULL,
+            amount INTEGER NOT NULL CHECK (amount > 0),
+            currency TEXT NOT NULL,
+            receipt TEXT NOT NULL,
+            order_id TEXT UNIQUE,
+            order_payload JSONB,
+            payment_id TEXT,
+            status TEXT NOT NULL CHECK (status IN ('created','captured','failed','expired')) DEFAULT 'created',
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            UNIQUE (customer_id, idempotency_key)
+        );
+    """)
+
+    # 'expired': a checkout hold that was not paid within CHECKOUT_HOLD_SECONDS (for tables created without it)
+    conn.execute("""
+        ALTER TABLE payments DROP CONSTRAINT IF EXISTS payments_status_check,
+            ADD CONSTRAINT payments_status_check CHECK (status IN ('created','captured','failed','expired'));
+    """)
+
+    # Lets the checkout hold sweeper find unpaid payments by age
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_payments_unpaid ON payments (created_at) WHERE status = 'created';
+    """)
+
+    # Failed attempts reported by payment.failed webhooks; the order stays open for another attempt
+    conn.execute("""
+        ALTER TABLE payments ADD COLUMN IF NOT EXISTS failed_attempts INTEGER NOT NULL DEFAULT 0;
+    """)
+
+    # The payment a booking is paid with; webhooks move its bookings along with the payment status
+    conn.execute("""
+        ALTER TABLE bookings ADD COLUMN IF NOT EXISTS payment_id INTEGER REFERENCES payments(id) ON DELETE SET NULL;
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bookings_payment_id ON bookings (payment_id) WHERE payment_id IS NOT NULL;
+    """)
+
     # Add whatsapp_number column if it doesn't exist (for existing databases)
     try:
         conn.execute("""
@@ -283,6 +603,48 @@ def insert_sample_data(conn):
     print("Sample data inserted successfully!")
 
 
+def seed_location_aliases(conn):
+    """Insert well-known city names and their common alternative spellings"""
+    print("Seeding location aliases...")
+
+    aliases = {
+        'Mumbai': ['mumbai', 'bombay', 'navi mumbai'],
+        'Delhi': ['delhi', 'new delhi', 'dilli', 'ncr'],
+        'Bangalore': ['bangalore', 'bengaluru', 'blr'],
+        'Chennai': ['chennai', 'madras'],
+        'Kolkata': ['kolkata', 'calcutta'],
+        'Hyderabad': ['hyderabad', 'secunderabad'],
+        'Pune': ['pune', 'poona'],
+        'Noida': ['noida', 'greater noida'],
+        'Gurugram': ['gurugram', 'gurgaon'],
+        'Ahmedabad': ['ahmedabad', 'amdavad'],
+        'Jaipur': ['jaipur', 'pink city'],
+        'Lucknow': ['lucknow'],
+        'Varanasi': ['varanasi', 'banaras', 'benares', 'kashi'],
+        'Thiruvananthapuram': ['thiruvananthapuram', 'trivandrum'],
+        'Kochi': ['kochi', 'cochin'],
+        'Mysuru': ['mysuru', 'mysore'],
+        'Vadodara': ['vadodara', 'baroda'],
+        'Prayagraj': ['prayagraj', 'allahabad'],
+    }
+    for city, names in aliases.items():
+        for alias in names:
+            conn.execute("""
+                INSERT INTO location_aliases (alias, city)
+                VALUES (%s, %s)
+                ON CONFLICT (alias) DO NOTHING
+            """, (alias, city))
+
+    # Existing services may use locations that are not in the list above
+    conn.execute("""
+        INSERT INTO location_aliases (alias, city)
+        SELECT DISTINCT lower(regexp_replace(trim(location), '\\s+', ' ', 'g')), trim(location)
+        FROM services
+        ON CONFLICT (alias) DO NOTHING
+    """)
+    print("Location aliases seeded")
+
+
 def normalize_prices(conn):
     """Force all existing services to have price = 1.00 as requested"""
     conn.execute("UPDATE services SET price = 1.00;")
@@ -317,6 +679,9 @@ def main():
             # Insert sample data
             insert_sample_data(conn)
 
+            # Seed the city/area lookup table
+            seed_location_aliases(conn)
+
             # Normalize all prices to ₹1.00
             normalize_prices(conn)
             
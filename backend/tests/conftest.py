@@ -0,0 +1,176 @@
+"""Fixtures for API tests that run without Postgres or Razorpay.
+
+`db` stands in for the database: statements are recognised by their app.queries
+name, answered with the rows a test registered for that name, and recorded.
+`razorpay` is a RazorpayGateway whose HTTP client runs on httpx.MockTransport,
+installed through the get_gateway dependency override.
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Union
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from psycopg.rows import dict_row
+
+from app import queries, streaming
+from app.config import settings
+from app.db import get_db_conn
+from app.main import app
+from app.routes import bookings as booking_routes
+from app.routes import payments as payment_routes
+from app.routes import services as service_routes
+from app.routes.auth import get_current_user
+from app.services import payment_reconciler
+from app.services.payments import RazorpayGateway
+
+CUSTOMER_ID = 5
+
+Rows = Union[List[dict], Callable[[object], List[dict]]]
+
+
+class FakeDatabase:
+    """Rows to answer per statement name, and the (name, params) of every statement executed."""
+
+    def __init__(self):
+        self.rows: Dict[str, Rows] = {}
+        self.executed: List[tuple] = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def on(self, name: str, rows: Rows) -> None:
+        """Answer `name` with `rows` (dicts in column order), or with rows(params) when callable (which may raise)."""
+        self.rows[name] = rows
+
+    def names(self) -> List[str]:
+        return [name for name, _ in self.executed]
+
+    def params(self, name: str) -> list:
+        return [params for executed, params in self.executed if executed == name]
+
+    def execute(self, sql: str, params) -> List[dict]:
+        # Builder variants are registered lazily, so the lookup is rebuilt on every call
+        name = {q.sql: q.name for q in queries.registered()}.get(sql, sql)
+        self.executed.append((name, params))
+        rows = self.rows.get(name, [])
+        return rows(params) if callable(rows) else list(rows)
+
+
+class FakeCursor:
+    def __init__(self, conn: "FakeConnection", row_factory=None):
+        self.connection = conn
+        self._dicts = row_factory is dict_row
+        self._rows: list = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def execute(self, sql: str, params=None, prepare: Optional[bool] = None):
+        rows = self.connection.db.execute(sql, params)
+        self._rows = rows if self._dicts else [tuple(row.values()) for row in rows]
+
+    async def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    async def fetchmany(self, size: int):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    async def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+
+class FakeConnection:
+    prepare_threshold = None
+
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+
+    def cursor(self, name: Optional[str] = None, row_factory=None):
+        return FakeCursor(self, row_factory)
+
+    @asynccontextmanager
+    async def pipeline(self):
+        yield
+
+    async def commit(self):
+        self.db.commits += 1
+
+    async def rollback(self):
+        self.db.rollbacks += 1
+
+
+class FakeRazorpay:
+    """Records the requests sent to Razorpay and answers them with `respond` (creates the order by default)."""
+
+    def __init__(self):
+        self.requests: List[httpx.Request] = []
+        self.respond: Callable[[httpx.Request], httpx.Response] = self.create_order
+
+    @staticmethod
+    def create_order(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"id": "order_test", "status": "created", **json.loads(request.content)})
+
+    def bodies(self) -> List[dict]:
+        return [json.loads(request.content) for request in self.requests]
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return self.respond(request)
+
+
+@pytest.fixture
+def db(monkeypatch) -> FakeDatabase:
+    database = FakeDatabase()
+
+    @asynccontextmanager
+    async def connection():
+        yield FakeConnection(database)
+
+    async def dependency():
+        yield FakeConnection(database)
+
+    monkeypatch.setattr(booking_routes, "get_db_conn_context", connection)
+    monkeypatch.setattr(payment_routes, "get_db_conn_context", connection)
+    monkeypatch.setattr(payment_reconciler, "get_db_conn_context", connection)
+    monkeypatch.setattr(service_routes, "get_db_conn_context", connection)
+    monkeypatch.setattr(streaming, "get_db_conn_context", connection)
+    app.dependency_overrides[get_db_conn] = dependency
+    yield database
+    app.dependency_overrides.pop(get_db_conn, None)
+
+
+@pytest.fixture
+def razorpay(monkeypatch) -> FakeRazorpay:
+    monkeypatch.setattr(settings, "razorpay_retry_backoff_seconds", 0)
+    monkeypatch.setattr(settings, "razorpay_webhook_secret", "webhook_secret")
+    fake = FakeRazorpay()
+    gateway = RazorpayGateway()
+    gateway.key_id, gateway.key_secret, gateway.webhook_secret = "key_id", "key_secret", "webhook_secret"
+    asyncio.run(gateway.start(transport=httpx.MockTransport(fake.handle)))
+    fake.gateway = gateway
+    app.dependency_overrides[payment_routes.get_gateway] = lambda: gateway
+    yield fake
+    app.dependency_overrides.pop(payment_routes.get_gateway, None)
+    asyncio.run(gateway.aclose())
+
+
+@pytest.fixture
+def identity() -> dict:
+    """Token payload of the requesting user; tests switch role or id by updating it."""
+    return {"sub": str(CUSTOMER_ID), "role": "customer"}
+
+
+@pytest.fixture
+def client(db, razorpay, identity) -> TestClient:
+    # Not used as a context manager: the lifespan (pool, workers) is not started
+    app.dependency_overrides[get_current_user] = lambda: identity
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_current_user, None)
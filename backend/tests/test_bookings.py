@@ -0,0 +1,239 @@
+from datetime import date
+from types import SimpleNamespace
+
+import psycopg
+import pytest
+
+from app.config import settings
+from app.pagination import decode_cursor
+from conftest import CUSTOMER_ID
+
+BOOKING = {"service_id": 1, "event_date": "2025-03-01"}
+
+
+def booking_row(booking_id: int, **overrides) -> dict:
+    row = dict(
+        id=booking_id, service_id=1, customer_id=CUSTOMER_ID, event_date=date(2025, 3, 1), quantity=1,
+        notes=None, address=None, duration_hours=None, status="pending", version=1,
+    )
+    row.update(overrides)
+    return row
+
+
+def raises(error: Exception):
+    def answer(params):
+        raise error
+    return answer
+
+
+class FullyBooked(psycopg.errors.CheckViolation):
+    """What the bookings occupancy trigger raises once a day is at daily_capacity."""
+
+    diag = SimpleNamespace(constraint_name="service_day_capacity", message_primary="Service 1 is fully booked on 2025-03-01")
+
+
+# Capacity
+
+def test_booking_a_full_day_is_409(client, db):
+    db.on("bookings.create", raises(FullyBooked()))
+
+    response = client.post("/api/bookings/", json=BOOKING)
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Service is fully booked on this date"
+
+
+def test_other_check_violations_are_not_reported_as_full(client, db):
+    db.on("bookings.create", raises(psycopg.errors.CheckViolation("bookings_quantity_check")))
+
+    with pytest.raises(psycopg.errors.CheckViolation):
+        client.post("/api/bookings/", json=BOOKING)
+
+
+def test_checkout_of_a_full_day_is_409_and_rolled_back(client, db):
+    db.on("payments.reserve_checkout", [{"id": 7, "amount": 100000}])
+    db.on("bookings.create", raises(FullyBooked()))
+
+    response = client.post("/api/payments/checkout", json={"items": [BOOKING]}, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 409
+    assert db.rollbacks == 1
+    assert "payments.store_order" not in db.names()
+
+
+def test_availability_counts_free_slots_per_day(client, db):
+    db.on("services.availability", [
+        {"day": date(2025, 3, 1), "booked": 3, "capacity": 2},
+        {"day": date(2025, 3, 2), "booked": 1, "capacity": 2},
+    ])
+
+    response = client.get("/api/services/1/availability", params={"month": "2025-03"})
+
+    assert response.status_code == 200
+    assert response.json()["daily_capacity"] == 2
+    assert [day["available"] for day in response.json()["days"]] == [0, 1]
+
+
+def test_availability_of_an_unlimited_service_has_no_free_count(client, db):
+    db.on("services.availability", [{"day": date(2025, 3, 1), "booked": 4, "capacity": None}])
+
+    response = client.get("/api/services/1/availability", params={"month": "2025-03"})
+
+    assert response.json()["daily_capacity"] is None
+    assert response.json()["days"] == [{"date": "2025-03-01", "booked": 4, "available": None}]
+
+
+# Inbox
+
+def test_inbox_pages_by_keyset(client, db):
+    db.on("bookings.inbox_customer[after]", [booking_row(9), booking_row(8), booking_row(7)])
+    db.on("bookings.inbox_customer", [booking_row(12), booking_row(11), booking_row(10)])
+
+    first = client.get("/api/bookings/my", params={"limit": 2}).json()
+    second = client.get("/api/bookings/my", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+
+    assert [b["id"] for b in first["items"]] == [12, 11]
+    assert [b["id"] for b in second["items"]] == [9, 8]
+    # One extra row is fetched to learn whether another page exists
+    assert [params["limit"] for params in db.params("bookings.inbox_customer")] == [3]
+    assert db.params("bookings.inbox_customer[after]")[0]["after_id"] == 11
+
+
+def test_inbox_last_page_has_no_cursor(client, db):
+    db.on("bookings.inbox_customer", [booking_row(2), booking_row(1)])
+
+    page = client.get("/api/bookings/my", params={"limit": 2}).json()
+
+    assert page["next_cursor"] is None
+
+
+def test_inbox_filters_pick_the_provider_variant(client, db, identity):
+    identity.update(sub="3", role="provider")
+
+    response = client.get("/api/bookings/my", params={"status": "pending", "date_from": "2025-03-01"})
+
+    assert response.status_code == 200
+    params, = db.params("bookings.inbox_provider[status,from]")
+    assert (params["owner_id"], params["status"], params["date_from"]) == (3, "pending", date(2025, 3, 1))
+
+
+def test_inbox_rejects_a_tampered_cursor(client, db):
+    response = client.get("/api/bookings/my", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+    assert db.executed == []
+
+
+def test_inbox_stream_sends_every_row_as_one_page(client, db):
+    db.on("bookings.inbox_customer[stream]", [booking_row(3), booking_row(2), booking_row(1)])
+
+    page = client.get("/api/bookings/my", params={"stream": "true", "limit": 1}).json()
+
+    assert [b["id"] for b in page["items"]] == [3, 2, 1]
+    assert page["next_cursor"] is None
+
+
+def test_inbox_stream_cut_at_the_cap_has_a_cursor(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "stream_max_rows", 2)
+    db.on("bookings.inbox_customer[stream]", [booking_row(3), booking_row(2), booking_row(1)])
+
+    page = client.get("/api/bookings/my", params={"stream": "true"}).json()
+
+    assert [b["id"] for b in page["items"]] == [3, 2]
+    assert decode_cursor(page["next_cursor"]) == {"id": 2}
+    assert db.params("bookings.inbox_customer[stream]")[0]["limit"] == 3
+
+
+# Versioned status changes
+
+def test_provider_confirms_a_pending_booking(client, db, identity):
+    identity.update(sub="3", role="provider")
+    db.on("bookings.transition_provider", [booking_row(4, status="confirmed", version=2)])
+
+    response = client.post("/api/bookings/4/confirm", json={"version": 1})
+
+    assert response.status_code == 200
+    assert (response.json()["status"], response.json()["version"]) == ("confirmed", 2)
+    assert db.params("bookings.transition_provider") == [("confirmed", 4, 3, 1, ["pending"])]
+    assert "bookings.state_provider" not in db.names()
+
+
+def test_stale_version_is_409(client, db, identity):
+    identity.update(sub="3", role="provider")
+    db.on("bookings.state_provider", [{"owner_id": 3, "status": "pending", "version": 2}])
+
+    response = client.post("/api/bookings/4/confirm", json={"version": 1})
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Booking was modified (current version 2)"
+
+
+def test_invalid_transition_is_409(client, db):
+    db.on("bookings.state_customer", [{"owner_id": CUSTOMER_ID, "status": "cancelled", "version": 3}])
+
+    response = client.post("/api/bookings/4/cancel", json={"version": 3})
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Cannot change a cancelled booking to cancelled"
+
+
+def test_row_locked_by_another_request_is_409(client, db):
+    db.on("bookings.transition_customer", raises(psycopg.errors.LockNotAvailable("lock timeout")))
+
+    response = client.post("/api/bookings/4/cancel", json={"version": 1})
+
+    assert response.status_code == 409
+    assert db.params("bookings.set_lock_timeout") == [("1000ms",)]
+
+
+def test_someone_elses_booking_is_403(client, db):
+    db.on("bookings.state_customer", [{"owner_id": 99, "status": "pending", "version": 1}])
+
+    response = client.post("/api/bookings/4/cancel", json={"version": 1})
+
+    assert response.status_code == 403
+
+
+def test_missing_booking_is_404(client, db):
+    response = client.post("/api/bookings/4/cancel", json={"version": 1})
+
+    assert response.status_code == 404
+
+
+def test_customers_cannot_confirm(client, db):
+    response = client.post("/api/bookings/4/confirm", json={"version": 1})
+
+    assert response.status_code == 403
+    assert db.executed == []
+
+
+def test_bulk_update_reports_conflicts(client, db, identity):
+    identity.update(sub="3", role="provider")
+    db.on("bookings.bulk_status", [booking_row(5, status="confirmed", version=2), booking_row(2, status="confirmed", version=4)])
+
+    response = client.post("/api/bookings/status", json={
+        "status": "confirmed",
+        "items": [{"id": 5, "version": 1}, {"id": 2, "version": 3}, {"id": 9, "version": 1}, {"id": 5, "version": 1}],
+    })
+
+    assert response.status_code == 200
+    assert [b["id"] for b in response.json()["updated"]] == [2, 5]
+    assert response.json()["conflicts"] == [9]
+    # Ids are de-duplicated and sorted so concurrent bulk updates lock rows in the same order
+    assert db.params("bookings.bulk_status") == [("confirmed", [2, 5, 9], [3, 1, 1], 3, ["pending"])]
+
+
+def test_bulk_update_with_locked_rows_is_409(client, db, identity):
+    identity.update(sub="3", role="provider")
+    db.on("bookings.bulk_status", raises(psycopg.errors.LockNotAvailable("lock timeout")))
+
+    response = client.post("/api/bookings/status", json={"status": "cancelled", "items": [{"id": 5, "version": 1}]})
+
+    assert response.status_code == 409
+
+
+def test_bulk_update_is_for_providers(client, db):
+    response = client.post("/api/bookings/status", json={"status": "cancelled", "items": [{"id": 5, "version": 1}]})
+
+    assert response.status_code == 403
+    assert db.executed == []
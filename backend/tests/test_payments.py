@@ -0,0 +1,389 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from datetime import date
+
+import httpx
+import psycopg
+import pytest
+
+from app.config import settings
+from app.services import payment_reconciler
+from conftest import CUSTOMER_ID
+
+CART = {"items": [{"service_id": 1, "event_date": "2025-03-01", "quantity": 2}, {"service_id": 2, "event_date": "2025-03-01"}]}
+
+
+def booking_row(booking_id: int, **overrides) -> dict:
+    row = dict(
+        id=booking_id, service_id=booking_id, customer_id=CUSTOMER_ID, event_date=date(2025, 3, 1), quantity=1,
+        notes=None, address=None, duration_hours=None, status="pending", version=1,
+    )
+    row.update(overrides)
+    return row
+
+
+def signed_webhook(event: str, order_id: str, payment_id: str = "pay_1") -> tuple:
+    body = json.dumps({"event": event, "payload": {"payment": {"entity": {"id": payment_id, "order_id": order_id}}}}).encode()
+    signature = hmac.new(b"webhook_secret", body, hashlib.sha256).hexdigest()
+    return body, {"X-Razorpay-Signature": signature, "Content-Type": "application/json"}
+
+
+def verify_body(order_id: str = "order_test", payment_id: str = "pay_1", secret: bytes = b"key_secret") -> dict:
+    signature = hmac.new(secret, f"{order_id}|{payment_id}".encode(), hashlib.sha256).hexdigest()
+    return {"razorpay_order_id": order_id, "razorpay_payment_id": payment_id, "razorpay_signature": signature}
+
+
+def raises(error: Exception):
+    def answer(params):
+        raise error
+    return answer
+
+
+# Checkout
+
+def test_checkout_charges_the_server_computed_amount(client, db, razorpay):
+    db.on("payments.reserve_checkout", [{"id": 7, "amount": 350000}])
+    db.on("bookings.create", [booking_row(1), booking_row(2)])
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["amount"] == 350000
+    assert [b["status"] for b in result["bookings"]] == ["pending", "pending"]
+    assert razorpay.bodies() == [{"amount": 350000, "currency": "INR", "receipt": "cart_cart1", "payment_capture": 1}]
+    reserve, = db.params("payments.reserve_checkout")
+    assert (reserve["service_ids"], reserve["quantities"], reserve["customer_id"]) == ([1, 2], [2, 1], CUSTOMER_ID)
+    create, = db.params("bookings.create")
+    assert create["payment_id"] == 7
+    assert db.params("payments.store_order")[0][2] == 7
+
+
+def test_checkout_ignores_a_client_supplied_amount(client, db, razorpay):
+    db.on("payments.reserve_checkout", [{"id": 7, "amount": 350000}])
+    db.on("bookings.create", [booking_row(1), booking_row(2)])
+
+    client.post("/api/payments/checkout", json={**CART, "amount": 1}, headers={"Idempotency-Key": "cart1"})
+
+    assert razorpay.bodies()[0]["amount"] == 350000
+
+
+def test_checkout_with_a_zero_total_is_422(client, db, razorpay):
+    db.on("payments.reserve_checkout", raises(psycopg.errors.CheckViolation("payments_amount_check")))
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 422
+    assert db.rollbacks == 1
+    assert "bookings.create" not in db.names()
+    assert razorpay.requests == []
+
+
+def test_checkout_with_a_total_beyond_the_amount_column_is_422(client, db, razorpay):
+    db.on("payments.reserve_checkout", raises(psycopg.errors.NumericValueOutOfRange("integer out of range")))
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 422
+    assert db.rollbacks == 1
+    assert razorpay.requests == []
+
+
+def test_services_must_have_a_positive_price(client, db, razorpay):
+    response = client.post("/api/services/", json={"name": "Tent", "price": 0, "location": "Jaipur"})
+
+    assert response.status_code == 422
+    assert db.executed == []
+
+
+def test_checkout_replays_a_stored_order(client, db, razorpay):
+    order = {"id": "order_old", "amount": 350000}
+    db.on("payments.by_key", [{"id": 7, "amount": 350000, "currency": "INR", "receipt": "cart_cart1", "order_payload": order}])
+    db.on("bookings.by_payment", [booking_row(1), booking_row(2)])
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 200
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert response.json()["order"] == order
+    assert razorpay.requests == []
+    assert "bookings.create" not in db.names()
+
+
+def test_checkout_key_still_in_progress_is_409(client, db, razorpay):
+    db.on("payments.by_key", [{"id": 7, "amount": 350000, "currency": "INR", "receipt": "cart_cart1", "order_payload": None}])
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 409
+    assert razorpay.requests == []
+
+
+def test_checkout_key_taken_concurrently_is_409(client, db, razorpay):
+    # The reservation inserted nothing and the re-read finds the other request's payment
+    lookups = iter([[], [{"id": 8, "amount": 350000, "currency": "INR", "receipt": "cart_cart1", "order_payload": None}]])
+    db.on("payments.by_key", lambda params: next(lookups))
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 409
+    assert "bookings.create" not in db.names()
+
+
+def test_checkout_cannot_reuse_a_create_order_key(client, db, razorpay):
+    order = {"id": "order_standalone", "amount": 100}
+    db.on("payments.by_key", [{"id": 9, "amount": 100, "currency": "INR", "receipt": "r1", "order_payload": order}])
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "shared"})
+
+    assert response.status_code == 422
+
+
+def test_checkout_gateway_error_releases_the_hold_without_retrying(client, db, razorpay):
+    db.on("payments.reserve_checkout", [{"id": 7, "amount": 350000}])
+    db.on("bookings.create", [booking_row(1), booking_row(2)])
+    razorpay.respond = lambda request: httpx.Response(503, json={"error": {"description": "unavailable"}})
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 502
+    assert len(razorpay.requests) == 1
+    assert db.params("payments.release_bookings") == [(7,)]
+    assert db.params("payments.release") == [(7,)]
+
+
+# Gateway retries
+
+def test_order_create_retries_connect_errors_only(client, db, razorpay):
+    db.on("payments.reserve_checkout", [{"id": 7, "amount": 350000}])
+    db.on("bookings.create", [booking_row(1)])
+    failures = iter([httpx.ConnectError("refused"), httpx.ConnectTimeout("timeout")])
+
+    def respond(request):
+        failure = next(failures, None)
+        if failure is not None:
+            raise failure
+        return razorpay.create_order(request)
+
+    razorpay.respond = respond
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 200
+    assert len(razorpay.requests) == 3
+
+
+def test_order_create_does_not_retry_read_timeouts(client, db, razorpay):
+    db.on("payments.reserve_checkout", [{"id": 7, "amount": 350000}])
+    db.on("bookings.create", [booking_row(1)])
+
+    def respond(request):
+        raise httpx.ReadTimeout("no response")
+
+    razorpay.respond = respond
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 502
+    assert len(razorpay.requests) == 1
+
+
+def test_order_create_rejects_malformed_json(client, db, razorpay):
+    db.on("payments.reserve_checkout", [{"id": 7, "amount": 350000}])
+    db.on("bookings.create", [booking_row(1)])
+    razorpay.respond = lambda request: httpx.Response(200, content=b"<html>")
+
+    response = client.post("/api/payments/checkout", json=CART, headers={"Idempotency-Key": "cart1"})
+
+    assert response.status_code == 502
+    assert db.params("payments.release") == [(7,)]
+
+
+# Standalone orders
+
+def test_create_order_replays_a_stored_order(client, db, razorpay):
+    order = {"id": "order_old", "amount": 5000}
+    db.on("payments.reserve_order", [{
+        "id": 3, "amount": 5000, "currency": "INR", "receipt": "r1", "order_payload": order, "owned": False,
+    }])
+
+    response = client.post("/api/payments/create-order", json={"amount": 5000, "receipt": "r1"}, headers={"Idempotency-Key": "k"})
+
+    assert response.status_code == 200
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert response.json() == order
+    assert razorpay.requests == []
+
+
+def test_create_order_owner_of_the_key_creates_and_stores_the_order(client, db, razorpay):
+    # New key, or one whose earlier request died and whose lease ran out: this request owns it
+    db.on("payments.reserve_order", [{
+        "id": 3, "amount": 5000, "currency": "INR", "receipt": "r1", "order_payload": None, "owned": True,
+    }])
+
+    response = client.post("/api/payments/create-order", json={"amount": 5000, "receipt": "r1"}, headers={"Idempotency-Key": "k"})
+
+    assert response.status_code == 200
+    assert razorpay.bodies() == [{"amount": 5000, "currency": "INR", "receipt": "r1", "payment_capture": 1}]
+    assert db.params("payments.reserve_order")[0]["lease"] == settings.payment_idempotency_lease_seconds
+    assert db.params("payments.store_order")[0][2] == 3
+
+
+def test_create_order_releases_the_key_when_the_gateway_fails(client, db, razorpay):
+    db.on("payments.reserve_order", [{
+        "id": 3, "amount": 5000, "currency": "INR", "receipt": "r1", "order_payload": None, "owned": True,
+    }])
+    razorpay.respond = lambda request: httpx.Response(500)
+
+    response = client.post("/api/payments/create-order", json={"amount": 5000, "receipt": "r1"}, headers={"Idempotency-Key": "k"})
+
+    assert response.status_code == 502
+    assert db.params("payments.release") == [(3,)]
+
+
+def test_create_order_key_held_by_a_live_request_is_409(client, db, razorpay):
+    db.on("payments.reserve_order", [{
+        "id": 3, "amount": 5000, "currency": "INR", "receipt": "r1", "order_payload": None, "owned": False,
+    }])
+
+    response = client.post("/api/payments/create-order", json={"amount": 5000, "receipt": "r1"}, headers={"Idempotency-Key": "k"})
+
+    assert response.status_code == 409
+    assert razorpay.requests == []
+
+
+def test_create_order_reselects_a_key_inserted_concurrently(client, db, razorpay):
+    order = {"id": "order_other", "amount": 5000}
+    db.on("payments.by_key", [{"id": 3, "amount": 5000, "currency": "INR", "receipt": "r1", "order_payload": order}])
+
+    response = client.post("/api/payments/create-order", json={"amount": 5000, "receipt": "r1"}, headers={"Idempotency-Key": "k"})
+
+    assert response.status_code == 200
+    assert response.json() == order
+    assert db.names() == ["payments.reserve_order", "payments.by_key"]
+
+
+def test_create_order_key_reused_for_another_amount_is_422(client, db, razorpay):
+    db.on("payments.reserve_order", [{
+        "id": 3, "amount": 9999, "currency": "INR", "receipt": "r1", "order_payload": None, "owned": False,
+    }])
+
+    response = client.post("/api/payments/create-order", json={"amount": 5000, "receipt": "r1"}, headers={"Idempotency-Key": "k"})
+
+    assert response.status_code == 422
+
+
+def test_create_order_cannot_pose_as_a_checkout(client, db, razorpay):
+    response = client.post("/api/payments/create-order", json={"amount": 5000, "receipt": "cart_x"})
+
+    assert response.status_code == 400
+    assert db.executed == []
+
+
+# Verify
+
+def test_verify_confirms_the_bookings_of_the_order(client, db, razorpay):
+    db.on("payments.verify", [{"status": "captured", "confirmed": [1, 2]}])
+
+    response = client.post("/api/payments/verify", json=verify_body())
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "verified", "confirmed": [1, 2]}
+    params, = db.params("payments.verify")
+    assert (params["order_id"], params["payment_id"], params["customer_id"]) == ("order_test", "pay_1", CUSTOMER_ID)
+    assert db.commits == 1
+
+
+def test_verify_rejects_a_bad_signature(client, db, razorpay):
+    response = client.post("/api/payments/verify", json=verify_body(secret=b"wrong"))
+
+    assert response.status_code == 400
+    assert db.executed == []
+
+
+def test_verify_after_the_hold_expired_is_409(client, db, razorpay):
+    db.on("payments.verify", [{"status": "expired", "confirmed": []}])
+
+    response = client.post("/api/payments/verify", json=verify_body())
+
+    assert response.status_code == 409
+
+
+# Webhook
+
+def test_webhook_capture_is_reconciled(client, db, razorpay):
+    db.on("payments.apply_events", [{"order_id": "order_test", "status": "captured", "count": 2}])
+    body, headers = signed_webhook("payment.captured", "order_test")
+
+    response = client.post("/api/payments/webhook", content=body, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+    params, = db.params("payments.apply_events")
+    assert (params["order_ids"], params["payment_ids"], params["statuses"]) == (["order_test"], ["pay_1"], ["captured"])
+    assert db.commits == 1
+
+
+def test_webhook_failed_attempt_is_passed_on_as_failed(client, db, razorpay):
+    db.on("payments.apply_events", [{"order_id": "order_test", "status": "failed", "count": 0}])
+    body, headers = signed_webhook("payment.failed", "order_test")
+
+    response = client.post("/api/payments/webhook", content=body, headers=headers)
+
+    assert response.status_code == 200
+    assert db.params("payments.apply_events")[0]["statuses"] == ["failed"]
+
+
+def test_webhook_rejects_a_bad_signature(client, db, razorpay):
+    body, headers = signed_webhook("payment.captured", "order_test")
+
+    response = client.post("/api/payments/webhook", content=body, headers={**headers, "X-Razorpay-Signature": "0" * 64})
+
+    assert response.status_code == 400
+    assert db.executed == []
+
+
+def test_webhook_ignores_other_events(client, db, razorpay):
+    body, headers = signed_webhook("payment.authorized", "order_test")
+
+    response = client.post("/api/payments/webhook", content=body, headers=headers)
+
+    assert response.json() == {"status": "ignored"}
+    assert db.executed == []
+
+
+def test_shutdown_writes_queued_events_without_waiting_for_the_batch(db, monkeypatch):
+    monkeypatch.setattr(settings, "payment_webhook_batch_window_ms", 60_000)
+    db.on("payments.apply_events", [{"order_id": "order_test", "status": "captured", "count": 1}])
+
+    async def shutdown_with_a_queued_event():
+        webhook = asyncio.create_task(payment_reconciler.submit("order_test", "pay_1", "captured"))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(payment_reconciler.stop(), timeout=5)
+        await webhook
+
+    asyncio.run(shutdown_with_a_queued_event())
+
+    assert db.params("payments.apply_events")[0]["order_ids"] == ["order_test"]
+
+
+def test_shutdown_abandons_a_batch_that_does_not_finish(db, monkeypatch):
+    monkeypatch.setattr(payment_reconciler, "_STOP_TIMEOUT_SECONDS", 0.01)
+
+    async def stuck(events):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(payment_reconciler, "apply_events", stuck)
+
+    async def shutdown_with_a_stuck_batch():
+        webhook = asyncio.create_task(payment_reconciler.submit("order_test", "pay_1", "captured"))
+        await asyncio.sleep(0)
+        await payment_reconciler.stop()
+        # The webhook is not answered 200, so Razorpay redelivers the event
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(webhook, timeout=5)
+        assert payment_reconciler._flusher is None
+
+    asyncio.run(shutdown_with_a_stuck_batch())
@@ -0,0 +1,158 @@
+import asyncio
+import json
+
+import pytest
+
+from app import invalidation
+from app.cache import TTLCache, invalidate_service_created, invalidate_service_deleted, service_cache
+from app.config import settings
+from app.db import get_db_conn
+from app.main import app
+from conftest import FakeConnection
+
+
+def service_row(service_id: int, **overrides) -> dict:
+    row = dict(
+        id=service_id, name=f"Service {service_id}", description=None, price=1000.0, photo_url=None,
+        location="Pune", daily_capacity=None, provider_id=3, version=1,
+    )
+    row.update(overrides)
+    return row
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    service_cache.clear()
+    yield
+    service_cache.clear()
+
+
+# Cache
+
+def test_tag_invalidation_drops_only_tagged_entries():
+    cache = TTLCache("test", max_entries=10, ttl_seconds=60, max_bytes=1000)
+    cache.set("a", 1, size=1, tags=["service:1"])
+    cache.set("b", 2, size=1, tags=["service:2"])
+
+    cache.invalidate_tags("service:1")
+
+    assert (cache.get("a"), cache.get("b")) == (None, 2)
+
+
+def test_value_loaded_across_an_invalidation_is_not_cached():
+    cache = TTLCache("test", max_entries=10, ttl_seconds=60, max_bytes=1000)
+    generation = cache.generation
+    # A write lands while the value is being read from the database
+    cache.invalidate_tags("service:1")
+
+    cache.set("a", "stale", size=1, tags=["service:1"], generation=generation)
+
+    assert cache.get("a") is None
+
+
+def test_least_recently_used_entry_is_evicted_past_max_bytes():
+    cache = TTLCache("test", max_entries=10, ttl_seconds=60, max_bytes=10)
+    cache.set("a", 1, size=4)
+    cache.set("b", 2, size=4)
+    cache.get("a")
+
+    cache.set("c", 3, size=4)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_catalog_page_is_served_from_cache(client, db):
+    db.on("services.list", [service_row(3), service_row(2)])
+
+    first = client.get("/api/services/", params={"limit": 2})
+    second = client.get("/api/services/", params={"limit": 2})
+
+    assert first.json() == second.json()
+    assert db.names() == ["services.list"]
+
+
+def test_deleting_the_row_after_a_page_drops_the_page(client, db):
+    db.on("services.list", [service_row(3), service_row(2), service_row(1)])
+    assert client.get("/api/services/", params={"limit": 2}).json()["next_cursor"] is not None
+
+    # Service 1 is not on the page, but the page's next_cursor exists only because of it
+    invalidate_service_deleted(1)
+    db.on("services.list", [service_row(3), service_row(2)])
+
+    assert client.get("/api/services/", params={"limit": 2}).json()["next_cursor"] is None
+
+
+def test_new_service_drops_first_pages_only(client, db):
+    db.on("services.list", [service_row(9), service_row(8), service_row(7)])
+    db.on("services.list[after]", [service_row(7), service_row(6)])
+    cursor = client.get("/api/services/", params={"limit": 2}).json()["next_cursor"]
+    client.get("/api/services/", params={"limit": 2, "cursor": cursor})
+
+    invalidate_service_created()
+    client.get("/api/services/", params={"limit": 2})
+    client.get("/api/services/", params={"limit": 2, "cursor": cursor})
+
+    assert db.names() == ["services.list", "services.list[after]", "services.list"]
+
+
+# Provider listing
+
+def test_stream_does_not_hold_a_request_connection(client, db, identity):
+    identity.update(sub="3", role="provider")
+    db.on("services.by_provider[stream]", [service_row(2), service_row(1)])
+
+    async def no_connection():
+        raise AssertionError("stream=true must not check out a request connection")
+        yield
+
+    app.dependency_overrides[get_db_conn] = no_connection
+    page = client.get("/api/services/my", params={"stream": "true"}).json()
+
+    assert [s["id"] for s in page["items"]] == [2, 1]
+    assert page["next_cursor"] is None
+
+
+# Cross-worker invalidation
+
+def test_update_notifies_other_workers_and_drops_local_pages(client, db, identity):
+    identity.update(sub="3", role="provider")
+    db.on("services.list", [service_row(3), service_row(2)])
+    db.on("services.owner", [{"provider_id": 3}])
+    db.on("services.update", [service_row(2, name="Renamed", version=2)])
+    client.get("/api/services/", params={"limit": 2})
+
+    client.put("/api/services/2", json={"name": "Renamed", "price": 1000, "location": "Pune"})
+    client.get("/api/services/", params={"limit": 2})
+
+    channel, payload = db.params("cache.publish_invalidation")[0]
+    assert channel == settings.cache_invalidation_channel
+    assert json.loads(payload) == {"kind": "service", "action": "updated", "id": 2, "origin": invalidation.WORKER_ID}
+    assert db.names().count("services.list") == 2
+
+
+def test_event_from_another_worker_drops_pages_holding_the_service(client, db):
+    db.on("services.list", [service_row(3), service_row(2)])
+    client.get("/api/services/", params={"limit": 2})
+
+    invalidation.dispatch({"kind": "service", "action": "updated", "id": 2, "origin": "other"})
+    client.get("/api/services/", params={"limit": 2})
+
+    assert db.names() == ["services.list", "services.list"]
+
+
+def test_listener_reconnect_clears_caches_and_in_flight_reads():
+    service_cache.set("page", "body", size=4)
+    generation = service_cache.generation
+
+    invalidation._reset_local_caches()
+    service_cache.set("other", "body", size=4, generation=generation)
+
+    assert (service_cache.get("page"), service_cache.get("other")) == (None, None)
+
+
+def test_nothing_is_published_when_invalidation_is_disabled(db, monkeypatch):
+    monkeypatch.setattr(settings, "cache_invalidation_enabled", False)
+
+    asyncio.run(invalidation.publish(FakeConnection(db), "service", "deleted", 2))
+
+    assert db.executed == []
@@ -1,17 +1,57 @@
 import React, { useEffect, useState } from 'react';
 import axios from 'axios';
-import { API_BASE, authHeader } from '../auth.js';
+import { API_BASE, authHeader, getAuth } from '../auth.js';
 
 export default function MyBookings() {
   const [bookings, setBookings] = useState([]);
-  const load = async () => {
-    const { data } = await axios.get(`${API_BASE}/api/bookings/my`, { headers: authHeader() });
-    setBookings(data);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [statusFilter, setStatusFilter] = useState('');
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState('');
+  const { role } = getAuth();
+
+  const load = async (cursor = null) => {
+    setLoading(true);
+    try {
+      const params = {};
+      if (cursor) params.cursor = cursor;
+      if (statusFilter) params.status = statusFilter;
+      const { data } = await axios.get(`${API_BASE}/api/bookings/my`, { headers: authHeader(), params });
+      setBookings(cursor ? prev => [...prev, ...data.items] : data.items);
+      setNextCursor(data.next_cursor);
+    } finally {
+      setLoading(false);
+    }
+  };
+  useEffect(() => { load(); }, [statusFilter]);
+
+  const changeStatus = async (booking, action) => {
+    setError('');
+    try {
+      const { data } = await axios.post(
+        `${API_BASE}/api/bookings/${booking.id}/${action}`,
+        { version: booking.version },
+        { headers: authHeader() }
+      );
+      setBookings(prev => prev.map(b => (b.id === data.id ? data : b)));
+    } catch (err) {
+      // 409: someone else changed the booking first; reload to show its current state
+      setError(err.response?.data?.detail || 'Failed to update booking');
+      if (err.response?.status === 409) await load();
+    }
   };
-  useEffect(() => { load(); }, []);
   return (
     <div>
-      <h3>My Bookings</h3>
+      <div className="d-flex justify-content-between align-items-center mb-2">
+        <h3>My Bookings</h3>
+        <select className="form-select w-auto" value={statusFilter} onChange={e => setStatusFilter(e.target.value)}>
+          <option value="">All</option>
+          <option value="pending">Pending</option>
+          <option value="confirmed">Confirmed</option>
+          <option value="cancelled">Cancelled</option>
+        </select>
+      </div>
+      {error && <div className="alert alert-danger">{error}</div>}
       <div className="list-group">
         {bookings.map(b => (
           <div key={b.id} className="list-group-item">
@@ -22,14 +62,28 @@ export default function MyBookings() {
                 <div><strong>Qty:</strong> {b.quantity}</div>
                 {b.notes && <div><strong>Notes:</strong> {b.notes}</div>}
               </div>
-              <span className="badge bg-secondary align-self-start">{b.status}</span>
+              <div className="text-end">
+                <span className="badge bg-secondary">{b.status}</span>
+                <div className="mt-2">
+                  {role === 'provider' && b.status === 'pending' && (
+                    <button className="btn btn-sm btn-success me-2" onClick={() => changeStatus(b, 'confirm')}>Confirm</button>
+                  )}
+                  {b.status !== 'cancelled' && (
+                    <button className="btn btn-sm btn-outline-danger" onClick={() => changeStatus(b, 'cancel')}>Cancel</button>
+                  )}
+                </div>
+              </div>
             </div>
           </div>
         ))}
       </div>
+      {nextCursor && (
+        <div className="text-center mt-3">
+          <button className="btn btn-outline-primary" onClick={() => load(nextCursor)} disabled={loading}>
+            {loading ? 'Loading...' : 'Load more'}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
-
-
-
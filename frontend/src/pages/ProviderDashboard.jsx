@@ -4,17 +4,20 @@ import { API_BASE, authHeader } from '../auth.js';
 
 export default function ProviderDashboard() {
   const [services, setServices] = useState([]);
-  const [form, setForm] = useState({ name: '', description: '', price: '', photo_url: '', location: '' });
+  const [nextCursor, setNextCursor] = useState(null);
+  const [form, setForm] = useState({ name: '', description: '', price: '', photo_url: '', location: '', daily_capacity: '' });
   const [editingId, setEditingId] = useState(null);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
   const [loading, setLoading] = useState(false);
 
-  const load = async () => {
+  const load = async (cursor = null) => {
     setLoading(true);
     try {
-      const { data } = await axios.get(`${API_BASE}/api/services/my`, { headers: authHeader() });
-      setServices(data);
+      const params = cursor ? { cursor } : {};
+      const { data } = await axios.get(`${API_BASE}/api/services/my`, { headers: authHeader(), params });
+      setServices(cursor ? prev => [...prev, ...data.items] : data.items);
+      setNextCursor(data.next_cursor);
     } catch (err) {
       setError('Failed to load services');
     } finally {
@@ -27,7 +30,7 @@ export default function ProviderDashboard() {
   const onChange = (e) => setForm({ ...form, [e.target.name]: e.target.value });
 
   const resetForm = () => {
-    setForm({ name: '', description: '', price: '', photo_url: '', location: '' });
+    setForm({ name: '', description: '', price: '', photo_url: '', location: '', daily_capacity: '' });
     setEditingId(null);
     setError('');
     setSuccess('');
@@ -40,7 +43,7 @@ export default function ProviderDashboard() {
     setLoading(true);
     
     try {
-      const payload = { ...form, price: Number(form.price) };
+      const payload = { ...form, price: Number(form.price), daily_capacity: form.daily_capacity ? Number(form.daily_capacity) : null };
       await axios.post(`${API_BASE}/api/services/`, payload, { headers: authHeader() });
       setSuccess('Service created successfully!');
       resetForm();
@@ -58,7 +61,8 @@ export default function ProviderDashboard() {
       description: service.description || '',
       price: service.price.toString(),
       photo_url: service.photo_url || '',
-      location: service.location
+      location: service.location,
+      daily_capacity: service.daily_capacity == null ? '' : String(service.daily_capacity)
     });
     setEditingId(service.id);
     setError('');
@@ -72,7 +76,7 @@ export default function ProviderDashboard() {
     setLoading(true);
     
     try {
-      const payload = { ...form, price: Number(form.price) };
+      const payload = { ...form, price: Number(form.price), daily_capacity: form.daily_capacity ? Number(form.daily_capacity) : null };
       await axios.put(`${API_BASE}/api/services/${editingId}`, payload, { headers: authHeader() });
       setSuccess('Service updated successfully!');
       resetForm();
@@ -177,6 +181,19 @@ export default function ProviderDashboard() {
                     required 
                   />
                 </div>
+
+                <div className="mb-3">
+                  <label className="form-label">Bookings per Day</label>
+                  <input 
+                    className="form-control" 
+                    type="number" 
+                    min="1" 
+                    name="daily_capacity" 
+                    value={form.daily_capacity} 
+                    onChange={onChange} 
+                    placeholder="No limit" 
+                  />
+                </div>
                 
                 <div className="d-grid gap-2">
                   <button 
@@ -288,6 +305,12 @@ export default function ProviderDashboard() {
                   ))}
                 </div>
               )}
+
+              {!loading && nextCursor && (
+                <div className="text-center mt-3">
+                  <button className="btn btn-outline-secondary" onClick={() => load(nextCursor)}>Load more</button>
+                </div>
+              )}
             </div>
           </div>
         </div>
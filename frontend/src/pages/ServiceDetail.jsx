@@ -59,20 +59,27 @@ export default function ServiceDetail() {
     setMessage('');
     const auth = getAuth();
     if (!auth.token || auth.role !== 'customer') { setMessage('Please login as customer to book'); return; }
+    let placed = [];
+    let paid = false;
     try {
       await ensureRazorpayScript();
 
-      // 1) Create Razorpay order from backend
+      // 1) Checkout: the server prices the booking, places it (pending) and creates one Razorpay order
       const configResp = await axios.get(`${API_BASE}/api/payments/config`);
       const { key_id } = configResp.data;
-      const amountPaise = Math.round(Number(service.price) * 100);
-      const orderResp = await axios.post(`${API_BASE}/api/payments/create-order`, {
-        amount: amountPaise,
-        currency: 'INR',
-        receipt: `svc_${id}_${Date.now()}`,
-      }, { headers: authHeader() });
+      const checkoutResp = await axios.post(`${API_BASE}/api/payments/checkout`, {
+        items: [{
+          service_id: Number(id),
+          event_date: eventDate,
+          quantity: Number(quantity),
+          notes,
+          address: address || undefined,
+          duration_hours: durationHours ? Number(durationHours) : undefined,
+        }],
+      }, { headers: { ...authHeader(), 'Idempotency-Key': crypto.randomUUID() } });
 
-      const order = orderResp.data;
+      const { order, bookings } = checkoutResp.data;
+      placed = bookings;
 
       // 2) Open Razorpay checkout
       const payResponse = await openRazorpayAndPay({
@@ -85,27 +92,24 @@ export default function ServiceDetail() {
         prefill: {},
         notes: { serviceId: id },
       });
+      paid = true;
 
-      // 3) Verify payment signature
+      // 3) Verify payment signature; this confirms the booking
       await axios.post(`${API_BASE}/api/payments/verify`, {
         razorpay_order_id: payResponse.razorpay_order_id,
         razorpay_payment_id: payResponse.razorpay_payment_id,
         razorpay_signature: payResponse.razorpay_signature,
       }, { headers: authHeader() });
 
-      // 4) Create booking only after payment success
-      await axios.post(`${API_BASE}/api/bookings/`, {
-        service_id: Number(id),
-        event_date: eventDate,
-        quantity,
-        notes,
-        address: address || undefined,
-        duration_hours: durationHours ? Number(durationHours) : undefined,
-      }, { headers: authHeader() });
-
-      setMessage('Payment successful and booking placed!');
+      setMessage('Payment successful and booking confirmed!');
     } catch (err) {
-      setMessage(err.response?.data?.detail || 'Booking failed');
+      // Not paid: release the dates held by the placed bookings
+      if (!paid) {
+        await Promise.all(placed.map(b => axios.post(
+          `${API_BASE}/api/bookings/${b.id}/cancel`, { version: b.version }, { headers: authHeader() }
+        ).catch(() => {})));
+      }
+      setMessage(err.response?.data?.detail || err.message || 'Booking failed');
     }
   };
 
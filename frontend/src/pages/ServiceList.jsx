@@ -7,13 +7,16 @@ export default function ServiceList() {
   const [services, setServices] = useState([]);
   const [query, setQuery] = useState('');
   const [location, setLocation] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
 
-  const load = async () => {
+  const load = async (cursor = null) => {
     const params = {};
     if (query) params.query = query;
     if (location) params.location = location;
+    if (cursor) params.cursor = cursor;
     const { data } = await axios.get(`${API_BASE}/api/services/`, { params });
-    setServices(data);
+    setServices(cursor ? prev => [...prev, ...data.items] : data.items);
+    setNextCursor(data.next_cursor);
   };
 
   useEffect(() => { load(); }, []);
@@ -24,7 +27,7 @@ export default function ServiceList() {
       <div className="row g-2 mb-3">
         <div className="col-md-4"><input placeholder="Search" className="form-control" value={query} onChange={e=>setQuery(e.target.value)} /></div>
         <div className="col-md-4"><input placeholder="Location" className="form-control" value={location} onChange={e=>setLocation(e.target.value)} /></div>
-        <div className="col-md-4"><button className="btn btn-primary w-100" onClick={load}>Filter</button></div>
+        <div className="col-md-4"><button className="btn btn-primary w-100" onClick={() => load()}>Filter</button></div>
       </div>
       <div className="row g-3">
         {services.map(s => (
@@ -66,6 +69,11 @@ export default function ServiceList() {
           </div>
         ))}
       </div>
+      {nextCursor && (
+        <div className="text-center mt-3">
+          <button className="btn btn-outline-primary" onClick={() => load(nextCursor)}>Load more</button>
+        </div>
+      )}
     </div>
   );
 }